@@ -1,6 +1,30 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, LargeBinary, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, LargeBinary, ForeignKey, DateTime, Text, Index, UniqueConstraint
+from sqlalchemy import select
 from sqlalchemy.sql import func
 from database import Base
+from app_utils.map_tiles import map_cell
+
+
+def _ticket_map_cell(context):
+    """Insert default for Ticket.map_cell (also applies to bulk inserts)"""
+    params = context.get_current_parameters()
+    return map_cell(params.get("latitude"), params.get("longitude"))
+
+
+def _sub_ticket_map_cell(context):
+    """Insert default for SubTicket.map_cell: copied from the parent ticket"""
+    ticket_id = context.get_current_parameters().get("ticket_id")
+    return context.connection.execute(
+        select(Ticket.map_cell).where(Ticket.ticket_id == ticket_id)
+    ).scalar()
+
+
+def _sub_ticket_district(context):
+    """Insert default for SubTicket.district: the parent ticket's district at creation"""
+    ticket_id = context.get_current_parameters().get("ticket_id")
+    return context.connection.execute(
+        select(Ticket.district).where(Ticket.ticket_id == ticket_id)
+    ).scalar()
 
 
 class Ticket(Base):
@@ -11,15 +35,22 @@ class Ticket(Base):
 
     latitude = Column(Float, index=True)
     longitude = Column(Float, index=True)
+    # Quadkey of the location at map_tiles.MAX_CELL_ZOOM; keep in sync when latitude/longitude change
+    map_cell = Column(String, default=_ticket_map_cell)
     address = Column(String)
     area = Column(String)
     district = Column(String)
 
-    status = Column(String, default="open")
+    status = Column(String, default="open", index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     resolved_at = Column(DateTime(timezone=True))
 
+    __table_args__ = (
+        # Map clusters: tickets of a tile (map_cell range) with their locations, read from the index alone
+        Index("ix_tickets_map_cell_location", "map_cell", "latitude", "longitude", "ticket_id"),
+    )
+
 
 class SubTicket(Base):
     __tablename__ = "sub_tickets"
@@ -27,7 +58,7 @@ class SubTicket(Base):
     id = Column(Integer, primary_key=True)
     sub_id = Column(String, unique=True, index=True, nullable=False)
 
-    ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False)
+    ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False, index=True)
     issue_type = Column(String, nullable=False)
     authority = Column(String, nullable=False)
 
@@ -37,6 +68,20 @@ class SubTicket(Base):
     resolved_at = Column(DateTime(timezone=True))
     resolution_comment = Column(String, nullable=True)
     resolved_by = Column(String, nullable=True) # Store inspector name
+    # Copy of the ticket's map_cell, so map clusters don't need a join
+    map_cell = Column(String, nullable=True, default=_sub_ticket_map_cell)
+    # District of the ticket when the sub-ticket was created; analytics rollups are keyed on it
+    # and it does not follow later location changes of the ticket
+    district = Column(String, nullable=True, default=_sub_ticket_district)
+
+    __table_args__ = (
+        # Inspector dashboard: authority + status filter, newest first
+        Index("ix_sub_tickets_authority_status_created_at", "authority", "status", "created_at"),
+        # Resolution reporting: resolved sub-tickets by resolution time
+        Index("ix_sub_tickets_status_resolved_at", "status", "resolved_at"),
+        # Map clusters: issue / status breakdown per map cell, read from the index alone
+        Index("ix_sub_tickets_map_cell_issue_status", "map_cell", "issue_type", "status", "sub_id"),
+    )
 
 
 class ComplaintImage(Base):
@@ -53,13 +98,44 @@ class ComplaintImage(Base):
     
     # Image deduplication fields
     image_hash = Column(String, index=True, nullable=True)  # Perceptual hash for similarity detection
+    fingerprint = Column(String, nullable=True)  # Composite fingerprint (app_utils/fingerprint.py) for re-ranking
     latitude = Column(Float, index=True, nullable=True)  # GPS latitude for geospatial queries
     longitude = Column(Float, index=True, nullable=True)  # GPS longitude for geospatial queries
     confidence = Column(Float, nullable=True)  # Detection confidence score
+    detections = Column(Text, nullable=True)  # JSON list of detected boxes, rendered as overlays on demand
     
     # Timestamp - when image was uploaded
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
 
+    __table_args__ = (
+        # Images of a sub-ticket in upload order (first/earliest image lookups)
+        Index("ix_complaint_images_sub_id_created_at", "sub_id", "created_at"),
+    )
+
+
+class Detection(Base):
+    __tablename__ = "detections"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    image_id = Column(Integer, ForeignKey("complaint_images.id"), nullable=False, index=True)
+
+    class_name = Column(String, nullable=False)
+    confidence = Column(Float, nullable=False)
+
+    # Bounding box in original image pixels
+    x1 = Column(Float, nullable=False)
+    y1 = Column(Float, nullable=False)
+    x2 = Column(Float, nullable=False)
+    y2 = Column(Float, nullable=False)
+
+    model_version = Column(String, nullable=True, index=True)  # Weights that produced this detection
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # "all potholes above 0.6" style queries
+        Index("ix_detections_class_confidence", "class_name", "confidence"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -93,4 +169,73 @@ class ApprovedInspector(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     department = Column(String, nullable=True)
-    approved_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    approved_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# ---------------- Analytics rollups (maintained by app_utils.analytics) ----------------
+class AnalyticsHourly(Base):
+    __tablename__ = "analytics_hourly"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # start of the hour (UTC)
+    district = Column(String, nullable=False)
+    authority = Column(String, nullable=False)
+    issue_type = Column(String, nullable=False)
+
+    created = Column(Integer, nullable=False, default=0)  # sub-tickets created in the bucket
+    resolved = Column(Integer, nullable=False, default=0)  # sub-tickets resolved in the bucket
+    resolve_seconds = Column(Float, nullable=False, default=0.0)  # sum of their time-to-resolve
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "district", "authority", "issue_type", name="uq_analytics_hourly_key"),
+    )
+
+
+class AnalyticsDaily(Base):
+    __tablename__ = "analytics_daily"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # start of the day (UTC)
+    district = Column(String, nullable=False)
+    authority = Column(String, nullable=False)
+    issue_type = Column(String, nullable=False)
+
+    created = Column(Integer, nullable=False, default=0)
+    resolved = Column(Integer, nullable=False, default=0)
+    resolve_seconds = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "district", "authority", "issue_type", name="uq_analytics_daily_key"),
+    )
+
+
+class AnalyticsResolveHistogram(Base):
+    """Daily time-to-resolve histogram (bins in analytics.RESOLVE_BINS_HOURS) for percentiles"""
+    __tablename__ = "analytics_resolve_histogram"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)  # day of resolution (UTC)
+    district = Column(String, nullable=False)
+    authority = Column(String, nullable=False)
+    issue_type = Column(String, nullable=False)
+    bin = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "district", "authority", "issue_type", "bin", name="uq_analytics_resolve_histogram_key"),
+    )
+
+
+class AnalyticsCellDaily(Base):
+    """Daily complaint counts per map cell (map_cell prefix at analytics.HEATMAP_ZOOM)"""
+    __tablename__ = "analytics_cells_daily"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, nullable=False)
+    cell = Column(String, nullable=False)
+    issue_type = Column(String, nullable=False)
+    created = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "cell", "issue_type", name="uq_analytics_cells_daily_key"),
+    )
@@ -0,0 +1,292 @@
+"""
+Analytics Rollups
+Hourly and daily complaint counts, time-to-resolve statistics and heatmap
+cells, kept up to date as sub-tickets are created, resolved or deleted, so
+the analytics API reads O(rollup rows) instead of scanning tickets.
+
+- analytics_hourly / analytics_daily: created, resolved and the summed
+  time-to-resolve per (bucket, district, authority, issue_type)
+- analytics_resolve_histogram: daily time-to-resolve histogram, for p90
+- analytics_cells_daily: daily counts per map cell at HEATMAP_ZOOM
+
+SubTicket mapper events apply every change as an atomic upsert
+(INSERT ... ON CONFLICT DO UPDATE, SQLite and PostgreSQL) in the same
+transaction as the write. Bulk statements skip mapper events: callers that
+bulk-delete sub-tickets call record_deleted() first, callers that
+bulk-update their map_cell call record_moved() first, and rebuild()
+recomputes everything from the base tables.
+
+Buckets are UTC. A sub-ticket keeps the district it had when created
+(sub_tickets.district, copied from the ticket on insert), so moving a
+ticket doesn't shift its counts between districts.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, select, delete
+
+from app_models import (
+    SubTicket,
+    AnalyticsHourly, AnalyticsDaily, AnalyticsResolveHistogram, AnalyticsCellDaily,
+)
+
+HEATMAP_ZOOM = 16  # ~600 m cells at the equator
+# Upper bounds (hours) of the time-to-resolve histogram bins; the last bin is open-ended
+RESOLVE_BINS_HOURS = (1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720)
+UNKNOWN = "-"
+
+_KEY_COLUMNS = ("bucket", "district", "authority", "issue_type")
+
+
+# ---------------- Buckets ----------------
+def _utc(value: datetime) -> datetime:
+    """Naive UTC; naive values are taken as already UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def hour_bucket(value: datetime) -> datetime:
+    return _utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(value: datetime) -> datetime:
+    return _utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def resolve_bin(seconds: float) -> int:
+    hours = seconds / 3600
+    for i, bound in enumerate(RESOLVE_BINS_HOURS):
+        if hours <= bound:
+            return i
+    return len(RESOLVE_BINS_HOURS)
+
+
+def resolve_seconds(created_at: datetime, resolved_at: datetime) -> float:
+    return max(0.0, (_utc(resolved_at) - _utc(created_at)).total_seconds())
+
+
+# ---------------- Upserts ----------------
+def _upsert(connection, table, keys: dict, increments: dict):
+    """Add increments to the row with keys, creating it if missing"""
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments},
+        )
+        connection.execute(stmt)
+        return
+
+    # Other databases: update, then insert if there was nothing to update
+    where = [table.c[name] == value for name, value in keys.items()]
+    result = connection.execute(
+        table.update().where(*where).values({name: table.c[name] + value for name, value in increments.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**keys, **increments))
+
+
+def _record_created(connection, created_at, district, authority, issue_type, cell, sign=1):
+    key = {"district": district or UNKNOWN, "authority": authority, "issue_type": issue_type}
+    _upsert(connection, AnalyticsHourly.__table__, {"bucket": hour_bucket(created_at), **key}, {"created": sign})
+    _upsert(connection, AnalyticsDaily.__table__, {"bucket": day_bucket(created_at), **key}, {"created": sign})
+    _record_cell(connection, created_at, issue_type, cell, sign)
+
+
+def _record_cell(connection, created_at, issue_type, cell, sign=1):
+    if cell:
+        _upsert(
+            connection, AnalyticsCellDaily.__table__,
+            {"bucket": day_bucket(created_at), "cell": cell[:HEATMAP_ZOOM], "issue_type": issue_type},
+            {"created": sign},
+        )
+
+
+def _record_resolved(connection, created_at, resolved_at, district, authority, issue_type, sign=1):
+    seconds = resolve_seconds(created_at, resolved_at)
+    key = {"district": district or UNKNOWN, "authority": authority, "issue_type": issue_type}
+    increments = {"resolved": sign, "resolve_seconds": sign * seconds}
+    _upsert(connection, AnalyticsHourly.__table__, {"bucket": hour_bucket(resolved_at), **key}, increments)
+    _upsert(connection, AnalyticsDaily.__table__, {"bucket": day_bucket(resolved_at), **key}, increments)
+    _upsert(
+        connection, AnalyticsResolveHistogram.__table__,
+        {"bucket": day_bucket(resolved_at), **key, "bin": resolve_bin(seconds)},
+        {"count": sign},
+    )
+
+
+def _context(connection, sub_ticket_ids: Iterable[int]) -> Dict[int, tuple]:
+    """sub-ticket id -> (created_at, creation district) read through the flush's connection"""
+    rows = connection.execute(
+        select(SubTicket.id, SubTicket.created_at, SubTicket.district)
+        .where(SubTicket.id.in_(list(sub_ticket_ids)))
+    ).all()
+    return {row.id: (row.created_at, row.district) for row in rows}
+
+
+# ---------------- SubTicket events ----------------
+def _after_insert(mapper, connection, target):
+    created_at, district = _context(connection, [target.id]).get(target.id, (None, None))
+    _record_created(connection, created_at or datetime.now(timezone.utc), district,
+                    target.authority, target.issue_type, target.map_cell)
+    if target.resolved_at is not None:
+        _record_resolved(connection, created_at or target.resolved_at, target.resolved_at,
+                         district, target.authority, target.issue_type)
+
+
+def _after_update(mapper, connection, target):
+    history = inspect(target).attrs.resolved_at.history
+    if not history.has_changes():
+        return
+    old = history.deleted[0] if history.deleted else None
+    new = target.resolved_at
+    created_at, district = _context(connection, [target.id]).get(target.id, (None, None))
+    if created_at is None:
+        return
+    if old is not None:
+        _record_resolved(connection, created_at, old, district, target.authority, target.issue_type, sign=-1)
+    if new is not None:
+        _record_resolved(connection, created_at, new, district, target.authority, target.issue_type)
+
+
+def _before_delete(mapper, connection, target):
+    record_deleted(connection, [target])
+
+
+def record_deleted(connection, sub_tickets: List[SubTicket]):
+    """Take sub-tickets out of the rollups; call before deleting them with a bulk statement"""
+    if not sub_tickets:
+        return
+    context = _context(connection, [s.id for s in sub_tickets])
+    for sub in sub_tickets:
+        created_at, district = context.get(sub.id, (sub.created_at, sub.district))
+        if created_at is None:
+            continue
+        _record_created(connection, created_at, district, sub.authority, sub.issue_type, sub.map_cell, sign=-1)
+        if sub.resolved_at is not None:
+            _record_resolved(connection, created_at, sub.resolved_at, district,
+                             sub.authority, sub.issue_type, sign=-1)
+
+
+def record_moved(connection, sub_tickets: List[SubTicket], cell: Optional[str]):
+    """Move sub-tickets' heatmap counts to a new map_cell; call before setting it with a bulk statement"""
+    if not sub_tickets:
+        return
+    context = _context(connection, [s.id for s in sub_tickets])
+    new = cell[:HEATMAP_ZOOM] if cell else None
+    for sub in sub_tickets:
+        created_at = context.get(sub.id, (sub.created_at, None))[0]
+        old = sub.map_cell[:HEATMAP_ZOOM] if sub.map_cell else None
+        if created_at is None or old == new:
+            continue
+        _record_cell(connection, created_at, sub.issue_type, old, sign=-1)
+        _record_cell(connection, created_at, sub.issue_type, new)
+
+
+def _noop(target, value, oldvalue, initiator):
+    return value
+
+
+def track_sub_tickets():
+    """Maintain the rollups from SubTicket inserts, updates and deletes (idempotent)"""
+    if event.contains(SubTicket, "after_insert", _after_insert):
+        return
+    # Load the previous resolved_at on change even if it wasn't loaded, so it can be taken out
+    event.listen(SubTicket.resolved_at, "set", _noop, active_history=True, retval=True)
+    event.listen(SubTicket, "after_insert", _after_insert)
+    event.listen(SubTicket, "after_update", _after_update)
+    event.listen(SubTicket, "before_delete", _before_delete)
+
+
+# ---------------- Rebuild ----------------
+def rebuild(connection) -> int:
+    """Recompute every rollup from tickets / sub_tickets; returns the number of sub-tickets counted"""
+    for model in (AnalyticsHourly, AnalyticsDaily, AnalyticsResolveHistogram, AnalyticsCellDaily):
+        connection.execute(delete(model.__table__))
+
+    rows = connection.execute(
+        select(
+            SubTicket.created_at, SubTicket.resolved_at, SubTicket.authority,
+            SubTicket.issue_type, SubTicket.map_cell, SubTicket.district,
+        )
+    ).all()
+
+    hourly: Dict[tuple, list] = {}
+    daily: Dict[tuple, list] = {}
+    histogram: Dict[tuple, int] = {}
+    cells: Dict[tuple, int] = {}
+    for row in rows:
+        if row.created_at is None:
+            continue
+        key = (row.district or UNKNOWN, row.authority, row.issue_type)
+        hourly.setdefault((hour_bucket(row.created_at), *key), [0, 0, 0.0])[0] += 1
+        daily.setdefault((day_bucket(row.created_at), *key), [0, 0, 0.0])[0] += 1
+        if row.map_cell:
+            cell_key = (day_bucket(row.created_at), row.map_cell[:HEATMAP_ZOOM], row.issue_type)
+            cells[cell_key] = cells.get(cell_key, 0) + 1
+        if row.resolved_at is not None:
+            seconds = resolve_seconds(row.created_at, row.resolved_at)
+            for store, bucket in ((hourly, hour_bucket(row.resolved_at)), (daily, day_bucket(row.resolved_at))):
+                entry = store.setdefault((bucket, *key), [0, 0, 0.0])
+                entry[1] += 1
+                entry[2] += seconds
+            hist_key = (day_bucket(row.resolved_at), *key, resolve_bin(seconds))
+            histogram[hist_key] = histogram.get(hist_key, 0) + 1
+
+    for model, store in ((AnalyticsHourly, hourly), (AnalyticsDaily, daily)):
+        if store:
+            connection.execute(model.__table__.insert(), [
+                {**dict(zip(_KEY_COLUMNS, key)), "created": c, "resolved": r, "resolve_seconds": s}
+                for key, (c, r, s) in store.items()
+            ])
+    if histogram:
+        connection.execute(AnalyticsResolveHistogram.__table__.insert(), [
+            {**dict(zip(_KEY_COLUMNS + ("bin",), key)), "count": count} for key, count in histogram.items()
+        ])
+    if cells:
+        connection.execute(AnalyticsCellDaily.__table__.insert(), [
+            {"bucket": b, "cell": cell, "issue_type": issue, "created": count}
+            for (b, cell, issue), count in cells.items()
+        ])
+    return len(rows)
+
+
+# ---------------- Percentiles ----------------
+def histogram_percentile(counts: Dict[int, int], q: float, mean_hours: Optional[float] = None) -> Optional[float]:
+    """
+    Approximate q-th percentile (hours) from bin counts, interpolating
+    linearly inside the bin, so it is only accurate to the width of the bin
+    it falls in (1 h below 2 h, 24 h between 24 h and 72 h, ...). The
+    open-ended last bin reports its lower bound.
+
+    With mean_hours (the mean of the same values) the result is capped at
+    mean_hours / (1 - q / 100): by Markov's inequality no more than
+    (100 - q)% of non-negative values exceed it. That keeps e.g. a single
+    instant resolution at 0 instead of interpolating to 0.9 h.
+    """
+    total = sum(counts.values())
+    if total <= 0:
+        return None
+    target = q / 100 * total
+    cumulative = 0
+    value = float(RESOLVE_BINS_HOURS[-1])
+    for i in range(len(RESOLVE_BINS_HOURS) + 1):
+        count = counts.get(i, 0)
+        if count > 0 and cumulative + count >= target:
+            lower = RESOLVE_BINS_HOURS[i - 1] if i > 0 else 0.0
+            if i == len(RESOLVE_BINS_HOURS):
+                value = float(lower)
+            else:
+                upper = RESOLVE_BINS_HOURS[i]
+                value = lower + (upper - lower) * (target - cumulative) / count
+            break
+        cumulative += count
+    if mean_hours is not None and q < 100:
+        value = min(value, mean_hours / (1 - q / 100))
+    return value
@@ -7,10 +7,13 @@ Implements the business logic:
 - Any image + different location (>50m) → Accept
 """
 from sqlalchemy.orm import Session
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+import numpy as np
 from app_models import ComplaintImage, SubTicket, Ticket
-from app_utils.geo import calculate_distance
-from app_utils.image_hash import calculate_image_hash, compare_image_hashes
+from app_utils.geo import bounding_box, distances_within
+from app_utils.image_hash import calculate_image_hash, hamming_distances
+from app_utils import fingerprint as fingerprints
+from app_utils.metrics import timed
 
 
 # Default thresholds
@@ -21,13 +24,175 @@ DEFAULT_DISTANCE_THRESHOLD = 50  # meters
 DEFAULT_HASH_THRESHOLD = 5
 
 
+# Columns needed to compare against stored images (never the image_data blobs)
+CANDIDATE_COLUMNS = (
+    ComplaintImage.id,
+    ComplaintImage.sub_id,
+    ComplaintImage.image_hash,
+    ComplaintImage.fingerprint,
+    ComplaintImage.latitude,
+    ComplaintImage.longitude,
+)
+
+DUPLICATE_MESSAGE = "This complaint is already registered. Thanks for your concern."
+BATCH_DUPLICATE_MESSAGE = "A similar photo of this spot is already part of this upload. Thanks for your concern."
+
+
+def _has_location(latitude: Optional[float], longitude: Optional[float]) -> bool:
+    return latitude is not None and longitude is not None and not (
+        latitude == 0.0 and longitude == 0.0
+    )
+
+
+def _candidates(
+    db: Session,
+    latitude: Optional[float],
+    longitude: Optional[float],
+    distance_threshold: float
+) -> Tuple[List, List[Optional[float]]]:
+    """
+    Stored images a new image has to be compared against.
+    
+    Args:
+        db: Database session
+        latitude: GPS latitude (None when there is no reliable location)
+        longitude: GPS longitude
+        distance_threshold: Radius in meters
+        
+    Returns:
+        Tuple of (candidate rows, distance in meters of each, None without location)
+    """
+    with timed("dedup_query"):
+        if _has_location(latitude, longitude):
+            # Bounding box on the indexed coordinates first, exact distance below
+            min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance_threshold)
+            rows = (
+                db.query(*CANDIDATE_COLUMNS)
+                .filter(
+                    ComplaintImage.latitude.isnot(None),
+                    ComplaintImage.longitude.isnot(None),
+                    ComplaintImage.image_hash.isnot(None),
+                    ComplaintImage.latitude >= min_lat,
+                    ComplaintImage.latitude <= max_lat,
+                    ComplaintImage.longitude >= min_lon,
+                    ComplaintImage.longitude <= max_lon,
+                )
+                .all()
+            )
+        else:
+            # No reliable location: compare against ALL images using hash only
+            return (
+                db.query(*CANDIDATE_COLUMNS).filter(ComplaintImage.image_hash.isnot(None)).all(),
+                None,
+            )
+
+    if not rows:
+        return [], []
+    # Exact distances for all candidates at once; only those within the threshold are compared
+    dist, within = distances_within(
+        latitude,
+        longitude,
+        [row.latitude for row in rows],
+        [row.longitude for row in rows],
+        distance_threshold,
+    )
+    return [row for row, keep in zip(rows, within) if keep], dist[within].tolist()
+
+
+def _match_index(
+    image_hash: str,
+    fingerprint: Optional[str],
+    hashes: List[Optional[str]],
+    candidate_fingerprints: List[Optional[str]],
+    hash_threshold: int
+) -> Optional[int]:
+    """
+    Index of the candidate the new image duplicates, or None.
+    
+    With DEDUP_SCORING=composite, candidates that have a fingerprint are
+    re-ranked by the weighted fingerprint score and the best one that passes
+    wins; the rest (images stored before fingerprints) use the pHash check.
+    """
+    with timed("dedup_compare"):
+        remaining = range(len(hashes))
+        if fingerprints.SCORING == "composite" and fingerprints.is_fingerprint(fingerprint):
+            scored = [i for i, f in enumerate(candidate_fingerprints) if fingerprints.is_fingerprint(f)]
+            best = fingerprints.best_match(fingerprint, [candidate_fingerprints[i] for i in scored])
+            if best is not None:
+                return scored[best[0]]
+            remaining = [i for i, f in enumerate(candidate_fingerprints) if not fingerprints.is_fingerprint(f)]
+        if not image_hash or not remaining:
+            return None
+        # Hamming distances to all remaining candidates at once, first one within the threshold
+        within = np.flatnonzero(hamming_distances(image_hash, [hashes[i] for i in remaining]) <= hash_threshold)
+    return remaining[int(within[0])] if within.size else None
+
+
+def _first_match(image_hash: str, fingerprint: Optional[str], candidates, distances, hash_threshold: int):
+    """(candidate, distance) of the stored image the new image duplicates, or (None, None)"""
+    index = _match_index(
+        image_hash,
+        fingerprint,
+        [candidate.image_hash for candidate in candidates],
+        [candidate.fingerprint for candidate in candidates],
+        hash_threshold,
+    )
+    if index is None:
+        return None, None
+    return candidates[index], (distances[index] if distances is not None else None)
+
+
+def _duplicate_of(db: Session, match, distance: Optional[float]) -> Tuple[bool, str, dict]:
+    """Rejection result for a match against a stored image"""
+    # Fetch ticket and sub_ticket information for user-friendly message
+    sub_ticket = db.query(SubTicket).filter(
+        SubTicket.sub_id == match.sub_id
+    ).first()
+    
+    ticket_info = None
+    if sub_ticket:
+        ticket = db.query(Ticket).filter(
+            Ticket.ticket_id == sub_ticket.ticket_id
+        ).first()
+        
+        if ticket:
+            ticket_info = {
+                "ticket_id": ticket.ticket_id,
+                "sub_id": sub_ticket.sub_id,
+                "issue_type": sub_ticket.issue_type,
+                "authority": sub_ticket.authority,
+                "status": sub_ticket.status
+            }
+    
+    # User-friendly message
+    user_message = DUPLICATE_MESSAGE
+    if ticket_info:
+        user_message += f" Ticket ID: {ticket_info['ticket_id']}"
+    
+    return (
+        True,
+        user_message,
+        {
+            "id": match.id,
+            "sub_id": match.sub_id,
+            "latitude": match.latitude,
+            "longitude": match.longitude,
+            "distance_meters": round(distance, 2) if distance is not None else None,
+            "ticket_info": ticket_info,
+            "message": user_message
+        }
+    )
+
+
 def check_duplicate_image(
     db: Session,
     image_bytes: bytes,
     latitude: float,
     longitude: float,
     distance_threshold: float = DEFAULT_DISTANCE_THRESHOLD,
-    hash_threshold: int = DEFAULT_HASH_THRESHOLD
+    hash_threshold: int = DEFAULT_HASH_THRESHOLD,
+    image_hash: Optional[str] = None,
+    fingerprint: Optional[str] = None
 ) -> Tuple[bool, Optional[str], Optional[dict]]:
     """
     Check if an image is a duplicate based on image similarity, and optionally location.
@@ -39,6 +204,8 @@ def check_duplicate_image(
         longitude: GPS longitude of the image
         distance_threshold: Maximum distance in meters to consider same location (default: 50m)
         hash_threshold: Maximum Hamming distance for image similarity (default: 5)
+        image_hash: Perceptual hash of image_bytes if the caller already has it
+        fingerprint: Composite fingerprint of image_bytes if the caller already has it
         
     Returns:
         Tuple of (is_duplicate: bool, reason: Optional[str], existing_image: Optional[dict])
@@ -46,106 +213,117 @@ def check_duplicate_image(
         - reason: Human-readable reason for rejection (if duplicate)
         - existing_image: Info about the existing duplicate image (if found)
     """
-    # Calculate perceptual hash for the new image so visually similar images
+    # Perceptual hash of the new image so visually similar images
     # (not just bit-identical) can be detected.
-    new_image_hash = calculate_image_hash(image_bytes, use_perceptual=True)
+    new_image_hash = image_hash
+    if new_image_hash is None:
+        with timed("phash"):
+            if fingerprints.SCORING == "composite":
+                new_image_hash, fingerprint = fingerprints.calculate_signatures([image_bytes])[0]
+            else:
+                new_image_hash = calculate_image_hash(image_bytes, use_perceptual=True)
+
+    candidates, distances = _candidates(db, latitude, longitude, distance_threshold)
+    match, distance = _first_match(new_image_hash, fingerprint, candidates, distances, hash_threshold)
     
-    # Determine if we have a meaningful location
-    has_location = latitude is not None and longitude is not None and not (
-        latitude == 0.0 and longitude == 0.0
-    )
+    if match is None:
+        # No duplicate found → ACCEPT
+        return False, None, None
+    
+    # Similar image (and, when available, same location) → REJECT
+    return _duplicate_of(db, match, distance)
 
-    if has_location:
-        # Query images with GPS coordinates near this location
-        # We'll check images within a reasonable bounding box first for performance
-        # (rough approximation: 1 degree ≈ 111km, so 50m ≈ 0.00045 degrees)
-        lat_delta = distance_threshold / 111000.0  # Rough conversion
-        lon_delta = distance_threshold / (111000.0 * abs(latitude / 90.0) if latitude != 0 else 111000.0)
+
+def check_duplicate_batch(
+    db: Session,
+    items: List[dict],
+    distance_threshold: float = DEFAULT_DISTANCE_THRESHOLD,
+    hash_threshold: int = DEFAULT_HASH_THRESHOLD
+) -> List[Tuple[bool, Optional[str], Optional[dict]]]:
+    """
+    Check a whole upload batch for duplicates, before any detection runs.
+    
+    Each image is compared first with the images accepted earlier in the same
+    batch (burst shots of one spot), then with stored images, using the same
+    rules as check_duplicate_image. Images without a location are compared
+    by hash only, and the stored hashes for them are loaded once per batch.
+    
+    Args:
+        db: Database session
+        items: Dicts with "image_hash", optionally "fingerprint", and "latitude"
+               and "longitude" (None when there is no reliable location), in
+               upload order
+        distance_threshold: Maximum distance in meters to consider same location (default: 50m)
+        hash_threshold: Maximum Hamming distance for image similarity (default: 5)
         
-        nearby_images = (
-            db.query(ComplaintImage)
-            .filter(
-                ComplaintImage.latitude.isnot(None),
-                ComplaintImage.longitude.isnot(None),
-                ComplaintImage.image_hash.isnot(None),
-                ComplaintImage.latitude >= latitude - lat_delta,
-                ComplaintImage.latitude <= latitude + lat_delta,
-                ComplaintImage.longitude >= longitude - lon_delta,
-                ComplaintImage.longitude <= longitude + lon_delta,
+    Returns:
+        One (is_duplicate, reason, existing_image) tuple per item, as returned by
+        check_duplicate_image. For a duplicate within the batch, existing_image
+        has "batch_index" (the accepted item it repeats) and no "id".
+    """
+    results = []
+    accepted = []  # (index, item) accepted so far
+    all_candidates = None  # hash-only candidates, shared by items without location
+
+    for index, item in enumerate(items):
+        image_hash = item["image_hash"]
+        lat, lon = item.get("latitude"), item.get("longitude")
+        located = _has_location(lat, lon)
+
+        # 1. Earlier images of this batch
+        earlier = [
+            (i, other) for i, other in accepted
+            if not located or _has_location(other.get("latitude"), other.get("longitude"))
+        ]
+        distances = [None] * len(earlier)
+        if located and earlier:
+            dist, within = distances_within(
+                lat, lon,
+                [other["latitude"] for _, other in earlier],
+                [other["longitude"] for _, other in earlier],
+                distance_threshold,
             )
-            .all()
+            earlier = [pair for pair, keep in zip(earlier, within) if keep]
+            distances = dist[within].tolist()
+        found = _match_index(
+            image_hash,
+            item.get("fingerprint"),
+            [other["image_hash"] for _, other in earlier],
+            [other.get("fingerprint") for _, other in earlier],
+            hash_threshold,
         )
-    else:
-        # No reliable location: compare against ALL images using hash only
-        nearby_images = (
-            db.query(ComplaintImage)
-            .filter(ComplaintImage.image_hash.isnot(None))
-            .all()
-        )
-    
-    # Check each nearby image
-    for existing_image in nearby_images:
-        # Calculate exact distance using Haversine formula when we have location
-        distance = None
-        if has_location and existing_image.latitude is not None and existing_image.longitude is not None:
-            distance = calculate_distance(
-                latitude,
-                longitude,
-                existing_image.latitude,
-                existing_image.longitude,
-            )
-            # Only check images within distance threshold
-            if distance > distance_threshold:
-                continue
-        
-        # Check if images are similar
-        if existing_image.image_hash and compare_image_hashes(
-            new_image_hash,
-            existing_image.image_hash,
-            threshold=hash_threshold,
-        ):
-            # Similar image (and, when available, same location) → REJECT
-            # Fetch ticket and sub_ticket information for user-friendly message
-            sub_ticket = db.query(SubTicket).filter(
-                SubTicket.sub_id == existing_image.sub_id
-            ).first()
-            
-            ticket_info = None
-            if sub_ticket:
-                ticket = db.query(Ticket).filter(
-                    Ticket.ticket_id == sub_ticket.ticket_id
-                ).first()
-                
-                if ticket:
-                    ticket_info = {
-                        "ticket_id": ticket.ticket_id,
-                        "sub_id": sub_ticket.sub_id,
-                        "issue_type": sub_ticket.issue_type,
-                        "authority": sub_ticket.authority,
-                        "status": sub_ticket.status
-                    }
-            
-            # User-friendly message
-            user_message = "This complaint is already registered. Thanks for your concern."
-            if ticket_info:
-                user_message += f" Ticket ID: {ticket_info['ticket_id']}"
-            
-            return (
+        if found is not None:
+            i, distance = earlier[found][0], distances[found]
+            results.append((
                 True,
-                user_message,
+                BATCH_DUPLICATE_MESSAGE,
                 {
-                    "id": existing_image.id,
-                    "sub_id": existing_image.sub_id,
-                    "latitude": existing_image.latitude,
-                    "longitude": existing_image.longitude,
+                    "batch_index": i,
+                    "latitude": items[i].get("latitude"),
+                    "longitude": items[i].get("longitude"),
                     "distance_meters": round(distance, 2) if distance is not None else None,
-                    "ticket_info": ticket_info,
-                    "message": user_message
+                    "ticket_info": None,
+                    "message": BATCH_DUPLICATE_MESSAGE
                 }
-            )
-    
-    # No duplicate found → ACCEPT
-    return False, None, None
+            ))
+            continue
+
+        # 2. Stored images
+        if located:
+            candidates, distances = _candidates(db, lat, lon, distance_threshold)
+        else:
+            if all_candidates is None:
+                all_candidates, _ = _candidates(db, None, None, distance_threshold)
+            candidates, distances = all_candidates, None
+        match, distance = _first_match(image_hash, item.get("fingerprint"), candidates, distances, hash_threshold)
+        if match is not None:
+            results.append(_duplicate_of(db, match, distance))
+            continue
+
+        accepted.append((index, item))
+        results.append((False, None, None))
+
+    return results
 
 
 def should_accept_image(
@@ -0,0 +1,423 @@
+"""
+Image Embeddings
+Semantic similarity search over stored complaint images. Hashes and
+fingerprints find the same photo again; embeddings find photos of the same
+kind of problem (another overflowing bin, another flooded underpass) whose
+pixels have nothing in common.
+
+- Extraction: YOLOv5Service.embed_image pools the feature maps the Detect
+  head receives (P3/P4/P5). Each scale is power- and L2-normalized so all
+  three count equally, the scales are concatenated, and a fixed random
+  projection (seeded, so identical in every process) reduces them to
+  EMBEDDING_DIM. Vectors are unit length, so a dot product is the cosine.
+- Storage: one append-only file of (image id, float16 vector) records under
+  EMBEDDINGS_DIR, memory-mapped for search; other processes' appends are
+  picked up on the next search. Re-embedding or removing an image
+  tombstones its old record (id -1); build_embeddings.py --compact drops them.
+- Index: below IVF_MIN_VECTORS a query is an exhaustive scan of the matrix.
+  From there an IVF index (k-means centroids + inverted lists, NPROBE lists
+  probed per query) is trained in a background thread and saved next to the
+  vectors. Records appended after training are scanned exhaustively until
+  they outnumber the trained ones, which triggers a retrain.
+
+Vectors depend on the weights; run build_embeddings.py --rebuild after
+changing models. EMBEDDINGS_ENABLED=true turns on indexing at upload and
+GET/POST /api/complaints/similar.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_ENABLED = os.getenv("EMBEDDINGS_ENABLED", "false").lower() == "true"
+EMBEDDINGS_DIR = Path(os.getenv("EMBEDDINGS_DIR", "uploads/embeddings"))
+
+EMBEDDING_DIM = 256
+PROJECTION_SEED = 5  # changing it invalidates every stored vector
+IVF_MIN_VECTORS = int(os.getenv("EMBEDDINGS_IVF_MIN", "20000"))  # exhaustive scan below this
+NPROBE = int(os.getenv("EMBEDDINGS_NPROBE", "16"))  # inverted lists scanned per query
+KMEANS_ITERATIONS = 12
+KMEANS_SAMPLE_PER_LIST = 64  # training vectors per centroid
+SCAN_CHUNK = 65536  # rows converted to float32 at a time
+
+RECORD = np.dtype([("id", "<i8"), ("vector", "<f2", (EMBEDDING_DIM,))])
+VECTORS_FILE = "vectors.bin"
+IVF_FILE = "ivf.npz"
+
+
+# ---------------- Vectors ----------------
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+_projections = {}
+
+
+def _projection(feature_dim: int) -> np.ndarray:
+    """Gaussian random projection feature_dim -> EMBEDDING_DIM (roughly preserves cosines)"""
+    matrix = _projections.get(feature_dim)
+    if matrix is None:
+        rng = np.random.default_rng(PROJECTION_SEED)
+        matrix = rng.standard_normal((feature_dim, EMBEDDING_DIM)).astype(np.float32) / np.sqrt(EMBEDDING_DIM)
+        _projections[feature_dim] = matrix
+    return matrix
+
+
+def embedding_from_features(features: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Compact unit vector from pooled backbone features.
+
+    Args:
+        features: 1-D arrays, one per feature scale (YOLOv5Service.embed_image)
+
+    Returns:
+        float32 array of EMBEDDING_DIM values with unit L2 norm
+    """
+    parts = []
+    for f in features:
+        f = np.asarray(f, dtype=np.float32)
+        f = np.sign(f) * np.sqrt(np.abs(f))  # power normalization: damp a few dominant channels
+        parts.append(_normalize(f))
+    x = np.concatenate(parts)
+    if len(x) > EMBEDDING_DIM:
+        x = x @ _projection(len(x))
+    elif len(x) < EMBEDDING_DIM:
+        x = np.pad(x, (0, EMBEDDING_DIM - len(x)))
+    return _normalize(x)
+
+
+def embed_images(images: List[bytes]) -> List[Optional[np.ndarray]]:
+    """
+    Embedding of many encoded images with the active detection model.
+
+    Runs in-process: with YOLO_WORKERS set, the pooled service falls back to
+    the model registry for embed_image.
+
+    Returns:
+        One vector per image, None where the image can't be decoded or the
+        weights have no PyTorch layers to read (ONNX / TensorRT)
+    """
+    from yolo_service import get_yolo_service, decode_image
+
+    service = get_yolo_service()
+    vectors = []
+    for image_bytes in images:
+        features = None
+        try:
+            # The network sees a letterboxed img_size input, so a reduced decode loses nothing
+            im0, _ = decode_image(image_bytes, service.img_size)
+            if im0 is not None:
+                features = service.embed_image(im0)
+        except Exception as e:
+            logger.warning(f"Embedding failed: {e}")
+        vectors.append(embedding_from_features(features) if features else None)
+    return vectors
+
+
+# ---------------- IVF ----------------
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid of each vector (by cosine)"""
+    return np.argmax(vectors @ centroids.T, axis=1)
+
+
+def _kmeans(data: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means; returns (k, dim) unit centroids"""
+    centroids = data[rng.choice(len(data), k, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _assign(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        empty = np.bincount(labels, minlength=k) == 0
+        if empty.any():  # re-seed empty lists with random points
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted lists over the first `trained` records of a store"""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, trained: int):
+        self.centroids = centroids  # (nlist, dim) float32
+        self.order = order  # record rows grouped by list
+        self.offsets = offsets  # list i is order[offsets[i]:offsets[i + 1]]
+        self.trained = trained
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, seed: int = 0) -> "IVFIndex":
+        """Build from (n, dim) vectors (float16 memmap rows are fine)"""
+        n = len(vectors)
+        nlist = int(np.clip(np.sqrt(n), 16, 4096))
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, min(n, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+        centroids = _kmeans(vectors[sample_rows].astype(np.float32), nlist, rng)
+        labels = np.concatenate([
+            _assign(vectors[start:start + SCAN_CHUNK].astype(np.float32), centroids)
+            for start in range(0, n, SCAN_CHUNK)
+        ])
+        order = np.argsort(labels, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))])
+        return cls(centroids, order, offsets, n)
+
+    def probe(self, query: np.ndarray, nprobe: int = NPROBE) -> np.ndarray:
+        """Trained record rows in the nprobe lists closest to the query"""
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+    def save(self, path: Path):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets, trained=self.trained)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"], data["order"], data["offsets"], int(data["trained"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# ---------------- Store ----------------
+class EmbeddingIndex:
+    """
+    Memory-mapped float16 vectors keyed by complaint image id, with
+    exhaustive or IVF search.
+    """
+
+    def __init__(self, directory: Path = EMBEDDINGS_DIR):
+        self.directory = Path(directory)
+        self.path = self.directory / VECTORS_FILE
+        self.ivf_path = self.directory / IVF_FILE
+        self._lock = threading.Lock()
+        self._records = None  # read-only memmap of RECORD, None while empty
+        self._file = (None, 0)  # (inode, mapped bytes)
+        self._ivf: Optional[IVFIndex] = None
+        self._ivf_loaded = False
+        self._trainer: Optional[threading.Thread] = None
+
+    def _refresh(self):
+        """Map the records on disk, including appends made since the last call. Caller holds the lock."""
+        try:
+            stat = os.stat(self.path)
+            inode, size = stat.st_ino, stat.st_size - stat.st_size % RECORD.itemsize  # skip a half-written record
+        except FileNotFoundError:
+            inode, size = None, 0
+        if (inode, size) != self._file:
+            if inode != self._file[0]:  # replaced (compacted / rebuilt): the lists point at old rows
+                self._ivf, self._ivf_loaded = None, False
+            self._records = np.memmap(self.path, dtype=RECORD, mode="r", shape=(size // RECORD.itemsize,)) if size else None
+            self._file = (inode, size)
+        return self._records
+
+    def __len__(self) -> int:
+        with self._lock:
+            records = self._refresh()
+            return 0 if records is None else int((records["id"] >= 0).sum())
+
+    def ids(self) -> np.ndarray:
+        """Image ids with a live vector"""
+        with self._lock:
+            records = self._refresh()
+            if records is None:
+                return np.empty(0, dtype=np.int64)
+            ids = np.asarray(records["id"])
+            return ids[ids >= 0]
+
+    def vector(self, image_id: int) -> Optional[np.ndarray]:
+        """Stored vector of an image (float32), or None"""
+        with self._lock:
+            records = self._refresh()
+            if records is None:
+                return None
+            rows = np.flatnonzero(records["id"] == image_id)
+            return records["vector"][rows[-1]].astype(np.float32) if rows.size else None
+
+    def add(self, image_ids: Sequence[int], vectors: Sequence[np.ndarray]):
+        """Append vectors, replacing any stored for the same images"""
+        if not len(image_ids):
+            return
+        records = np.zeros(len(image_ids), dtype=RECORD)
+        records["id"] = image_ids
+        records["vector"] = np.asarray(vectors, dtype=np.float32)
+        self.remove(image_ids)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = memoryview(records.tobytes())
+        # One O_APPEND write keeps concurrent writers (other API workers) from interleaving records
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+
+    def remove(self, image_ids: Iterable[int]) -> int:
+        """Tombstone the vectors of images; returns how many records were dropped"""
+        with self._lock:
+            records = self._refresh()
+            if records is None:
+                return 0
+            rows = np.flatnonzero(np.isin(records["id"], np.fromiter(image_ids, dtype=np.int64)))
+            if rows.size:
+                writable = np.memmap(self.path, dtype=RECORD, mode="r+", shape=records.shape)
+                writable["id"][rows] = -1
+                writable.flush()
+                del writable
+            return int(rows.size)
+
+    def compact(self) -> int:
+        """Rewrite the file without tombstones; returns the number of live records"""
+        with self._lock:
+            records = self._refresh()
+            if records is None:
+                return 0
+            live = np.asarray(records[records["id"] >= 0])
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            live.tofile(tmp)
+            os.replace(tmp, self.path)
+            self.ivf_path.unlink(missing_ok=True)
+            self._refresh()
+            return len(live)
+
+    def clear(self):
+        """Delete every vector and the IVF index"""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self.ivf_path.unlink(missing_ok=True)
+            self._records, self._file = None, (None, 0)
+            self._ivf, self._ivf_loaded = None, False
+
+    # ---- search ----
+    def _current_ivf(self, records) -> Optional[IVFIndex]:
+        """IVF index for the records, (re)training in the background when due. Caller holds the lock."""
+        n = len(records)
+        if n < IVF_MIN_VECTORS:
+            return None
+        if not self._ivf_loaded:
+            self._ivf = IVFIndex.load(self.ivf_path)
+            self._ivf_loaded = True
+        if self._ivf is not None and self._ivf.trained > n:
+            self._ivf = None  # saved for a different file
+        if (self._ivf is None or n > 2 * self._ivf.trained) and not self.training:
+            self._trainer = threading.Thread(
+                target=self._train, args=(records, self._file[0]), name="embeddings-ivf-train", daemon=True
+            )
+            self._trainer.start()
+        return self._ivf
+
+    @property
+    def training(self) -> bool:
+        return self._trainer is not None and self._trainer.is_alive()
+
+    def _train(self, records, inode):
+        try:
+            ivf = IVFIndex.train(records["vector"])
+        except Exception as e:
+            logger.error(f"IVF training failed: {e}")
+            return
+        with self._lock:
+            if inode != self._file[0]:
+                return  # file was replaced meanwhile
+            ivf.save(self.ivf_path)
+            self._ivf = ivf
+        logger.info(f"IVF index trained on {ivf.trained} vectors ({len(ivf.centroids)} lists)")
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Images whose vectors are most similar to a query vector.
+
+        Args:
+            query: Vector from embedding_from_features
+            k: Number of results
+            exclude: Image ids to leave out (e.g. the query image)
+
+        Returns:
+            Up to k (image_id, cosine similarity) pairs, most similar first
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            records = self._refresh()
+            if records is None:
+                return []
+            ivf = self._current_ivf(records)
+
+        n = len(records)
+        vectors = records["vector"]
+        if ivf is None:
+            rows = None
+            scores = np.concatenate([
+                vectors[start:start + SCAN_CHUNK].astype(np.float32) @ query for start in range(0, n, SCAN_CHUNK)
+            ])
+        else:
+            rows = np.concatenate([ivf.probe(query), np.arange(ivf.trained, n)])
+            rows.sort()  # sequential reads from the memmap
+            scores = vectors[rows].astype(np.float32) @ query
+
+        ids = np.asarray(records["id"] if rows is None else records["id"][rows])
+        valid = ids >= 0
+        excluded = np.fromiter(exclude, dtype=np.int64)
+        if excluded.size:
+            valid &= ~np.isin(ids, excluded)
+        ids, scores = ids[valid], scores[valid]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        best = np.argsort(-scores, kind="stable")
+        return [(int(i), float(s)) for i, s in zip(ids[best], scores[best])]
+
+
+_index: Optional[EmbeddingIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> EmbeddingIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = EmbeddingIndex()
+    return _index
+
+
+# ---------------- Ingest ----------------
+def index_images(images: List[Tuple[int, bytes]]) -> int:
+    """
+    Embed stored images and add them to the index.
+
+    Args:
+        images: (complaint image id, image bytes) pairs
+
+    Returns:
+        Number of images indexed
+    """
+    vectors = embed_images([data for _, data in images])
+    done = [(image_id, v) for (image_id, _), v in zip(images, vectors) if v is not None]
+    if done:
+        get_index().add([i for i, _ in done], [v for _, v in done])
+    return len(done)
+
+
+# Uploads hand their images to one background thread, so indexing never adds to request latency
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings")
+
+
+def _index_logged(images: List[Tuple[int, bytes]]):
+    try:
+        index_images(images)
+    except Exception as e:
+        logger.error(f"Indexing embeddings failed for images {[i for i, _ in images]}: {e}")
+
+
+def index_in_background(images: List[Tuple[int, bytes]]):
+    """Queue stored images for indexing (no-op unless EMBEDDINGS_ENABLED)"""
+    if EMBEDDINGS_ENABLED and images:
+        _executor.submit(_index_logged, images)
@@ -0,0 +1,199 @@
+"""
+Composite Image Fingerprints
+A richer near-duplicate signal than the 64-bit pHash alone, used to re-rank
+the candidates of a duplicate check:
+- pHash (DCT): overall structure, robust to recompression and scaling
+- dHash (horizontal gradients): edges, tolerant to exposure changes
+- aHash (8x8 block means above their median): coarse layout, tolerant to
+  re-framing. This is also what a Haar wHash with the lowest LL removed
+  (imagehash.whash) reduces to, since Haar approximations are block means
+- colour histogram (4x4x4 RGB bins): tells apart scenes that share a texture
+- detail: contrast of the grayscale thumbnail; the hashes of nearly uniform
+  images (plain asphalt, sky) are mostly noise, so such pairs need a higher score
+
+A fingerprint is stored per image in complaint_images.fingerprint as one hex
+string. Its pHash part is identical to image_hash, so both come from a single
+decode (calculate_signatures). Scoring a query against many candidates is a
+handful of array operations.
+
+DEDUP_SCORING=composite makes deduplication use the weighted score; the
+default, "phash", keeps the plain Hamming distance check.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app_utils.image_hash import (
+    PHASH_AVAILABLE, HASH_SIZE, DCT_SIZE, Image,
+    decode_for_hashing, grayscale_pixels, map_images, phash_hex, calculate_md5_hash,
+)
+
+SCORING = os.getenv("DEDUP_SCORING", "phash")  # "phash" or "composite"
+
+FINGERPRINT_VERSION = 1
+HIST_LEVELS = 4  # per channel, 4x4x4 = 64 bins
+HIST_SIZE = 32  # thumbnail side the histogram is counted on
+HASH_BYTES = HASH_SIZE * HASH_SIZE // 8
+# version | pHash | dHash | aHash | detail | histogram
+_LAYOUT = (1, HASH_BYTES, HASH_BYTES, HASH_BYTES, 1, HIST_LEVELS ** 3)
+FINGERPRINT_BYTES = sum(_LAYOUT)
+_HASHES = slice(1, 1 + 3 * HASH_BYTES)
+_DETAIL = 1 + 3 * HASH_BYTES
+_HIST = slice(_DETAIL + 1, FINGERPRINT_BYTES)
+
+# Weights of the per-signal similarities (each 0..1); they sum to 1.
+# Weights and thresholds favour precision (a false match rejects a real
+# complaint); re-check them with evaluate_dedup.py when changing any of them.
+# The aHash carries the most weight because it is the signal that survives
+# re-framing and re-exposure: on the synthetic set (two seeds) equal weights
+# lose 4-6 points of precision, dropping the aHash 8-13, and 0.60 trades
+# precision for recall.
+WEIGHTS = {"phash": 0.25, "dhash": 0.15, "ahash": 0.45, "color": 0.15}
+SCORE_THRESHOLD = float(os.getenv("DEDUP_SCORE_THRESHOLD", "0.72"))
+# Below this grayscale standard deviation an image counts as low-detail
+LOW_DETAIL = 6.0
+LOW_DETAIL_THRESHOLD = float(os.getenv("DEDUP_LOW_DETAIL_THRESHOLD", "0.85"))
+
+_WEIGHT_VECTOR = np.array([WEIGHTS["phash"], WEIGHTS["dhash"], WEIGHTS["ahash"]])
+
+
+def _thumbnails(image_bytes: bytes):
+    """(32x32 gray, 9x8 gray, 32x32 RGB) of an image, or None if undecodable"""
+    img = decode_for_hashing(image_bytes)
+    if img is None:
+        return None
+    try:
+        return (
+            grayscale_pixels(img, (DCT_SIZE, DCT_SIZE)),
+            grayscale_pixels(img, (HASH_SIZE + 1, HASH_SIZE)),
+            np.asarray(img.convert("RGB").resize((HIST_SIZE, HIST_SIZE), Image.BILINEAR)),
+        )
+    except Exception:
+        return None
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(n, 8, 8) booleans -> (n, 8) bytes, row-major like imagehash's hex"""
+    return np.packbits(bits.reshape(len(bits), -1), axis=1)
+
+
+def _fingerprints(thumbnails: List[tuple]) -> List[bytes]:
+    gray = np.stack([t[0] for t in thumbnails])
+    small = np.stack([t[1] for t in thumbnails])
+    rgb = np.stack([t[2] for t in thumbnails]).astype(np.int64)
+    n = len(thumbnails)
+
+    phash = np.frombuffer(bytes.fromhex("".join(phash_hex(gray))), dtype=np.uint8).reshape(n, HASH_BYTES)
+    dhash = _pack(small[:, :, 1:] > small[:, :, :-1])
+    # Means of the 4x4 blocks of the 32x32 image, above their median
+    blocks = gray.reshape(n, HASH_SIZE, DCT_SIZE // HASH_SIZE, HASH_SIZE, DCT_SIZE // HASH_SIZE).mean(axis=(2, 4))
+    flat = blocks.reshape(n, -1)
+    ahash = _pack(flat > np.median(flat, axis=1, keepdims=True))
+    detail = np.clip(np.rint(gray.reshape(n, -1).std(axis=1)), 0, 255).astype(np.uint8)[:, None]
+
+    levels = rgb * HIST_LEVELS // 256
+    bins = (levels[..., 0] * HIST_LEVELS + levels[..., 1]) * HIST_LEVELS + levels[..., 2]
+    hist = np.stack([np.bincount(b.ravel(), minlength=HIST_LEVELS ** 3) for b in bins])
+    hist = np.rint(hist * 255 / (HIST_SIZE * HIST_SIZE)).astype(np.uint8)
+
+    version = np.full((n, 1), FINGERPRINT_VERSION, dtype=np.uint8)
+    packed = np.hstack([version, phash, dhash, ahash, detail, hist])
+    return [row.tobytes() for row in packed]
+
+
+def calculate_signatures(images: List[bytes]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Image hash and composite fingerprint of many images, from one decode each.
+
+    Args:
+        images: Image file bytes, one per image
+
+    Returns:
+        (image_hash, fingerprint) per image; image_hash equals
+        calculate_image_hash(), fingerprint is None when the image can't be
+        decoded (image_hash is then the MD5)
+    """
+    if not PHASH_AVAILABLE:
+        return [(calculate_md5_hash(image_bytes), None) for image_bytes in images]
+
+    thumbnails = map_images(_thumbnails, images)
+    decoded = [i for i, t in enumerate(thumbnails) if t is not None]
+    fingerprints = [None] * len(images)
+    if decoded:
+        for i, value in zip(decoded, _fingerprints([thumbnails[i] for i in decoded])):
+            fingerprints[i] = value.hex()
+    return [
+        (phash_of(fp) if fp else calculate_md5_hash(image_bytes), fp)
+        for image_bytes, fp in zip(images, fingerprints)
+    ]
+
+
+def calculate_fingerprint(image_bytes: bytes) -> Optional[str]:
+    return calculate_signatures([image_bytes])[0][1]
+
+
+def is_fingerprint(value: Optional[str]) -> bool:
+    return bool(value) and len(value) == 2 * FINGERPRINT_BYTES and value[:2] == f"{FINGERPRINT_VERSION:02x}"
+
+
+def phash_of(fingerprint: str) -> str:
+    """The pHash (image_hash) part of a fingerprint"""
+    return fingerprint[2:2 + 2 * HASH_BYTES]
+
+
+def _parse(fingerprints: List[str]) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex("".join(fingerprints)), dtype=np.uint8).reshape(-1, FINGERPRINT_BYTES)
+
+
+def similarities(query: str, candidates: List[str]) -> np.ndarray:
+    """
+    Per-signal similarities of a fingerprint to many others.
+
+    Args:
+        query: Fingerprint of the new image
+        candidates: Fingerprints to compare with (all is_fingerprint)
+
+    Returns:
+        (n, 4) array of pHash, dHash, aHash and colour similarity, each 0..1
+    """
+    q = _parse([query])[0]
+    c = _parse(candidates)
+    # Hamming distance of each 64-bit hash: popcount of the XOR
+    diff = np.unpackbits(c[:, _HASHES] ^ q[_HASHES], axis=1).reshape(len(c), 3, HASH_SIZE * HASH_SIZE)
+    hashes = 1.0 - diff.sum(axis=2) / (HASH_SIZE * HASH_SIZE)
+    # Histogram intersection, relative to the query's (rounded) total
+    color = np.minimum(c[:, _HIST], q[_HIST]).sum(axis=1, dtype=np.int64) / max(int(q[_HIST].sum()), 1)
+    return np.column_stack([hashes, np.minimum(color, 1.0)])
+
+
+def score(query: str, candidates: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted near-duplicate score of a fingerprint against many others.
+
+    Args:
+        query: Fingerprint of the new image
+        candidates: Fingerprints to compare with (all is_fingerprint)
+
+    Returns:
+        Tuple of (scores 0..1, threshold each score must reach to count as a
+        duplicate: SCORE_THRESHOLD, or LOW_DETAIL_THRESHOLD when either image
+        is low-detail)
+    """
+    sims = similarities(query, candidates)
+    scores = sims[:, :3] @ _WEIGHT_VECTOR + sims[:, 3] * WEIGHTS["color"]
+    detail = np.minimum(_parse(candidates)[:, _DETAIL], _parse([query])[0, _DETAIL])
+    thresholds = np.where(detail < LOW_DETAIL, LOW_DETAIL_THRESHOLD, SCORE_THRESHOLD)
+    return scores, thresholds
+
+
+def best_match(query: str, candidates: List[str]) -> Optional[Tuple[int, float]]:
+    """(index, score) of the highest-scoring candidate that passes its threshold, or None"""
+    if not candidates:
+        return None
+    scores, thresholds = score(query, candidates)
+    scores = np.where(scores >= thresholds, scores, -1.0)
+    best = int(np.argmax(scores))
+    if scores[best] < 0:
+        return None
+    return best, float(scores[best])
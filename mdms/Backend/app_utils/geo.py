@@ -1,5 +1,8 @@
+import os
 import math
 
+import numpy as np
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points 
@@ -20,35 +23,222 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     r = 6371000 # Radius of earth in meters
     return c * r
 
-def group_by_location(items, distance_threshold=20):
+EARTH_RADIUS_M = 6371000
+
+# Below this radius the equirectangular approximation is within ~0.01% of haversine
+EQUIRECTANGULAR_MAX_M = 1000
+
+# Batch grouping: "grid" (leader clustering, every member within the threshold
+# of the group's first item) or "components" (DBSCAN-style, chains of nearby points)
+GROUPING_MODE = os.getenv("LOCATION_GROUPING_MODE", "grid")
+
+
+def _as_degrees(values):
+    """float64 array; None becomes NaN so missing coordinates compare as far away"""
+    return np.asarray(values, dtype=np.float64) if values is not None else np.float64(np.nan)
+
+
+def haversine_many(lat, lon, lats, lons):
+    """
+    Vectorized calculate_distance: meters from (lat, lon) to every (lats[i], lons[i]).
+    All arguments broadcast like NumPy arrays, so lat/lon may be arrays too.
+    Missing coordinates (None/NaN) give inf, as in calculate_distance.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(_as_degrees(v)) for v in (lat, lon, lats, lons))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    dist = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return np.where(np.isnan(dist), np.inf, dist)
+
+
+def equirectangular_many(lat, lon, lats, lons):
+    """
+    Flat-earth approximation of haversine_many for short distances (no
+    trigonometry per point beyond one cosine); use for radii up to
+    EQUIRECTANGULAR_MAX_M.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(_as_degrees(v)) for v in (lat, lon, lats, lons))
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    dist = EARTH_RADIUS_M * np.hypot(x, y)
+    return np.where(np.isnan(dist), np.inf, dist)
+
+
+def distance_matrix(lats1, lons1, lats2=None, lons2=None):
+    """
+    Pairwise haversine distances in meters, shape (len(lats1), len(lats2)).
+    With only one set of points, distances between the points themselves.
+    """
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+    lats1, lons1 = _as_degrees(lats1)[:, None], _as_degrees(lons1)[:, None]
+    lats2, lons2 = _as_degrees(lats2)[None, :], _as_degrees(lons2)[None, :]
+    return haversine_many(lats1, lons1, lats2, lons2)
+
+
+def distances_within(lat, lon, lats, lons, radius):
+    """
+    Distances from (lat, lon) to each point and the mask of those within radius
+    meters. Small radii use the equirectangular approximation.
+
+    Returns:
+        Tuple of (distances: ndarray, within: boolean ndarray)
+    """
+    distance_fn = equirectangular_many if radius <= EQUIRECTANGULAR_MAX_M else haversine_many
+    dist = distance_fn(lat, lon, lats, lons)
+    return dist, dist <= radius
+
+
+def bounding_box(lat, lon, radius):
+    """
+    (min_lat, max_lat, min_lon, max_lon) enclosing a circle of radius meters,
+    for an indexed pre-filter before exact distances
+    """
+    lat_delta = math.degrees(radius / EARTH_RADIUS_M)
+    cos_lat = math.cos(math.radians(min(abs(lat) + lat_delta, 90.0)))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(180.0, lat_delta / cos_lat)
+    return lat - lat_delta, lat + lat_delta, lon - lon_delta, lon + lon_delta
+
+
+def _grid_cells(lats, lons, cell_size):
+    """
+    Integer (row, col) cell of each point on a grid of cell_size meters.
+    Longitude is scaled with the smallest cos(latitude) in the batch, so two
+    points within cell_size of each other are never more than one cell apart.
+    """
+    meters_per_deg = math.radians(1) * EARTH_RADIUS_M
+    lon_scale = max(float(np.cos(np.radians(np.abs(lats).max()))), 1e-6)
+    rows = np.floor(lats * meters_per_deg / cell_size).astype(np.int64)
+    cols = np.floor(lons * meters_per_deg * lon_scale / cell_size).astype(np.int64)
+    return rows, cols
+
+
+def _group_leader(lats, lons, rows, cols, distance_threshold):
+    """
+    Leader clustering on the grid: each point joins the nearest group whose
+    first point is within the threshold, looking only at the 3x3 neighbouring
+    cells, otherwise it starts a new group. Returns a group index per point.
+    """
+    labels = np.empty(len(lats), dtype=np.int64)
+    leaders = []  # point index of each group's first point
+    leaders_by_cell = {}
+    for i, (row, col) in enumerate(zip(rows.tolist(), cols.tolist())):
+        candidates = [
+            g
+            for dr in (-1, 0, 1)
+            for dc in (-1, 0, 1)
+            for g in leaders_by_cell.get((row + dr, col + dc), ())
+        ]
+        if candidates:
+            reps = [leaders[g] for g in candidates]
+            dist = haversine_many(lats[i], lons[i], lats[reps], lons[reps])
+            nearest = int(dist.argmin())
+            if dist[nearest] <= distance_threshold:
+                labels[i] = candidates[nearest]
+                continue
+        labels[i] = len(leaders)
+        leaders_by_cell.setdefault((row, col), []).append(len(leaders))
+        leaders.append(i)
+    return labels
+
+
+def _neighbour_pairs(rows, cols):
+    """
+    All (i, j) point pairs in the same or adjacent cells, i < j, built with
+    sorted cell keys and searchsorted instead of per-cell Python loops
+    """
+    keys = (rows << 32) + cols
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    points = np.arange(len(keys))
+    pairs_i, pairs_j = [], []
+    # Same cell plus 4 forward neighbours covers every adjacent pair once
+    for dr, dc in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = keys + (dr << 32) + dc
+        starts = np.searchsorted(sorted_keys, target, side="left")
+        counts = np.searchsorted(sorted_keys, target, side="right") - starts
+        total = int(counts.sum())
+        if not total:
+            continue
+        i = np.repeat(points, counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(starts, counts) + np.arange(total) - first]
+        if (dr, dc) == (0, 0):
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(i)
+        pairs_j.append(j)
+    if not pairs_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def _group_components(lats, lons, rows, cols, distance_threshold):
+    """
+    Connected components of the "within threshold" graph (DBSCAN with
+    min_samples=1): points are linked through any chain of close neighbours,
+    independent of upload order. Returns a group label per point.
+    """
+    parent = list(range(len(lats)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    i, j = _neighbour_pairs(rows, cols)
+    close = haversine_many(lats[i], lons[i], lats[j], lons[j]) <= distance_threshold
+    for a, b in zip(i[close].tolist(), j[close].tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return np.array([find(k) for k in range(len(lats))], dtype=np.int64)
+
+
+def group_by_location(items, distance_threshold=20, mode=None):
     """
     Group items by GPS coordinates.
     items: List of dicts, each containing 'latitude' and 'longitude'.
     distance_threshold: distance in meters.
+    mode: "grid" (default) or "components", see GROUPING_MODE.
+
+    Points are hashed into threshold-sized cells so each one is only compared
+    with its neighbouring cells, O(n) instead of O(n * groups). Items without
+    coordinates get a group of their own. Groups keep upload order, and the
+    first item of a group is its earliest upload.
     """
+    mode = mode or GROUPING_MODE
+    if mode not in ("grid", "components"):
+        raise ValueError(f"Unknown grouping mode '{mode}' (expected 'grid' or 'components')")
+
+    located = [
+        i for i, item in enumerate(items)
+        if item.get('latitude') is not None and item.get('longitude') is not None
+    ]
+    labels = {}
+    if located:
+        lats = np.array([items[i]['latitude'] for i in located], dtype=np.float64)
+        lons = np.array([items[i]['longitude'] for i in located], dtype=np.float64)
+        rows, cols = _grid_cells(lats, lons, max(distance_threshold, 1.0))
+        if mode == "components":
+            point_labels = _group_components(lats, lons, rows, cols, distance_threshold)
+        else:
+            point_labels = _group_leader(lats, lons, rows, cols, distance_threshold)
+        labels = dict(zip(located, point_labels.tolist()))
+
     groups = []
-    for item in items:
-        lat = item.get('latitude')
-        lon = item.get('longitude')
-        
-        found_group = False
-        
-        # Only try to group by distance if coordinates exist
-        if lat is not None and lon is not None:
-            for group in groups:
-                rep_lat = group[0].get('latitude')
-                rep_lon = group[0].get('longitude')
-                
-                if rep_lat is not None and rep_lon is not None:
-                    dist = calculate_distance(lat, lon, rep_lat, rep_lon)
-                    if dist <= distance_threshold:
-                        group.append(item)
-                        found_group = True
-                        break
-        
-        if not found_group:
+    group_of_label = {}
+    for i, item in enumerate(items):
+        label = labels.get(i)
+        if label is None:
             groups.append([item])
-    
+        elif label in group_of_label:
+            group_of_label[label].append(item)
+        else:
+            group_of_label[label] = [item]
+            groups.append(group_of_label[label])
+
     return groups
 
 def get_address_details(lat, lon):
@@ -2,20 +2,104 @@
 Image Hashing Utilities
 Provides functions for calculating and comparing image hashes for deduplication.
 Uses perceptual hashing (pHash) to detect similar images even with slight variations.
+
+The pHash is the same algorithm and hex format as imagehash.phash (8x8
+low-frequency DCT of a 32x32 grayscale image, bits above the median),
+computed with a NumPy DCT. JPEGs are decoded at reduced size (draft mode,
+down to PHASH_DECODE_SIZE), which skips most of the decoding of large
+photos. The result is not identical to imagehash.phash on the full-size
+decode: on 300 synthetic JPEGs (600-4000 px) about a quarter differed, by
+2 bits and up to 4 bits, against a duplicate threshold of 5. Stored hashes
+must therefore come from this engine too: migration 0005 rehashes the
+stored images, and running it (`python migrate.py`) is REQUIRED when
+deploying. Without it old and new hashes of the same photo can be up to
+4 bits apart, which eats most of the threshold.
 """
+import os
 import hashlib
 from io import BytesIO
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
 
 try:
-    import imagehash
     from PIL import Image
+    PHASH_AVAILABLE = True
+except ImportError:
+    PHASH_AVAILABLE = False
+    Image = None
+
+try:
+    import imagehash
     IMAGEHASH_AVAILABLE = True
 except ImportError:
     IMAGEHASH_AVAILABLE = False
-    Image = None
     imagehash = None
 
+HASH_SIZE = 8  # 8x8 = 64 bits
+DCT_SIZE = HASH_SIZE * 4  # imagehash's highfreq_factor
+# Smallest side JPEGs are decoded at; changing it changes hashes (rehash stored images)
+PHASH_DECODE_SIZE = 256
+PHASH_WORKERS = int(os.getenv("PHASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Unnormalised DCT-II as a matrix (scipy.fftpack.dct's default)"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return 2.0 * np.cos(np.pi * k * (2 * x + 1) / (2 * n))
+
+
+_DCT = _dct_matrix(DCT_SIZE)[:HASH_SIZE]  # only the low-frequency rows are used
+
+
+def decode_for_hashing(image_bytes: bytes):
+    """Image reduced as far as hashing allows, in L or RGB mode (None if undecodable)"""
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        # JPEG: let the decoder scale down (1/2 .. 1/8) instead of decoding every pixel
+        img.draft("RGB", (PHASH_DECODE_SIZE, PHASH_DECODE_SIZE))
+        if img.mode not in ("L", "RGB"):
+            # Handles RGBA, P, CMYK etc. the way the RGB conversion always has
+            img = img.convert("RGB")
+        img.load()
+        return img
+    except Exception:
+        return None
+
+
+def grayscale_pixels(img, size) -> np.ndarray:
+    """Grayscale pixels of img resized to size (w, h), the way imagehash prepares them"""
+    return np.asarray(img.convert("L").resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def map_images(func, images: list) -> list:
+    """func over the images, in PHASH_WORKERS threads for batches (decoding releases the GIL)"""
+    if len(images) > 1 and PHASH_WORKERS > 1:
+        with ThreadPoolExecutor(max_workers=min(PHASH_WORKERS, len(images))) as pool:
+            return list(pool.map(func, images))
+    return [func(item) for item in images]
+
+
+def _phash_pixels(image_bytes: bytes) -> Optional[np.ndarray]:
+    """32x32 grayscale pixels the pHash is computed from, or None if undecodable"""
+    img = decode_for_hashing(image_bytes)
+    if img is None:
+        return None
+    try:
+        return grayscale_pixels(img, (DCT_SIZE, DCT_SIZE))
+    except Exception:
+        return None
+
+
+def phash_hex(pixels: np.ndarray) -> List[str]:
+    """Hex pHashes of a stack of 32x32 grayscale images, shape (n, 32, 32)"""
+    low = _DCT @ pixels @ _DCT.T  # (n, 8, 8) low-frequency coefficients
+    flat = low.reshape(len(pixels), -1)
+    bits = flat > np.median(flat, axis=1, keepdims=True)
+    return [row.tobytes().hex() for row in np.packbits(bits, axis=1)]
+
 
 def calculate_perceptual_hash(image_bytes: bytes) -> Optional[str]:
     """
@@ -28,22 +112,34 @@ def calculate_perceptual_hash(image_bytes: bytes) -> Optional[str]:
     Returns:
         Hex string representation of the hash, or None if calculation fails
     """
-    if not IMAGEHASH_AVAILABLE:
-        # Fallback to MD5 if imagehash is not available
-        return calculate_md5_hash(image_bytes)
+    return calculate_perceptual_hashes([image_bytes])[0]
+
+
+def calculate_perceptual_hashes(images: List[bytes]) -> List[Optional[str]]:
+    """
+    Calculate perceptual hashes for many images at once: images are decoded
+    in parallel threads (the decoder releases the GIL) and the DCTs run as
+    one NumPy operation.
     
-    try:
-        img = Image.open(BytesIO(image_bytes))
-        # Convert to RGB if necessary (handles RGBA, P, etc.)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+    Args:
+        images: Image file bytes, one per image
         
-        # Calculate perceptual hash (8x8 = 64 bits)
-        phash = imagehash.phash(img, hash_size=8)
-        return str(phash)
-    except Exception as e:
-        # Fallback to MD5 on error
-        return calculate_md5_hash(image_bytes)
+    Returns:
+        Hex hashes in the same order (MD5 for images that can't be decoded)
+    """
+    if not PHASH_AVAILABLE:
+        # Fallback to MD5 if PIL is not available
+        return [calculate_md5_hash(image_bytes) for image_bytes in images]
+
+    pixels = map_images(_phash_pixels, images)
+
+    decoded = [i for i, p in enumerate(pixels) if p is not None]
+    hashes = [None] * len(images)
+    if decoded:
+        for i, value in zip(decoded, phash_hex(np.stack([pixels[i] for i in decoded]))):
+            hashes[i] = value
+    # Fallback to MD5 on error
+    return [h if h is not None else calculate_md5_hash(image_bytes) for h, image_bytes in zip(hashes, images)]
 
 
 def calculate_md5_hash(image_bytes: bytes) -> str:
@@ -94,6 +190,44 @@ def compare_image_hashes(hash1: Optional[str], hash2: Optional[str], threshold:
         return hash1 == hash2
 
 
+def hamming_distances(query_hash: str, hashes: List[Optional[str]]) -> np.ndarray:
+    """
+    Hamming distance of a hash to many stored hashes at once.
+
+    Perceptual hashes of the query's length are compared bit by bit (popcount
+    of the XOR); MD5 hashes, hashes of another length and malformed ones only
+    match exactly, as in compare_image_hashes.
+
+    Args:
+        query_hash: Hex hash of the query image
+        hashes: Stored hex hashes (None allowed)
+
+    Returns:
+        Float array: the distance per hash, 0 for an exact match, inf when
+        the hashes can't be compared
+    """
+    distances = np.array([0.0 if h == query_hash else np.inf for h in hashes])
+    if not query_hash or len(query_hash) == 32:
+        return distances
+    try:
+        query = np.frombuffer(bytes.fromhex(query_hash), dtype=np.uint8)
+    except ValueError:
+        return distances
+
+    rows, packed = [], []
+    for i, h in enumerate(hashes):
+        if h and len(h) == len(query_hash):
+            try:
+                packed.append(bytes.fromhex(h))
+                rows.append(i)
+            except ValueError:
+                pass
+    if rows:
+        stored = np.frombuffer(b"".join(packed), dtype=np.uint8).reshape(len(rows), -1)
+        distances[rows] = np.unpackbits(stored ^ query, axis=1).sum(axis=1)
+    return distances
+
+
 def calculate_image_hash(image_bytes: bytes, use_perceptual: bool = True) -> str:
     """
     Calculate hash for an image (perceptual or MD5).
@@ -114,3 +248,18 @@ def calculate_image_hash(image_bytes: bytes, use_perceptual: bool = True) -> str
     else:
         return calculate_md5_hash(image_bytes)
 
+
+def calculate_image_hashes(images: List[bytes], use_perceptual: bool = True) -> List[str]:
+    """
+    Calculate hashes for many images (see calculate_perceptual_hashes).
+    
+    Args:
+        images: Image file bytes, one per image
+        use_perceptual: If True, use perceptual hash; if False, use MD5
+        
+    Returns:
+        Hex string hashes in the same order
+    """
+    if use_perceptual:
+        return calculate_perceptual_hashes(images)
+    return [calculate_md5_hash(image_bytes) for image_bytes in images]
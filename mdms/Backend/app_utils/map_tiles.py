@@ -0,0 +1,242 @@
+"""
+Map Tiles
+Web-mercator tile math and the per-tile cluster cache behind
+GET /api/complaints/map.
+
+Every ticket stores the quadkey of its location at MAX_CELL_ZOOM in the
+indexed `tickets.map_cell` column (copied to sub_tickets, like image
+coordinates are). A quadkey's first z digits are the tile that contains it at
+zoom z, so one column serves every zoom level:
+- the rows of a map tile are a key range (`map_cell >= qk AND < qk + "4"`)
+- clusters at any zoom are a GROUP BY on a quadkey prefix
+Covering indexes let both cluster queries run on the indexes alone.
+
+Tiles are cached in-process. A ticket / sub-ticket write in this process drops
+the cached tiles containing it once its transaction commits (dropping them at
+flush time would let a concurrent reader cache the pre-commit rows again);
+MAP_CACHE_TTL bounds staleness from writes made by other workers.
+"""
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app_utils.metrics import record_cache
+
+MAX_CELL_ZOOM = 20  # ~38 m cells at the equator, finer than the map ever clusters
+CLUSTER_DEPTH = 3  # clusters are 1/8 of a tile (32 px on 256 px tiles)
+MAX_TILES = int(os.getenv("MAP_MAX_TILES", "256"))  # tiles per request (a 4K screen shows ~150)
+MAP_CACHE_TTL = float(os.getenv("MAP_CACHE_TTL", "30"))  # seconds
+MAP_CACHE_SIZE = int(os.getenv("MAP_CACHE_SIZE", "4096"))  # tiles
+
+MAX_LATITUDE = 85.05112878  # web-mercator limit
+
+
+def lonlat_to_tile(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """(x, y) of the web-mercator tile containing a point"""
+    n = 1 << zoom
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_to_quadkey(x: int, y: int, zoom: int) -> str:
+    digits = []
+    for i in range(zoom, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return "".join(digits)
+
+
+def quadkey_to_tile(quadkey: str) -> Tuple[int, int, int]:
+    x = y = 0
+    zoom = len(quadkey)
+    for i, digit in enumerate(quadkey):
+        mask = 1 << (zoom - i - 1)
+        d = int(digit)
+        if d & 1:
+            x |= mask
+        if d & 2:
+            y |= mask
+    return x, y, zoom
+
+
+def tile_center(quadkey: str) -> Tuple[float, float]:
+    """(lat, lon) of the centre of a tile"""
+    x, y, zoom = quadkey_to_tile(quadkey)
+    n = 1 << zoom
+    lon = (x + 0.5) / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return lat, lon
+
+
+def map_cell(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    """Value of tickets.map_cell for a location (None without coordinates)"""
+    if lat is None or lon is None:
+        return None
+    return tile_to_quadkey(*lonlat_to_tile(lat, lon, MAX_CELL_ZOOM), MAX_CELL_ZOOM)
+
+
+def tiles_in_bbox(west: float, south: float, east: float, north: float, zoom: int) -> List[str]:
+    """Quadkeys of the tiles at zoom that cover the bounding box"""
+    x0, y0 = lonlat_to_tile(north, west, zoom)
+    x1, y1 = lonlat_to_tile(south, east, zoom)
+    return [tile_to_quadkey(x, y, zoom) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def cell_zoom(zoom: int) -> int:
+    return min(zoom + CLUSTER_DEPTH, MAX_CELL_ZOOM)
+
+
+def quadkey_range(quadkey: str) -> Tuple[str, str]:
+    """[low, high) bounds of map_cell values inside a tile; "4" sorts after every digit"""
+    return quadkey, quadkey + "4"
+
+
+class TileCache:
+    """
+    LRU of tile quadkey -> clusters. A write drops the cached tiles that
+    contain the changed cell (every zoom level); entries also expire after ttl.
+    """
+
+    def __init__(self, max_size: int = MAP_CACHE_SIZE, ttl: float = MAP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # quadkey -> (stored_at, clusters)
+        self._generation = 0  # bumped on every invalidation
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, quadkey: str):
+        with self._lock:
+            entry = self._entries.get(quadkey)
+            if entry is not None:
+                stored_at, clusters = entry
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(quadkey)
+                    record_cache("map_tile", hit=True)
+                    return clusters
+                del self._entries[quadkey]
+        record_cache("map_tile", hit=False)
+        return None
+
+    def put(self, quadkey: str, clusters, generation: int):
+        """Store clusters read while the cache was at `generation`; skipped if a write happened since"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[quadkey] = (time.monotonic(), clusters)
+            self._entries.move_to_end(quadkey)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, cells=None):
+        """Drop the tiles containing any of the cells (all tiles when cells is None)"""
+        with self._lock:
+            self._generation += 1
+            if cells is None:
+                self._entries.clear()
+                return
+            for cell in cells:
+                for zoom in range(len(cell) + 1):
+                    self._entries.pop(cell[:zoom], None)
+
+
+tile_cache = TileCache()
+
+_PENDING_CELLS = "map_tiles_pending_cells"  # Session.info key: cells written in the open transaction
+
+
+def _on_change(mapper, connection, target):
+    """Mapper event: note the row's old and new map_cell; their tiles are dropped on commit"""
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import object_session
+    history = inspect(target).attrs.map_cell.history
+    cells = {c for c in (target.map_cell, *history.deleted) if c}
+    if not cells:
+        return
+    session = object_session(target)
+    if session is None:
+        tile_cache.invalidate(cells)
+        return
+    session.info.setdefault(_PENDING_CELLS, set()).update(cells)
+
+
+def _after_commit(session):
+    cells = session.info.pop(_PENDING_CELLS, None)
+    if cells:
+        tile_cache.invalidate(cells)
+
+
+def _after_rollback(session):
+    # A savepoint rollback leaves the enclosing transaction's writes pending
+    if not session.in_nested_transaction():
+        session.info.pop(_PENDING_CELLS, None)
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+def invalidate_on_change(*models):
+    """Keep the tile cache in sync with committed inserts, updates and deletes of models with a map_cell"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    for model in models:
+        if not event.contains(model.map_cell, "set", _load_previous):
+            # Load the previous map_cell on change even if it wasn't loaded, so its tiles are dropped too
+            event.listen(model.map_cell, "set", _load_previous, active_history=True, retval=True)
+        for name in ("after_insert", "after_update", "after_delete"):
+            if not event.contains(model, name, _on_change):
+                event.listen(model, name, _on_change)
+    for name, listener in (("after_commit", _after_commit), ("after_rollback", _after_rollback)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+def build_clusters(cell_rows, breakdown_rows, zoom: int) -> List[dict]:
+    """
+    One cluster per cell from
+    cell_rows: (cell, tickets, lat_sum, lon_sum, ticket_id) and
+    breakdown_rows: (cell, issue_type, status, sub_tickets, sub_id)
+    """
+    clusters = {}
+    for cell, tickets, lat_sum, lon_sum, ticket_id in cell_rows:
+        clusters[cell] = {
+            "cell": cell,
+            "zoom": cell_zoom(zoom),
+            "latitude": lat_sum / tickets,
+            "longitude": lon_sum / tickets,
+            "count": 0,
+            "issue_type": None,
+            "issue_types": {},
+            "statuses": {},
+            "ticket_id": ticket_id if tickets == 1 else None,
+            "sub_id": None,
+        }
+    for cell, issue_type, status, count, sub_id in breakdown_rows:
+        cluster = clusters.get(cell)
+        if cluster is None:
+            continue  # sub-ticket whose ticket has no location
+        cluster["count"] += count
+        cluster["issue_types"][issue_type] = cluster["issue_types"].get(issue_type, 0) + count
+        status = status or "open"
+        cluster["statuses"][status] = cluster["statuses"].get(status, 0) + count
+        cluster["sub_id"] = sub_id
+
+    result = []
+    for cluster in clusters.values():
+        if not cluster["count"]:
+            continue  # ticket without sub-tickets
+        cluster["issue_type"] = max(cluster["issue_types"].items(), key=lambda kv: (kv[1], kv[0]))[0]
+        if cluster["count"] != 1:
+            # A single complaint is shown as a marker with its ids; clusters only with counts
+            cluster["ticket_id"] = cluster["sub_id"] = None
+        result.append(cluster)
+    return result
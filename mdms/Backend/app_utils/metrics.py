@@ -0,0 +1,244 @@
+"""
+Metrics
+In-process Prometheus-style metrics, served as text at GET /metrics.
+
+- `timed("stage")` is a context manager / decorator (modelled on YOLOv5's
+  utils.general.Profile) that records how long an ingest stage took into the
+  mdms_stage_seconds histogram.
+- Gauges can be backed by a callback, so values like DB pool usage or model
+  queue depth are read when /metrics is scraped instead of being pushed.
+- record_cache() counts cache hits/misses per cache name.
+
+Kept dependency-free; the exposition format is the Prometheus text format 0.0.4.
+Metrics are per process, so inference pool workers report nothing here.
+"""
+import time
+import threading
+import contextlib
+from typing import Callable, Dict, Optional, Tuple
+
+# Seconds; ingest stages range from sub-millisecond hashing to multi-second inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # charset is appended by the response
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(_Metric):
+    """Monotonic counter, optionally labelled"""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Gauge(_Metric):
+    """Gauge set directly (set/inc/dec) or read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], Optional[float]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._value = 0.0
+        self._callback = callback
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    @contextlib.contextmanager
+    def track_inprogress(self):
+        """Count the wrapped block as in progress while it runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def render(self) -> str:
+        value = self._value
+        if self._callback is not None:
+            try:
+                value = self._callback()
+            except Exception:
+                value = None
+        if value is None:
+            return ""  # not applicable (e.g. no pool configured)
+        return self.header() + f"{self.name} {_format_value(value)}\n"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with Prometheus bucket semantics (le = less or equal)"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Registry:
+    """Ordered set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def render(self) -> str:
+        return "".join(m.render() for m in list(self._metrics.values()))
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mdms_stage_seconds",
+    "Time spent per ingest stage (read, exif, phash, dedup_query, dedup_compare, geocode, "
+    "inference, nms, encode, disk_write, db_commit)",
+    labelnames=("stage",),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "mdms_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    labelnames=("cache", "result"),
+))
+MODEL_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "mdms_model_queue_depth",
+    "Detection calls queued or running (threadpool and inference workers)",
+))
+
+
+class timed(contextlib.ContextDecorator):
+    """
+    Time a block into mdms_stage_seconds{stage=...}
+
+    Usage:
+        with timed("phash"):
+            image_hash = calculate_image_hash(image_bytes)
+
+        @timed("geocode")
+        def get_address_details(lat, lon): ...
+
+    Like utils.general.Profile, pass a CUDA device to synchronize before
+    reading the clock so GPU work is attributed to the right stage.
+    The elapsed time of the last run is kept in `.dt`.
+    """
+
+    def __init__(self, stage: str, device=None):
+        self.stage = stage
+        self.device = device
+        self.cuda = bool(device is not None and str(device).startswith("cuda"))
+        self.dt = 0.0
+
+    def _time(self) -> float:
+        if self.cuda:
+            import torch
+            torch.cuda.synchronize(self.device)
+        return time.perf_counter()
+
+    def _recreate_cm(self):
+        # Fresh instance per decorated call, so concurrent calls don't share start times
+        return type(self)(self.stage, self.device)
+
+    def __enter__(self):
+        self.start = self._time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.dt = self._time() - self.start
+        STAGE_SECONDS.observe(self.dt, stage=self.stage)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count one lookup against a named cache"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def register_gauge(name: str, documentation: str, callback: Callable[[], Optional[float]]) -> Gauge:
+    """Add a gauge whose value is read from callback on every scrape"""
+    return REGISTRY.register(Gauge(name, documentation, callback=callback))
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    return REGISTRY.render()
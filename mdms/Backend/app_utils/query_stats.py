@@ -0,0 +1,123 @@
+"""
+Request-scoped SQL Query Stats
+Counts queries and DB time per HTTP request so N+1 patterns show up in
+production instead of only in the benchmark.
+
+- SQLAlchemy cursor events record every statement against the stats object
+  of the current request (held in a ContextVar, so it follows the request
+  into run_in_threadpool and sync dependencies).
+- QueryStatsMiddleware adds a `Server-Timing` header (db time, query count,
+  total time) to every response, visible in the browser's network panel.
+- Requests over the query-count or duration budget are logged with the
+  statement fingerprints (literals stripped) that dominated.
+
+Budgets come from the environment:
+    SLOW_REQUEST_MS   duration budget in milliseconds (default 500)
+    QUERY_BUDGET      queries per request (default 50)
+"""
+import os
+import re
+import time
+import logging
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "50"))
+TOP_FINGERPRINTS = 3
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,?)+\)")
+_PARAM = re.compile(r"\?|%\(\w+\)s|:\w+|\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+_SELECT_LIST = re.compile(r"SELECT\s.*?\sFROM\s", re.DOTALL | re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so repeats of the same query group together"""
+    s = _STRING.sub("?", statement)
+    s = _NUMBER.sub("?", s)
+    s = _PARAM_LIST.sub("(...)", s)
+    s = _PARAM.sub("?", s)
+    s = _SELECT_LIST.sub("SELECT ... FROM ", s)  # column lists hide the WHERE clause
+    return _WHITESPACE.sub(" ", s).strip()[:200]
+
+
+class QueryStats:
+    """Queries and DB time recorded for one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_fingerprint: Dict[str, List[float]] = {}  # fingerprint -> [count, seconds]
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        entry = self.by_fingerprint.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top(self, n: int = TOP_FINGERPRINTS) -> List[Tuple[str, int, float]]:
+        """Fingerprints ordered by total time, as (fingerprint, count, seconds)"""
+        ranked = sorted(self.by_fingerprint.items(), key=lambda kv: (kv[1][1], kv[1][0]), reverse=True)
+        return [(fp, int(c), s) for fp, (c, s) in ranked[:n]]
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def install(engine):
+    """Attach the query hooks to an engine (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """Adds Server-Timing headers and logs requests over the query/time budget"""
+
+    async def dispatch(self, request, call_next):
+        stats = QueryStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = stats.seconds * 1000
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+        )
+
+        if stats.count > QUERY_BUDGET or total_ms > SLOW_REQUEST_MS:
+            top = "; ".join(f"{c}x {s * 1000:.1f}ms {fp}" for fp, c, s in stats.top())
+            logger.warning(
+                f"Slow request {request.method} {request.url.path}: {total_ms:.0f}ms total, "
+                f"{stats.count} queries / {db_ms:.0f}ms in DB (budget {QUERY_BUDGET} queries, "
+                f"{SLOW_REQUEST_MS:.0f}ms). Top statements: {top or '-'}"
+            )
+        return response
@@ -4,12 +4,32 @@ Provides functions for searching similar images and complaints based on:
 - Image similarity (perceptual hash)
 - Geographic proximity
 - Issue type matching
+
+Each search is one joined, column-projected query over complaint_images,
+sub_tickets and tickets (no image blobs, no ORM objects); location and issue
+filters run in SQL, exact distances and hash distances on whole arrays, and
+only the top `limit` results are turned into dicts.
 """
+import heapq
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict
+import numpy as np
 from app_models import ComplaintImage, SubTicket, Ticket
-from app_utils.image_hash import calculate_image_hash, compare_image_hashes
-from app_utils.geo import calculate_distance
+from app_utils.image_hash import hamming_distances
+from app_utils.geo import bounding_box, distances_within, haversine_many
+
+
+def _within_bbox(latitude: float, longitude: float, max_distance: float) -> tuple:
+    """Indexed pre-filter on image coordinates for a radius search"""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, max_distance)
+    return (
+        ComplaintImage.latitude.isnot(None),
+        ComplaintImage.longitude.isnot(None),
+        ComplaintImage.latitude >= min_lat,
+        ComplaintImage.latitude <= max_lat,
+        ComplaintImage.longitude >= min_lon,
+        ComplaintImage.longitude <= max_lon,
+    )
 
 
 def search_similar_images(
@@ -24,7 +44,7 @@ def search_similar_images(
 ) -> List[Dict]:
     """
     Search for images similar to a query image hash.
-    
+
     Args:
         db: Database session
         query_image_hash: Perceptual hash of the query image
@@ -34,122 +54,89 @@ def search_similar_images(
         hash_threshold: Maximum Hamming distance for similarity (default: 10)
         limit: Maximum number of results to return
         exclude_image_id: Optional image ID to exclude from results
-        
+
     Returns:
         List of dictionaries containing similar image information
     """
-    # Base query for images with hashes
-    query = db.query(ComplaintImage).filter(
-        ComplaintImage.image_hash.isnot(None)
+    # Images with hashes and, when they exist, their sub-ticket and ticket
+    query = (
+        db.query(
+            ComplaintImage.id, ComplaintImage.sub_id, ComplaintImage.file_name,
+            ComplaintImage.content_type, ComplaintImage.latitude, ComplaintImage.longitude,
+            ComplaintImage.created_at, ComplaintImage.image_hash,
+            SubTicket.issue_type, SubTicket.authority, SubTicket.status, Ticket.ticket_id,
+        )
+        .outerjoin(SubTicket, SubTicket.sub_id == ComplaintImage.sub_id)
+        .outerjoin(Ticket, Ticket.ticket_id == SubTicket.ticket_id)
+        .filter(ComplaintImage.image_hash.isnot(None))
     )
-    
+
     # Exclude specific image if provided
     if exclude_image_id:
         query = query.filter(ComplaintImage.id != exclude_image_id)
-    
+
     # If location is provided, filter by bounding box first for performance
     if latitude is not None and longitude is not None and max_distance:
-        lat_delta = max_distance / 111000.0
-        lon_delta = max_distance / (111000.0 * abs(latitude / 90.0) if latitude != 0 else 111000.0)
-        
-        query = query.filter(
-            ComplaintImage.latitude.isnot(None),
-            ComplaintImage.longitude.isnot(None),
-            ComplaintImage.latitude >= latitude - lat_delta,
-            ComplaintImage.latitude <= latitude + lat_delta,
-            ComplaintImage.longitude >= longitude - lon_delta,
-            ComplaintImage.longitude <= longitude + lon_delta
+        query = query.filter(*_within_bbox(latitude, longitude, max_distance))
+
+    rows = query.all()
+    if not rows:
+        return []
+
+    # Hash distances for all candidates at once
+    hamming = hamming_distances(query_image_hash, [row.image_hash for row in rows])
+    keep = hamming <= hash_threshold
+
+    # Distances likewise; candidates without coordinates are kept without a distance
+    distances = np.full(len(rows), np.nan)
+    if latitude is not None and longitude is not None:
+        dist = haversine_many(
+            latitude, longitude,
+            [row.latitude or None for row in rows],
+            [row.longitude or None for row in rows]
         )
-    
-    all_images = query.all()
-    
-    # Calculate similarity scores
+        if max_distance:
+            keep &= ~np.isfinite(dist) | (dist <= max_distance)
+        distances = np.where(np.isfinite(dist), dist, np.nan)
+
+    # Rank by similarity (lower Hamming distance = more similar), then by distance if located
+    candidates = np.flatnonzero(keep).tolist()
+    if latitude is not None and longitude is not None:
+        # A zero or missing distance ranks last among equal hashes
+        rank = lambda i: (hamming[i], distances[i] if distances[i] > 0 else float('inf'))
+    else:
+        rank = lambda i: hamming[i]
+
     similar_images = []
-    for image in all_images:
-        if not image.image_hash:
-            continue
-        
-        # Calculate hash similarity
-        is_similar = compare_image_hashes(
-            query_image_hash,
-            image.image_hash,
-            threshold=hash_threshold
-        )
-        
-        if not is_similar:
-            continue
-        
-        # Calculate Hamming distance for ranking
-        try:
-            from app_utils.image_hash import IMAGEHASH_AVAILABLE
-            if IMAGEHASH_AVAILABLE:
-                import imagehash
-                h1 = imagehash.hex_to_hash(query_image_hash)
-                h2 = imagehash.hex_to_hash(image.image_hash)
-                hamming_distance = h1 - h2
-            else:
-                # Fallback: exact match = 0, otherwise high distance
-                hamming_distance = 0 if query_image_hash == image.image_hash else 100
-        except:
-            hamming_distance = 0 if query_image_hash == image.image_hash else 100
-        
-        # Calculate distance if location is provided
-        distance_meters = None
-        if latitude is not None and longitude is not None and image.latitude and image.longitude:
-            distance_meters = calculate_distance(
-                latitude, longitude,
-                image.latitude, image.longitude
-            )
-            
-            # Skip if beyond max_distance
-            if max_distance and distance_meters > max_distance:
-                continue
-        
-        # Get ticket and sub_ticket information
-        sub_ticket = db.query(SubTicket).filter(
-            SubTicket.sub_id == image.sub_id
-        ).first()
-        
+    for i in heapq.nsmallest(limit, candidates, key=rank):
+        row = rows[i]
+        hamming_distance = int(hamming[i])
+        distance_meters = None if np.isnan(distances[i]) else float(distances[i])
         ticket_info = None
-        if sub_ticket:
-            ticket = db.query(Ticket).filter(
-                Ticket.ticket_id == sub_ticket.ticket_id
-            ).first()
-            
-            if ticket:
-                ticket_info = {
-                    "ticket_id": ticket.ticket_id,
-                    "sub_id": sub_ticket.sub_id,
-                    "issue_type": sub_ticket.issue_type,
-                    "authority": sub_ticket.authority,
-                    "status": sub_ticket.status
-                }
-        
+        if row.ticket_id is not None:
+            ticket_info = {
+                "ticket_id": row.ticket_id,
+                "sub_id": row.sub_id,
+                "issue_type": row.issue_type,
+                "authority": row.authority,
+                "status": row.status
+            }
+
         similar_images.append({
-            "image_id": image.id,
-            "sub_id": image.sub_id,
-            "file_name": image.file_name,
-            "content_type": image.content_type,
-            "latitude": image.latitude,
-            "longitude": image.longitude,
+            "image_id": row.id,
+            "sub_id": row.sub_id,
+            "file_name": row.file_name,
+            "content_type": row.content_type,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
             "distance_meters": round(distance_meters, 2) if distance_meters else None,
             "hamming_distance": hamming_distance,
             "similarity_score": max(0, 100 - (hamming_distance * 10)),  # Convert to percentage
-            "created_at": image.created_at.isoformat() if image.created_at else None,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
             "ticket_info": ticket_info
         })
-    
-    # Sort by similarity (lower Hamming distance = more similar)
-    # If location is provided, also consider distance
-    if latitude is not None and longitude is not None:
-        similar_images.sort(key=lambda x: (
-            x["hamming_distance"],
-            x["distance_meters"] if x["distance_meters"] else float('inf')
-        ))
-    else:
-        similar_images.sort(key=lambda x: x["hamming_distance"])
-    
-    return similar_images[:limit]
+
+    return similar_images
 
 
 def search_similar_by_location(
@@ -162,7 +149,7 @@ def search_similar_by_location(
 ) -> List[Dict]:
     """
     Search for complaints/images near a specific location.
-    
+
     Args:
         db: Database session
         latitude: GPS latitude
@@ -170,74 +157,56 @@ def search_similar_by_location(
         max_distance: Maximum distance in meters (default: 1000m)
         issue_type: Optional filter by issue type
         limit: Maximum number of results
-        
+
     Returns:
         List of dictionaries containing nearby complaints
     """
-    # Calculate bounding box
-    lat_delta = max_distance / 111000.0
-    lon_delta = max_distance / (111000.0 * abs(latitude / 90.0) if latitude != 0 else 111000.0)
-    
-    # Query images within bounding box
-    query = db.query(ComplaintImage).filter(
-        ComplaintImage.latitude.isnot(None),
-        ComplaintImage.longitude.isnot(None),
-        ComplaintImage.latitude >= latitude - lat_delta,
-        ComplaintImage.latitude <= latitude + lat_delta,
-        ComplaintImage.longitude >= longitude - lon_delta,
-        ComplaintImage.longitude <= longitude + lon_delta
-    )
-    
-    images = query.all()
-    
-    # Filter by exact distance and issue type
-    results = []
-    for image in images:
-        distance = calculate_distance(
-            latitude, longitude,
-            image.latitude, image.longitude
+    # Images within the bounding box that belong to a sub-ticket and ticket
+    query = (
+        db.query(
+            ComplaintImage.id, ComplaintImage.latitude, ComplaintImage.longitude,
+            ComplaintImage.file_name, ComplaintImage.created_at,
+            SubTicket.sub_id, SubTicket.issue_type, SubTicket.authority, SubTicket.status,
+            Ticket.ticket_id,
         )
-        
-        if distance > max_distance:
-            continue
-        
-        # Get sub_ticket and ticket info
-        sub_ticket = db.query(SubTicket).filter(
-            SubTicket.sub_id == image.sub_id
-        ).first()
-        
-        if not sub_ticket:
-            continue
-        
-        # Filter by issue type if provided
-        if issue_type and sub_ticket.issue_type != issue_type:
-            continue
-        
-        ticket = db.query(Ticket).filter(
-            Ticket.ticket_id == sub_ticket.ticket_id
-        ).first()
-        
-        if not ticket:
-            continue
-        
-        results.append({
-            "image_id": image.id,
-            "ticket_id": ticket.ticket_id,
-            "sub_id": sub_ticket.sub_id,
-            "issue_type": sub_ticket.issue_type,
-            "authority": sub_ticket.authority,
-            "status": sub_ticket.status,
-            "latitude": image.latitude,
-            "longitude": image.longitude,
-            "distance_meters": round(distance, 2),
-            "file_name": image.file_name,
-            "created_at": image.created_at.isoformat() if image.created_at else None
-        })
-    
-    # Sort by distance
-    results.sort(key=lambda x: x["distance_meters"])
-    
-    return results[:limit]
+        .join(SubTicket, SubTicket.sub_id == ComplaintImage.sub_id)
+        .join(Ticket, Ticket.ticket_id == SubTicket.ticket_id)
+        .filter(*_within_bbox(latitude, longitude, max_distance))
+    )
+
+    # Filter by issue type if provided
+    if issue_type:
+        query = query.filter(SubTicket.issue_type == issue_type)
+
+    rows = query.all()
+    if not rows:
+        return []
+
+    # Filter by exact distance in one shot, nearest first
+    dist, within = distances_within(
+        latitude, longitude,
+        [row.latitude for row in rows],
+        [row.longitude for row in rows],
+        max_distance
+    )
+    nearest = heapq.nsmallest(limit, np.flatnonzero(within).tolist(), key=lambda i: dist[i])
+
+    return [
+        {
+            "image_id": rows[i].id,
+            "ticket_id": rows[i].ticket_id,
+            "sub_id": rows[i].sub_id,
+            "issue_type": rows[i].issue_type,
+            "authority": rows[i].authority,
+            "status": rows[i].status,
+            "latitude": rows[i].latitude,
+            "longitude": rows[i].longitude,
+            "distance_meters": round(float(dist[i]), 2),
+            "file_name": rows[i].file_name,
+            "created_at": rows[i].created_at.isoformat() if rows[i].created_at else None
+        }
+        for i in nearest
+    ]
 
 
 def search_similar_by_issue_type(
@@ -250,7 +219,7 @@ def search_similar_by_issue_type(
 ) -> List[Dict]:
     """
     Search for complaints by issue type, optionally filtered by location.
-    
+
     Args:
         db: Database session
         issue_type: Issue type to search for
@@ -258,82 +227,89 @@ def search_similar_by_issue_type(
         longitude: Optional GPS longitude
         max_distance: Optional maximum distance in meters
         limit: Maximum number of results
-        
+
     Returns:
         List of dictionaries containing matching complaints
     """
-    # Query sub_tickets by issue type
-    query = db.query(SubTicket).filter(
-        SubTicket.issue_type == issue_type
+    location_filter = latitude is not None and longitude is not None and max_distance
+
+    # One row per image of each matching sub-ticket (one with no image columns
+    # when it has none), grouped by sub-ticket in upload order
+    query = (
+        db.query(
+            SubTicket.id, SubTicket.sub_id, SubTicket.issue_type, SubTicket.authority,
+            SubTicket.status, Ticket.ticket_id, Ticket.latitude, Ticket.longitude,
+            ComplaintImage.id.label("image_id"),
+            ComplaintImage.latitude.label("image_latitude"),
+            ComplaintImage.longitude.label("image_longitude"),
+        )
+        .join(Ticket, Ticket.ticket_id == SubTicket.ticket_id)
+        .outerjoin(ComplaintImage, ComplaintImage.sub_id == SubTicket.sub_id)
+        .filter(SubTicket.issue_type == issue_type)
+        .order_by(SubTicket.id, ComplaintImage.id)
     )
-    
-    sub_tickets = query.all()
-    
-    results = []
-    for sub_ticket in sub_tickets:
-        # Get images for this sub_ticket
-        images = db.query(ComplaintImage).filter(
-            ComplaintImage.sub_id == sub_ticket.sub_id
-        ).all()
-        
-        # Get ticket info
-        ticket = db.query(Ticket).filter(
-            Ticket.ticket_id == sub_ticket.ticket_id
-        ).first()
-        
-        if not ticket:
-            continue
-        
-        # If location filter is provided, check if any image matches
-        if latitude is not None and longitude is not None and max_distance:
-            matching_images = []
-            for image in images:
-                if image.latitude and image.longitude:
-                    distance = calculate_distance(
-                        latitude, longitude,
-                        image.latitude, image.longitude
-                    )
-                    if distance <= max_distance:
-                        matching_images.append({
-                            "image_id": image.id,
-                            "distance_meters": round(distance, 2)
-                        })
-            
-            if not matching_images:
-                continue  # Skip if no images match location filter
-            
-            # Use the closest image
-            closest = min(matching_images, key=lambda x: x["distance_meters"])
-            distance_meters = closest["distance_meters"]
-        else:
-            # Get first image with GPS or any image
-            gps_image = next(
-                (img for img in images if img.latitude and img.longitude),
-                images[0] if images else None
-            )
+
+    if location_filter:
+        # Only sub-tickets with an image inside the bounding box can match
+        query = query.filter(SubTicket.sub_id.in_(
+            db.query(ComplaintImage.sub_id).filter(*_within_bbox(latitude, longitude, max_distance))
+        ))
+
+    rows = query.all()
+    if not rows:
+        return []
+
+    group_ids = np.array([row.id for row in rows])
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    ends = np.r_[starts[1:], len(rows)]
+    has_image = np.array([row.image_id is not None for row in rows])
+    image_counts = np.add.reduceat(has_image.astype(np.int64), starts)
+
+    # (first row of the sub-ticket, distance) per candidate
+    candidates = []
+    if location_filter:
+        # Closest image of each sub-ticket; it must be within max_distance
+        dist = haversine_many(
+            latitude, longitude,
+            [row.image_latitude or None for row in rows],
+            [row.image_longitude or None for row in rows]
+        )
+        closest = np.minimum.reduceat(np.where(has_image, dist, np.inf), starts)
+        for start, count, d in zip(starts.tolist(), image_counts.tolist(), closest.tolist()):
+            if count and d <= max_distance:
+                candidates.append((start, round(d, 2)))
+    else:
+        # First image with GPS, or any image
+        has_gps = np.array([bool(row.image_latitude and row.image_longitude) for row in rows])
+        for start, end, count in zip(starts.tolist(), ends.tolist(), image_counts.tolist()):
             distance_meters = None
-            if gps_image and latitude and longitude:
-                distance_meters = round(calculate_distance(
+            if count and latitude and longitude:
+                gps = np.flatnonzero(has_gps[start:end])
+                image = rows[start + (gps[0] if gps.size else 0)]
+                distance_meters = round(float(haversine_many(
                     latitude, longitude,
-                    gps_image.latitude, gps_image.longitude
-                ), 2)
-        
-        results.append({
-            "ticket_id": ticket.ticket_id,
-            "sub_id": sub_ticket.sub_id,
-            "issue_type": sub_ticket.issue_type,
-            "authority": sub_ticket.authority,
-            "status": sub_ticket.status,
-            "latitude": ticket.latitude,
-            "longitude": ticket.longitude,
-            "distance_meters": distance_meters,
-            "image_count": len(images)
-        })
-    
-    # Sort by distance if location provided, otherwise by ticket_id
+                    image.image_latitude, image.image_longitude
+                )), 2)
+            candidates.append((start, distance_meters))
+
+    # Nearest first if location provided, otherwise by ticket_id
     if latitude is not None and longitude is not None:
-        results.sort(key=lambda x: x["distance_meters"] if x["distance_meters"] else float('inf'))
+        rank = lambda c: c[1] if c[1] else float('inf')
     else:
-        results.sort(key=lambda x: x["ticket_id"])
-    
-    return results[:limit]
+        rank = lambda c: rows[c[0]].ticket_id
+    counts = dict(zip(starts.tolist(), image_counts.tolist()))
+
+    return [
+        {
+            "ticket_id": rows[start].ticket_id,
+            "sub_id": rows[start].sub_id,
+            "issue_type": rows[start].issue_type,
+            "authority": rows[start].authority,
+            "status": rows[start].status,
+            "latitude": rows[start].latitude,
+            "longitude": rows[start].longitude,
+            "distance_meters": distance_meters,
+            "image_count": counts[start]
+        }
+        for start, distance_meters in heapq.nsmallest(limit, candidates, key=rank)
+    ]
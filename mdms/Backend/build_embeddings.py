@@ -0,0 +1,72 @@
+"""
+Embedding Index Builder
+Embeds the stored complaint images that are not in the similarity index yet
+(app_utils/embeddings.py), e.g. after turning on EMBEDDINGS_ENABLED on an
+existing database. Uploads made while the flag is on are indexed as they
+arrive, so this only needs to run once, or after changing the weights.
+
+Usage:
+    python build_embeddings.py             # index images that have no vector yet
+    python build_embeddings.py --rebuild   # drop every vector and embed all images again
+    python build_embeddings.py --compact   # only drop the records of replaced / deleted images
+"""
+import sys
+import time
+import argparse
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from app_models import ComplaintImage
+from app_utils import embeddings
+
+BATCH_SIZE = 200  # images (blobs) loaded at a time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the image embedding index")
+    parser.add_argument("--rebuild", action="store_true", help="discard stored vectors and embed every image")
+    parser.add_argument("--compact", action="store_true", help="rewrite the vector file without tombstones and exit")
+    args = parser.parse_args()
+
+    index = embeddings.get_index()
+    if args.compact:
+        print(f"[OK] Compacted {index.path}: {index.compact()} vectors")
+        return
+    if args.rebuild:
+        index.clear()
+    done = set(index.ids().tolist())
+    print(f"Index at {index.path}: {len(done)} vectors")
+
+    db = SessionLocal()
+    start = time.time()
+    last_id, indexed, failed = 0, 0, 0
+    try:
+        while True:
+            rows = db.execute(
+                select(ComplaintImage.id, ComplaintImage.image_data)
+                .where(ComplaintImage.id > last_id, ComplaintImage.media_type == "image")
+                .order_by(ComplaintImage.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            pending = [(row.id, row.image_data) for row in rows if row.id not in done]
+            if pending:
+                added = embeddings.index_images(pending)
+                indexed += added
+                failed += len(pending) - added
+                print(f"  ... {indexed} embedded (up to image {last_id})")
+    except Exception as e:
+        print(f"\n[ERROR] Building the index failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"[OK] Embedded {indexed} images in {time.time() - start:.1f}s ({failed} could not be embedded)")
+    print(f"[SUCCESS] Index has {len(index)} vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Import Time Checker Script
+Measures backend cold-start cost of importing YOLOv5, comparing the
+inference-only runtime (yolo_runtime.py) with importing the full vendored
+YOLOv5 utils the way the backend used to (plots, dataloaders, select_device).
+Each measurement runs in a fresh interpreter so nothing is cached.
+"""
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+HEAVY_MODULES = ["pandas", "matplotlib", "seaborn", "scipy", "git", "torchvision", "utils.dataloaders"]
+
+RUNTIME_SNIPPET = """
+import yolo_runtime
+yolo_runtime.load_runtime()
+yolo_runtime.select_device('')
+"""
+
+FULL_SNIPPET = """
+import sys
+from yolo_runtime import YOLO_ROOT
+sys.path.insert(0, str(YOLO_ROOT))
+from models.common import DetectMultiBackend
+from utils.general import check_img_size, non_max_suppression, scale_boxes, LOGGER
+from utils.augmentations import letterbox
+from utils.torch_utils import select_device
+from utils.dataloaders import LoadImages
+from utils.plots import Annotator
+select_device('')
+"""
+
+MEASURE_TEMPLATE = """
+import json, sys, time
+start = time.perf_counter()
+{snippet}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "modules": len(sys.modules), "heavy": heavy}}))
+"""
+
+
+def measure(snippet, runs):
+    """Run snippet in fresh interpreters; return median seconds and the last run's module info"""
+    code = MEASURE_TEMPLATE.format(snippet=snippet, heavy=HEAVY_MODULES)
+    samples = []
+    result = None
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "import failed")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+    result["seconds"] = statistics.median(samples)
+    return result
+
+
+def main(runs=5):
+    print(f"Measuring YOLOv5 import time (median of {runs} cold starts)...\n")
+
+    try:
+        runtime = measure(RUNTIME_SNIPPET, runs)
+        full = measure(FULL_SNIPPET, runs)
+    except RuntimeError as e:
+        print(f"[ERROR] Import failed: {e}")
+        print("Run check_dependencies.py to see what is missing.")
+        sys.exit(1)
+
+    for name, r in (("Inference runtime", runtime), ("Full YOLOv5 utils", full)):
+        print(f"=== {name} ===")
+        print(f"  time:    {r['seconds']:.3f}s")
+        print(f"  modules: {r['modules']}")
+        print(f"  heavy:   {', '.join(r['heavy']) or '-'}")
+
+    saved = full["seconds"] - runtime["seconds"]
+    print("\n=== Summary ===")
+    print(f"Saved {saved:.3f}s per cold start ({saved / full['seconds'] * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
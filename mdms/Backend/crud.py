@@ -1,4 +1,6 @@
-from app_models import Ticket, SubTicket, ComplaintImage
+from app_models import Ticket, SubTicket, ComplaintImage, Detection
+from app_utils.metrics import timed
+import json
 import uuid
 
 
@@ -11,7 +13,8 @@ def get_or_create_ticket(db, lat, lon):
     generate a fresh ticket ID for each submission.
     """
     from app_utils.geo import get_address_details
-    address_info = get_address_details(lat, lon)
+    with timed("geocode"):
+        address_info = get_address_details(lat, lon)
     
     ticket = Ticket(
         ticket_id=f"MDMS-{uuid.uuid4().hex[:8].upper()}",
@@ -57,11 +60,16 @@ def save_image(
     file_name=None,
     latitude=None,
     longitude=None,
-    confidence=None
+    confidence=None,
+    detections=None,
+    image_hash=None,
+    fingerprint=None
 ):
-    # Calculate image hash for deduplication
-    from app_utils.image_hash import calculate_image_hash
-    image_hash = calculate_image_hash(image_bytes, use_perceptual=True)
+    # Image hash for deduplication; uploads pass the one computed on the original bytes
+    if image_hash is None:
+        from app_utils.image_hash import calculate_image_hash
+        with timed("phash"):
+            image_hash = calculate_image_hash(image_bytes, use_perceptual=True)
     
     image = ComplaintImage(
         sub_id=sub_id,
@@ -71,11 +79,40 @@ def save_image(
         file_name=file_name,
         gps_extracted=gps_extracted,
         image_hash=image_hash,
+        fingerprint=fingerprint,
         latitude=latitude,
         longitude=longitude,
-        confidence=confidence
+        confidence=confidence,
+        detections=json.dumps(detections) if detections is not None else None
     )
     db.add(image)
-    db.commit()
+    db.flush()  # assigns image.id for the detection rows
+
+    if detections:
+        save_detections(db, image.id, detections)
+
+    with timed("db_commit"):
+        db.commit()
     db.refresh(image)
     return image
+
+
+# ---------- Detections ----------
+def save_detections(db, image_id, detections):
+    """
+    Bulk insert one Detection row per box. Does not commit, so the rows land
+    in the same transaction as the image they belong to.
+    """
+    db.bulk_insert_mappings(Detection, [
+        {
+            "image_id": image_id,
+            "class_name": d["class_name"],
+            "confidence": d["confidence"],
+            "x1": d["bbox"]["x1"],
+            "y1": d["bbox"]["y1"],
+            "x2": d["bbox"]["x2"],
+            "y2": d["bbox"]["y2"],
+            "model_version": d.get("model_version"),
+        }
+        for d in detections
+    ])
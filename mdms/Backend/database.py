@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from starlette.requests import Request
 from dotenv import load_dotenv
 import os
 import logging
 
+from app_utils.metrics import register_gauge
+
 logger = logging.getLogger(__name__)
 
 # ✅ LOAD ENV FIRST
@@ -18,29 +21,143 @@ if not DATABASE_URL:
         "Example for SQLite: sqlite:///./mdms.db"
     )
 
-# Configure engine with connection pooling for PostgreSQL
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        echo=False
-    )
-else:
+# Optional read replica; GET requests are served from it (see get_db)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+# PostgreSQL pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+
+# SQLite settings (single-node deployment)
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+READ_METHODS = {"GET", "HEAD"}
+
+
+def _engine_options(url):
+    """Keyword arguments for create_engine / create_async_engine"""
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}, "echo": False}
     # PostgreSQL connection settings
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,  # Verify connections before using
-        pool_size=5,
-        max_overflow=10,
-        echo=False
-    )
+    return {
+        "pool_pre_ping": True,  # Verify connections before using
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "echo": False,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets dashboard reads run while an upload is writing, synchronous=NORMAL
+    is safe under WAL and skips an fsync per commit, and busy_timeout makes a
+    second writer wait instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _create_engine(url):
+    new_engine = create_engine(url, **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+engine = _create_engine(DATABASE_URL)
+read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(bind=engine)
+ReadSessionLocal = sessionmaker(bind=read_engine)
+
+
+# -------------------------------------
+# Async engine (asyncpg / aiosqlite) for read-heavy async routes
+# -------------------------------------
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url):
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{dialect}'")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+
+def _create_async_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    new_engine = create_async_engine(to_async_url(url), **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async_engine = _create_async_engine(DATABASE_URL)
+    async_read_engine = _create_async_engine(DATABASE_READ_URL) if DATABASE_READ_URL else async_engine
+    # expire_on_commit=False: attributes stay readable after commit without an implicit (sync) refresh
+    AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    AsyncReadSessionLocal = sessionmaker(bind=async_read_engine, class_=AsyncSession, expire_on_commit=False)
+except (ImportError, ValueError) as e:
+    logger.warning(f"Async database engine unavailable ({e}); async routes will return 503")
+
+
+# -------------------------------------
+# Connection pool gauges for /metrics
+# -------------------------------------
+def _pool_stat(name):
+    """Current value of a pool statistic, None where the pool lacks it (SQLite's default pool)"""
+    stat = getattr(engine.pool, name, None)
+    return stat() if callable(stat) else None
+
+
+register_gauge("mdms_db_pool_size", "Configured DB connection pool size", lambda: _pool_stat("size"))
+register_gauge("mdms_db_pool_checked_out", "DB connections currently in use", lambda: _pool_stat("checkedout"))
+register_gauge("mdms_db_pool_overflow", "DB connections opened beyond pool_size", lambda: _pool_stat("overflow"))
+
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request = None):
+    """
+    Session for the request: GET/HEAD go to the read replica when
+    DATABASE_READ_URL is set, everything else to the primary.
+    Replica reads can lag the primary by the replication delay.
+    """
+    is_read = request is not None and request.method in READ_METHODS
+    db = ReadSessionLocal() if is_read else SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db(request: Request = None):
+    """Async counterpart of get_db for routes that must not block the event loop"""
+    if AsyncSessionLocal is None:
+        from fastapi import HTTPException
+        raise HTTPException(status_code=503, detail="Async database driver not installed (aiosqlite / asyncpg)")
+    is_read = request is not None and request.method in READ_METHODS
+    async with (AsyncReadSessionLocal() if is_read else AsyncSessionLocal()) as db:
+        yield db
@@ -0,0 +1,249 @@
+"""
+Duplicate Detection Evaluation Script
+Measures how well the plain pHash check and the composite fingerprint score
+(app_utils/fingerprint.py) separate photos of the same spot from photos of
+different spots, and how long each check takes.
+
+A labelled set is a directory with one sub-directory per spot:
+    dataset/
+      spot_001/  IMG_1.jpg  IMG_2.jpg ...   <- duplicates of each other
+      spot_002/  ...
+Every pair inside a sub-directory is a duplicate; pairs across
+sub-directories are not. Without --dataset a synthetic set is generated
+(road scenes with potholes / debris, photographed again recompressed,
+rescaled, re-framed, re-exposed and slightly rotated, plus near-uniform
+asphalt patches that plain pHash tends to confuse).
+
+Reports precision / recall / F1 at the configured thresholds, the best F1
+over a threshold sweep, and per-check latency against a set of candidates
+(what one duplicate check compares after the spatial lookup).
+
+Usage:
+    python evaluate_dedup.py
+    python evaluate_dedup.py --dataset ./labelled_spots --candidates 50
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from io import BytesIO
+from pathlib import Path
+from itertools import combinations
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.resolve()
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+# ---------------- Labelled sets ----------------
+def load_dataset(path: Path):
+    """(image bytes, spot label) for every image under path/<spot>/"""
+    images = []
+    for spot in sorted(p for p in path.iterdir() if p.is_dir()):
+        for file in sorted(spot.iterdir()):
+            if file.suffix.lower() in IMAGE_SUFFIXES:
+                images.append((file.read_bytes(), spot.name))
+    return images
+
+
+def _jpeg(img, quality=90) -> bytes:
+    buf = BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _scene(rng: np.random.Generator, width=800, height=600, uniform=False):
+    """A synthetic road photo: tinted asphalt, texture, potholes, debris, markings"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    tone = rng.uniform(70, 140)
+    tint = rng.uniform(-12, 12, 3)
+    base = np.full((height, width, 3), tone) + tint
+    # Low-frequency lighting variation
+    light = np.asarray(Image.fromarray((rng.random((4, 5)) * 255).astype(np.uint8)).resize((width, height), Image.BICUBIC))
+    base += (light[..., None] - 128) * (0.05 if uniform else 0.25)
+    base += rng.normal(0, 6, (height, width, 1))
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    if uniform:
+        return img.filter(ImageFilter.GaussianBlur(1))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.integers(1, 4)):  # potholes
+        cx, cy = rng.uniform(0.1, 0.9) * width, rng.uniform(0.3, 0.95) * height
+        rx, ry = rng.uniform(30, 140), rng.uniform(20, 80)
+        shade = int(tone * rng.uniform(0.25, 0.6))
+        draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=(shade, shade, shade + 5))
+    for _ in range(rng.integers(0, 6)):  # debris / garbage
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        s = rng.uniform(10, 60)
+        colour = tuple(int(v) for v in rng.integers(0, 256, 3))
+        draw.rectangle([x, y, x + s, y + s * rng.uniform(0.3, 1.2)], fill=colour)
+    if rng.random() < 0.5:  # lane marking
+        x = rng.uniform(0.2, 0.8) * width
+        draw.line([x, 0, x + rng.uniform(-200, 200), height], fill=(230, 230, 220), width=int(rng.integers(6, 16)))
+    return img.filter(ImageFilter.GaussianBlur(0.8))
+
+
+def _retake(img, rng: np.random.Generator):
+    """The same spot photographed again"""
+    from PIL import Image, ImageEnhance
+
+    width, height = img.size
+    # Re-framing: crop 80-95% of the frame at a random offset
+    keep = rng.uniform(0.80, 0.95)
+    cw, ch = int(width * keep), int(height * keep)
+    x0, y0 = int(rng.uniform(0, width - cw)), int(rng.uniform(0, height - ch))
+    out = img.crop((x0, y0, x0 + cw, y0 + ch))
+    out = out.rotate(rng.uniform(-3, 3), resample=Image.BILINEAR, expand=False)
+    out = ImageEnhance.Brightness(out).enhance(rng.uniform(0.85, 1.15))
+    scale = rng.uniform(0.5, 1.0)
+    out = out.resize((max(1, int(out.width * scale)), max(1, int(out.height * scale))), Image.BILINEAR)
+    return _jpeg(out, quality=int(rng.integers(45, 92)))
+
+
+def synthetic_dataset(spots=60, uniform_spots=20, shots=4, seed=0):
+    """(image bytes, spot label) for a generated labelled set"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(spots + uniform_spots):
+        scene = _scene(rng, uniform=i >= spots)
+        label = f"{'asphalt' if i >= spots else 'spot'}_{i:03d}"
+        images.append((_jpeg(scene, quality=92), label))
+        for _ in range(shots - 1):
+            images.append((_retake(scene, rng), label))
+    return images
+
+
+# ---------------- Scoring ----------------
+def pair_labels(labels, max_negatives, rng):
+    """All duplicate pairs and up to max_negatives non-duplicate pairs, as index arrays"""
+    positives, negatives = [], []
+    for i, j in combinations(range(len(labels)), 2):
+        (positives if labels[i] == labels[j] else negatives).append((i, j))
+    if len(negatives) > max_negatives:
+        negatives = rng.sample(negatives, max_negatives)
+    pairs = positives + negatives
+    truth = np.array([True] * len(positives) + [False] * len(negatives))
+    return pairs, truth
+
+
+def metrics(predicted: np.ndarray, truth: np.ndarray) -> dict:
+    tp = int((predicted & truth).sum())
+    fp = int((predicted & ~truth).sum())
+    fn = int((~predicted & truth).sum())
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "tp": tp, "fp": fp, "fn": fn}
+
+
+def best_threshold(values: np.ndarray, truth: np.ndarray, thresholds, higher_is_match=True):
+    best = None
+    for t in thresholds:
+        m = metrics(values >= t if higher_is_match else values <= t, truth)
+        if best is None or m["f1"] > best[1]["f1"]:
+            best = (t, m)
+    return best
+
+
+def _row(name, m):
+    print(f"  {name:<50}{m['precision']:>10.3f}{m['recall']:>10.3f}{m['f1']:>8.3f}"
+          f"{m['tp']:>7}{m['fp']:>7}{m['fn']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate duplicate detection on a labelled image set")
+    parser.add_argument("--dataset", default=None, help="directory with one sub-directory per spot (default: synthetic)")
+    parser.add_argument("--spots", type=int, default=60, help="synthetic spots with potholes / debris")
+    parser.add_argument("--uniform-spots", type=int, default=20, help="synthetic near-uniform asphalt spots")
+    parser.add_argument("--shots", type=int, default=4, help="synthetic photos per spot")
+    parser.add_argument("--negatives", type=int, default=20000, help="non-duplicate pairs to sample")
+    parser.add_argument("--candidates", type=int, default=50, help="candidates per check for the latency test")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    # deduplication imports the models; no database is used
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from app_utils import fingerprint
+    from app_utils.deduplication import DEFAULT_HASH_THRESHOLD, _match_index
+
+    if args.dataset:
+        images = load_dataset(Path(args.dataset))
+        source = args.dataset
+    else:
+        images = synthetic_dataset(args.spots, args.uniform_spots, args.shots, args.seed)
+        source = f"synthetic ({args.spots} spots + {args.uniform_spots} asphalt, {args.shots} shots each)"
+    if len(images) < 2:
+        print("[ERROR] Need at least two images")
+        sys.exit(1)
+    labels = [label for _, label in images]
+    print(f"Evaluating on {source}: {len(images)} images, {len(set(labels))} spots")
+
+    start = time.perf_counter()
+    signatures = fingerprint.calculate_signatures([data for data, _ in images])
+    signature_ms = (time.perf_counter() - start) * 1000 / len(images)
+    hashes = [h for h, _ in signatures]
+    fingerprints = [f for _, f in signatures]
+    if not all(fingerprint.is_fingerprint(f) for f in fingerprints):
+        print("[ERROR] Some images could not be decoded")
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    pairs, truth = pair_labels(labels, args.negatives, rng)
+    print(f"{int(truth.sum())} duplicate pairs, {int((~truth).sum())} non-duplicate pairs\n")
+
+    # pHash Hamming distance and composite score of every pair
+    hamming = np.array([bin(int(hashes[i], 16) ^ int(hashes[j], 16)).count("1") for i, j in pairs])
+    scores = np.empty(len(pairs))
+    passes = np.empty(len(pairs), dtype=bool)
+    by_query = {}
+    for k, (i, j) in enumerate(pairs):
+        by_query.setdefault(i, []).append((k, j))
+    for i, items in by_query.items():
+        s, t = fingerprint.score(fingerprints[i], [fingerprints[j] for _, j in items])
+        for (k, _), value, threshold in zip(items, s, t):
+            scores[k] = value
+            passes[k] = value >= threshold
+
+    print(f"  {'check':<50}{'precision':>10}{'recall':>10}{'F1':>8}{'TP':>7}{'FP':>7}{'FN':>7}")
+    _row(f"pHash <= {DEFAULT_HASH_THRESHOLD} (current)", metrics(hamming <= DEFAULT_HASH_THRESHOLD, truth))
+    t, m = best_threshold(hamming, truth, range(0, 33), higher_is_match=False)
+    _row(f"pHash <= {t} (best F1)", m)
+    _row(f"composite >= {fingerprint.SCORE_THRESHOLD:.2f} / low-detail "
+         f"{fingerprint.LOW_DETAIL_THRESHOLD:.2f}", metrics(passes, truth))
+    t, m = best_threshold(scores, truth, np.arange(0.50, 1.0, 0.01))
+    _row(f"composite >= {t:.2f} (best F1, no low-detail rule)", m)
+
+    # One duplicate check = one query against the candidates of its spatial lookup, timed
+    # through the comparison deduplication runs (_match_index) under each DEDUP_SCORING mode
+    k = min(args.candidates, len(images) - 1)
+    queries = rng.sample(range(len(images)), min(50, len(images)))
+    checks = [(q, rng.sample(range(len(images)), k)) for q in queries]
+    check_ms = {}
+    scoring = fingerprint.SCORING
+    try:
+        for mode in ("phash", "composite"):
+            fingerprint.SCORING = mode
+            start = time.perf_counter()
+            for q, candidates in checks:
+                _match_index(
+                    hashes[q], fingerprints[q],
+                    [hashes[c] for c in candidates], [fingerprints[c] for c in candidates],
+                    DEFAULT_HASH_THRESHOLD,
+                )
+            check_ms[mode] = (time.perf_counter() - start) * 1000 / len(checks)
+    finally:
+        fingerprint.SCORING = scoring
+    phash_check_ms, composite_check_ms = check_ms["phash"], check_ms["composite"]
+
+    print(f"\nLatency ({k} candidates per check)")
+    print(f"  hash + fingerprint per image   {signature_ms:>8.2f} ms")
+    print(f"  pHash check                    {phash_check_ms:>8.3f} ms")
+    print(f"  composite check                {composite_check_ms:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
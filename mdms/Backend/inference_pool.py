@@ -0,0 +1,501 @@
+"""
+Multi-process Inference Worker Pool
+Runs N YOLOv5Service instances in separate processes so inference is not
+limited by one GIL / one model.
+
+- Each worker loads the model once at start-up and reports ready.
+- Decoded frames reach workers through a per-worker shared-memory buffer
+  (multiprocessing.shared_memory); only a small header is pickled.
+- A monitor thread health-checks workers and restarts crashed ones; the
+  request a crashed worker was running fails instead of hanging. A worker
+  that can't load its model is restarted with exponential backoff and left
+  stopped after YOLO_WORKER_MAX_LOAD_FAILURES attempts in a row.
+- roll() moves the workers to new weights one at a time (model hot reload),
+  each only once the previous one has loaded them.
+- Per-worker task counts, busy time and utilization are kept for /api/admin.
+
+Enable with YOLO_WORKERS=<n>; get_yolo_service() then returns a
+PooledYOLOv5Service with the same detect_image / detect_from_bytes API.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Initial shared buffer per worker; grown on demand for larger frames
+DEFAULT_SLOT_BYTES = 4096 * 3072 * 3
+# Seconds between re-checks for a ready worker while waiting for an idle one
+IDLE_POLL_SECONDS = 1.0
+# Restart delay after a failed model load, doubled per consecutive failure
+RESTART_BACKOFF_SECONDS = 5.0
+RESTART_BACKOFF_MAX_SECONDS = 300.0
+# Consecutive failed loads after which a worker is no longer restarted
+MAX_LOAD_FAILURES = int(os.getenv("YOLO_WORKER_MAX_LOAD_FAILURES", "5"))
+# Seconds a worker may take to load new weights during a roll
+ROLL_LOAD_TIMEOUT = float(os.getenv("YOLO_WORKER_LOAD_TIMEOUT", "300"))
+
+
+class PoolUnavailable(RuntimeError):
+    """No worker has a loaded model (all loading, crashed or failed to load)"""
+
+
+def _worker_main(idx, task_queue, result_queue, service_kwargs, num_threads):
+    """Worker process entry point: load the model once, then serve frames"""
+    import numpy as np
+    import torch
+
+    torch.set_num_threads(num_threads)
+
+    from yolo_service import YOLOv5Service
+
+    try:
+        service = YOLOv5Service(**service_kwargs)
+    except Exception as e:
+        result_queue.put(("failed", idx, None, str(e)))
+        return
+    result_queue.put(("ready", idx, None, {
+        "pid": os.getpid(),
+        "model_version": service.model_version,
+        "weights_path": str(service.weights_path),
+    }))
+
+    attached = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, shm_name, shape = task
+        start = time.time()
+        try:
+            shm = attached.get(shm_name)
+            if shm is None:
+                # The parent grew the buffer; drop the old mapping
+                for old in attached.values():
+                    old.close()
+                attached = {shm_name: shared_memory.SharedMemory(name=shm_name)}
+                shm = attached[shm_name]
+            im0 = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            detections, _ = service.detect_image(im0, save_annotated=False)
+            result_queue.put(("done", idx, task_id, (detections, time.time() - start)))
+        except Exception as e:
+            result_queue.put(("error", idx, task_id, (str(e), time.time() - start)))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class _Worker:
+    """Parent-side handle for one worker process"""
+
+    def __init__(self, idx: int, service_kwargs: dict):
+        self.idx = idx
+        self.service_kwargs = service_kwargs  # what the worker process loads
+        self.process: Optional[mp.Process] = None
+        self.task_queue = None
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.ready = False
+        self.generation = 0  # bumped on every (re)start; idle entries of older generations are stale
+        self.current: Optional[Tuple[int, Future]] = None
+        self.retiring = False  # being restarted by roll(): takes no requests, the monitor leaves it alone
+        self.load_failures = 0  # consecutive starts that died before the model loaded
+        self.restart_at: Optional[float] = None  # monotonic time of the pending (backed-off) restart
+        self.stopped = False  # gave up after MAX_LOAD_FAILURES
+        self.started_at = time.time()
+        self.tasks = 0
+        self.errors = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.info = {}
+
+    def stats(self) -> dict:
+        uptime = time.time() - self.started_at
+        return {
+            "worker": self.idx,
+            "pid": self.info.get("pid"),
+            "alive": bool(self.process and self.process.is_alive()),
+            "ready": self.ready,
+            "busy": self.current is not None,
+            "model_version": self.info.get("model_version"),
+            "tasks": self.tasks,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "load_failures": self.load_failures,
+            "stopped": self.stopped,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / uptime, 4) if uptime > 0 else 0.0,
+        }
+
+
+class InferencePool:
+    """Pool of inference worker processes fed through shared memory"""
+
+    def __init__(
+        self,
+        num_workers: int,
+        service_kwargs: Optional[dict] = None,
+        health_interval: float = 5.0,
+        slot_bytes: int = DEFAULT_SLOT_BYTES,
+    ):
+        """
+        Args:
+            num_workers: Number of worker processes (each loads its own model)
+            service_kwargs: Keyword arguments for YOLOv5Service in each worker
+            health_interval: Seconds between worker health checks
+            slot_bytes: Initial shared-memory buffer size per worker
+        """
+        self._ctx = mp.get_context("spawn")  # fork is unsafe with torch + threads
+        self._service_kwargs = service_kwargs or {}
+        self._num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self._health_interval = health_interval
+        self._slot_bytes = slot_bytes
+        self.img_size = self._service_kwargs.get("img_size", 640)
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[Tuple[int, int]]" = queue.Queue()  # (worker idx, generation)
+        self._result_queue = self._ctx.Queue()
+        self._next_task_id = 0
+        self._closed = False
+        self._roll_lock = threading.Lock()
+        self.rolling = False
+
+        self._workers = [_Worker(i, self._service_kwargs) for i in range(num_workers)]
+        for worker in self._workers:
+            worker.shm = shared_memory.SharedMemory(create=True, size=slot_bytes)
+            self._start(worker)
+
+        threading.Thread(target=self._collect_results, name="inference-pool-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="inference-pool-monitor", daemon=True).start()
+
+    def _start(self, worker: _Worker):
+        worker.ready = False
+        worker.generation += 1
+        worker.task_queue = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.idx, worker.task_queue, self._result_queue, worker.service_kwargs, self._num_threads),
+            name=f"inference-worker-{worker.idx}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    # ---------------- Results / health ----------------
+    def _collect_results(self):
+        while not self._closed:
+            try:
+                kind, idx, task_id, payload = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            worker = self._workers[idx]
+            if kind == "ready":
+                worker.info = payload
+                worker.ready = True
+                worker.load_failures = 0
+                self._idle.put((idx, worker.generation))
+                logger.info(f"Inference worker {idx} ready (pid {payload['pid']}, {payload['model_version']})")
+                continue
+            if kind == "failed":
+                worker.ready = False
+                worker.errors += 1
+                logger.error(f"Inference worker {idx} failed to load model: {payload}")
+                continue
+
+            with self._lock:
+                current = worker.current
+                worker.current = None
+            if current is None or current[0] != task_id:
+                continue  # result for a request that was already failed by the monitor
+
+            _, future = current
+            if kind == "done":
+                detections, busy = payload
+                worker.tasks += 1
+                worker.busy_seconds += busy
+                future.set_result(detections)
+            else:
+                message, busy = payload
+                worker.errors += 1
+                worker.busy_seconds += busy
+                future.set_exception(RuntimeError(f"Inference worker {idx}: {message}"))
+            self._idle.put((idx, worker.generation))
+
+    def _fail_current(self, worker: _Worker, message: str):
+        with self._lock:
+            current = worker.current
+            worker.current = None
+        if current is not None:
+            current[1].set_exception(RuntimeError(message))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(self._health_interval)
+            for worker in self._workers:
+                if self._closed or worker.retiring or worker.stopped or worker.process.is_alive():
+                    continue
+                exitcode = worker.process.exitcode
+                self._fail_current(worker, f"Inference worker {worker.idx} crashed (exit code {exitcode})")
+                if worker.restart_at is None:
+                    delay = 0.0
+                    if not worker.ready:  # died before reporting ready: the model did not load
+                        worker.load_failures += 1
+                        if worker.load_failures >= MAX_LOAD_FAILURES:
+                            worker.stopped = True
+                            logger.error(
+                                f"Inference worker {worker.idx} failed to load its model "
+                                f"{worker.load_failures} times in a row, not restarting it"
+                            )
+                            continue
+                        delay = min(RESTART_BACKOFF_MAX_SECONDS,
+                                    RESTART_BACKOFF_SECONDS * 2 ** (worker.load_failures - 1))
+                    worker.restart_at = time.monotonic() + delay
+                    logger.warning(f"Inference worker {worker.idx} died (exit code {exitcode}), restarting in {delay:.0f}s")
+                if time.monotonic() < worker.restart_at:
+                    continue
+                worker.restart_at = None
+                worker.restarts += 1
+                self._start(worker)
+
+    # ---------------- Rolling restart ----------------
+    def roll(self, weights_path) -> bool:
+        """
+        Restart the workers on new weights one at a time; each worker is
+        taken out of rotation only after the previous one has loaded them,
+        so the others keep serving.
+
+        Args:
+            weights_path: Weights file the workers should load
+
+        Returns:
+            True once every worker runs the new weights; False if a worker
+            could not load them (that worker is put back on its old weights
+            and the remaining ones are left alone)
+        """
+        kwargs = {**self._service_kwargs, "weights_path": str(weights_path)}
+        with self._roll_lock:
+            self.rolling = True
+            try:
+                for worker in self._workers:
+                    previous = worker.service_kwargs
+                    if not self._restart_worker(worker, kwargs):
+                        logger.error(f"Inference worker {worker.idx} could not load {weights_path}, stopping the roll")
+                        self._restart_worker(worker, previous)
+                        return False
+                    logger.info(f"Inference worker {worker.idx} now serves {worker.info.get('model_version')}")
+                self._service_kwargs = kwargs
+                return True
+            finally:
+                self.rolling = False
+
+    def _restart_worker(self, worker: _Worker, kwargs: dict) -> bool:
+        """Drain, stop and restart one worker with kwargs; True once its model is loaded"""
+        with self._lock:
+            worker.retiring = True  # submit() no longer claims it
+        try:
+            while worker.current is not None and worker.process.is_alive():
+                time.sleep(0.05)  # let the request it is running finish
+            try:
+                worker.task_queue.put(None)
+            except Exception:
+                pass
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(timeout=5)
+            self._fail_current(worker, f"Inference worker {worker.idx} crashed (exit code {worker.process.exitcode})")
+
+            worker.service_kwargs = kwargs
+            worker.load_failures = 0
+            worker.restart_at = None
+            worker.stopped = False
+            self._start(worker)
+            deadline = time.monotonic() + ROLL_LOAD_TIMEOUT
+            while not worker.ready:
+                if not worker.process.is_alive() or time.monotonic() > deadline:
+                    return False
+                time.sleep(0.1)
+            return True
+        finally:
+            with self._lock:
+                worker.retiring = False
+                if worker.ready and worker.current is None:
+                    # Its "ready" idle entry may have been skipped while it was retiring
+                    self._idle.put((worker.idx, worker.generation))
+
+    # ---------------- Submission ----------------
+    def submit(self, im0, timeout: Optional[float] = None) -> Future:
+        """
+        Queue a decoded BGR frame for detection on the next idle worker
+
+        Args:
+            im0: uint8 image array (H, W, 3)
+            timeout: Seconds to wait for an idle worker (None = as long as
+                some worker has a loaded model)
+
+        Returns:
+            Future resolving to the detections list
+
+        Raises:
+            PoolUnavailable: No worker has a loaded model
+            TimeoutError: No worker became idle within timeout
+        """
+        if self._closed:
+            raise RuntimeError("Inference pool is closed")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = Future()
+        while True:
+            if self.ready_workers == 0 and not self.rolling:
+                raise PoolUnavailable("No inference worker has a loaded model")
+            wait = IDLE_POLL_SECONDS if deadline is None else min(IDLE_POLL_SECONDS, deadline - time.monotonic())
+            if wait <= 0:
+                raise TimeoutError(f"No idle inference worker within {timeout}s")
+            try:
+                idx, generation = self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+            worker = self._workers[idx]
+            # Claim the worker before touching its shared memory; entries from
+            # before a restart (stale generation) or for a busy worker are skipped
+            with self._lock:
+                if (generation == worker.generation and worker.ready and worker.current is None
+                        and not worker.retiring and worker.process.is_alive()):
+                    self._next_task_id += 1
+                    task_id = self._next_task_id
+                    worker.current = (task_id, future)
+                    break
+
+        try:
+            if im0.nbytes > worker.shm.size:
+                old = worker.shm
+                worker.shm = shared_memory.SharedMemory(create=True, size=im0.nbytes)
+                old.close()
+                old.unlink()
+
+            import numpy as np
+            np.ndarray(im0.shape, dtype=np.uint8, buffer=worker.shm.buf)[...] = im0
+            worker.task_queue.put((task_id, worker.shm.name, im0.shape))
+        except Exception:
+            # Release the claim so the worker isn't left marked busy
+            with self._lock:
+                if worker.current is not None and worker.current[0] == task_id:
+                    worker.current = None
+                    self._idle.put((worker.idx, worker.generation))
+            raise
+        return future
+
+    def detect(self, im0, timeout: Optional[float] = None) -> List[dict]:
+        """Blocking detection on one frame"""
+        return self.submit(im0, timeout=timeout).result(timeout=timeout)
+
+    # ---------------- Introspection ----------------
+    def current_model(self) -> Optional[Tuple[str, str]]:
+        """(weights_path, model_version) the ready workers serve, or None if none are ready or they differ"""
+        models = {(w.info.get("weights_path"), w.info.get("model_version")) for w in self._workers if w.ready}
+        return models.pop() if len(models) == 1 else None
+
+    @property
+    def ready_workers(self) -> int:
+        return sum(1 for w in self._workers if w.ready and w.process.is_alive())
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "ready_workers": self.ready_workers,
+            "idle_workers": self._idle.qsize(),
+            "threads_per_worker": self._num_threads,
+            "rolling": self.rolling,
+            "per_worker": [w.stats() for w in self._workers],
+        }
+
+    def close(self):
+        self._closed = True
+        for worker in self._workers:
+            try:
+                worker.task_queue.put(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.shm.close()
+            worker.shm.unlink()
+
+
+class PooledYOLOv5Service:
+    """
+    Drop-in for YOLOv5Service that runs image inference on an InferencePool.
+
+    Decoding and optional annotation happen in the calling process; anything
+    the pool does not cover (e.g. detect_video) falls back to the in-process
+    service from the model registry.
+    """
+
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+
+    @property
+    def model_version(self) -> Optional[str]:
+        versions = {w.info.get("model_version") for w in self.pool._workers if w.ready}
+        return versions.pop() if len(versions) == 1 else None
+
+    def detect_image(self, im0, save_annotated: bool = True):
+        if im0 is None:
+            raise ValueError("Input image is None")
+        from yolo_service import annotate_image
+        detections = self.pool.detect(im0)
+        return detections, annotate_image(im0, detections) if save_annotated else None
+
+    def detect_from_bytes(self, image_bytes: bytes, save_annotated: bool = True):
+        from yolo_service import REDUCED_DECODE, decode_image, _rescale_detections
+        reduce = REDUCED_DECODE and not save_annotated
+        im0, scale = decode_image(image_bytes, self.pool.img_size if reduce else None)
+        detections, annotated_img = self.detect_image(im0, save_annotated)
+        return _rescale_detections(detections, scale), annotated_img
+
+    def annotate(self, im0, detections, inplace: bool = False):
+        from yolo_service import annotate_image
+        return annotate_image(im0, detections, inplace=inplace)
+
+    def __getattr__(self, name):
+        from yolo_service import model_registry
+        return getattr(model_registry.get(), name)
+
+
+# Global pool (created on first use when YOLO_WORKERS is set)
+_pool: Optional[InferencePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> Optional[InferencePool]:
+    """Return the worker pool if YOLO_WORKERS > 0, creating it on first use"""
+    global _pool
+    num_workers = int(os.getenv("YOLO_WORKERS", "0") or 0)
+    if num_workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool(num_workers)
+    return _pool
+
+
+def active_pool() -> Optional[InferencePool]:
+    """The worker pool if it has been started, without starting it"""
+    return _pool
+
+
+def _busy_workers() -> Optional[int]:
+    return sum(1 for w in _pool._workers if w.current is not None) if _pool else None
+
+
+from app_utils.metrics import register_gauge
+register_gauge("mdms_inference_workers_busy", "Inference pool workers running a request", _busy_workers)
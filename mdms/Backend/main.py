@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from routers.complaints import router as complaints_router
 from routers.yolo import router as yolo_router          # Existing YOLO detection APIs
@@ -7,8 +8,9 @@ from routers.yolo_live import router as yolo_live_router  # NEW YOLO Live Camera
 from routers.inspector import router as inspector_router  # NEW Inspector API
 from routers.auth import router as auth_router            # NEW Auth API
 
-from database import engine, Base
+from database import engine, read_engine, async_engine, async_read_engine, Base
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +34,35 @@ async def startup_event():
         logger.error(f"Failed to create database tables: {e}")
         logger.warning("Application will continue, but DB operations may fail")
 
+    # Opt-in eager model load so the first upload doesn't pay for it
+    if os.getenv("YOLO_WORKERS"):
+        from inference_pool import get_inference_pool
+        get_inference_pool()
+        logger.info("Starting inference worker pool")
+    elif os.getenv("PRELOAD_MODEL", "false").lower() == "true":
+        from yolo_service import model_registry
+        model_registry.preload()
+        logger.info("Preloading YOLOv5 model in the background")
+
+    # Hot reload: swap in new weights when weights/best.pt changes on disk
+    watch_interval = os.getenv("MODEL_WATCH_INTERVAL")
+    if watch_interval:
+        from yolo_service import model_registry
+        model_registry.watch(float(watch_interval))
+        logger.info(f"Watching model weights for changes every {watch_interval}s")
+
+
+# -------------------------------------
+# QUERY STATS (Server-Timing + slow request log)
+# -------------------------------------
+from app_utils.query_stats import QueryStatsMiddleware, install as install_query_stats
+for _engine in (engine, read_engine):
+    install_query_stats(_engine)
+for _engine in (async_engine, async_read_engine):
+    if _engine is not None:
+        install_query_stats(_engine.sync_engine)
+app.add_middleware(QueryStatsMiddleware)
+
 
 # -------------------------------------
 # CORS SETTINGS
@@ -55,6 +86,8 @@ app.include_router(inspector_router)   # New inspector dashboard API
 app.include_router(auth_router)        # New Authentication API
 from routers.admin import router as admin_router
 app.include_router(admin_router)
+from routers.analytics import router as analytics_router
+app.include_router(analytics_router)   # Rollup-backed analytics API
 
 
 # -------------------------------------
@@ -72,5 +105,51 @@ async def root():
             "YOLO detect video": "/api/yolo/detect-video",
             "YOLO health": "/api/yolo/health",
             "Inspector Dashboard": "/api/inspector",
+            "Analytics": "/api/analytics",
+            "Readiness": "/health/ready",
+            "Metrics": "/metrics",
         }
-    }
\ No newline at end of file
+    }
+
+
+# -------------------------------------
+# Readiness Endpoint
+# -------------------------------------
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Ready once the detection model is loaded and warmed up.
+    Returns 503 until then so load balancers hold traffic back.
+    Without PRELOAD_MODEL the first probe starts the background load.
+    """
+    from yolo_service import model_registry
+    from inference_pool import get_inference_pool
+    model = model_registry.status()
+    pool = get_inference_pool()
+    ready = pool.ready_workers > 0 if pool else model["loaded"]
+    if not pool and not ready:
+        model_registry.preload()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "loading",
+            "ready": ready,
+            "model_version": model["model_version"],
+            "timings": model["timings"],
+            "error": model["last_error"],
+            "workers": pool.stats() if pool else None,
+        }
+    )
+
+
+# -------------------------------------
+# Metrics Endpoint
+# -------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: per-stage ingest latency histograms,
+    model queue depth, cache hit/miss counts and DB pool usage.
+    """
+    from app_utils.metrics import render_metrics, CONTENT_TYPE
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,46 @@
+"""
+Schema Migration Runner
+Applies the numbered migrations in migrations/versions that have not been
+applied to DATABASE_URL yet. Supersedes the individual migrate_*.py scripts.
+
+Usage:
+    python migrate.py                 # apply all pending migrations
+    python migrate.py --status        # show applied / pending migrations
+    python migrate.py --target 0001   # apply up to and including 0001
+"""
+import sys
+import argparse
+
+import migrations
+from database import engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply MDMS schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--target", default=None, help="last version to apply, e.g. 0002")
+    args = parser.parse_args()
+
+    if args.status:
+        done = migrations.applied_versions(engine)
+        for version, name in migrations.discover():
+            print(f"  [{'x' if version in done else ' '}] {name}")
+        return
+
+    print(f"Migrating {engine.url.render_as_string(hide_password=True)}...")
+    try:
+        applied = migrations.upgrade(engine, target=args.target)
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        sys.exit(1)
+
+    if applied:
+        for name in applied:
+            print(f"[OK] Applied {name}")
+        print("\n[SUCCESS] Database is up to date")
+    else:
+        print("[OK] No pending migrations")
+
+
+if __name__ == "__main__":
+    main()
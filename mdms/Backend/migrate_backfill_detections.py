@@ -0,0 +1,50 @@
+"""
+Database Migration Script
+Creates the detections table and backfills it from the box JSON stored in
+complaint_images.detections, so images uploaded before the table existed
+can be queried in SQL too.
+"""
+import json
+
+from database import engine, Base, SessionLocal
+from app_models import ComplaintImage, Detection
+from crud import save_detections
+
+
+def migrate():
+    print("Starting migration: Creating and backfilling detections table...")
+
+    # Create new tables
+    Base.metadata.create_all(bind=engine)
+    print("[OK] detections table created if it didn't exist")
+
+    db = SessionLocal()
+    try:
+        already_done = {image_id for (image_id,) in db.query(Detection.image_id).distinct()}
+        images = (
+            db.query(ComplaintImage.id, ComplaintImage.detections)
+            .filter(ComplaintImage.detections.isnot(None))
+            .all()
+        )
+
+        backfilled = 0
+        for image_id, detections_json in images:
+            if image_id in already_done:
+                continue
+            detections = json.loads(detections_json)
+            if detections:
+                save_detections(db, image_id, detections)
+                backfilled += 1
+
+        db.commit()
+        print(f"[OK] Backfilled detections for {backfilled} image(s)")
+        print("\n[SUCCESS] Migration completed successfully!")
+    except Exception as e:
+        db.rollback()
+        print(f"\n[ERROR] Migration failed: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
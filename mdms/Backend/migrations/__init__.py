@@ -0,0 +1,125 @@
+"""
+Versioned Schema Migrations
+Replaces the one-off migrate_*.py scripts with numbered migrations that are
+applied once, in order, and recorded in a schema_migrations table.
+
+Each module in migrations/versions is named NNNN_description.py and defines
+`upgrade(conn)`, which runs inside a transaction. Migrations must be
+idempotent against databases that were set up by create_all or by the old
+scripts (use the helpers below), since those already have parts of the schema.
+
+Run with:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied / pending
+"""
+import re
+import importlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def discover() -> List[Tuple[str, str]]:
+    """All migrations on disk as (version, module name), in order"""
+    found = []
+    for path in sorted(VERSIONS_DIR.glob("*.py")):
+        match = _FILENAME.match(path.name)
+        if match:
+            found.append((match.group(1), path.stem))
+    return found
+
+
+def applied_versions(engine) -> set:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def pending(engine) -> List[Tuple[str, str]]:
+    done = applied_versions(engine)
+    return [(version, name) for version, name in discover() if version not in done]
+
+
+def upgrade(engine, target: str = None) -> List[str]:
+    """
+    Apply pending migrations in order, each in its own transaction
+
+    Args:
+        engine: Sync SQLAlchemy engine
+        target: Stop after this version (default: apply all)
+
+    Returns:
+        Names of the migrations that were applied
+    """
+    applied = []
+    for version, name in pending(engine):
+        if target is not None and version > target:
+            break
+        module = importlib.import_module(f"{__name__}.versions.{name}")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now(timezone.utc)
+            ))
+        applied.append(name)
+    return applied
+
+
+# ---------------- Helpers for idempotent migrations ----------------
+def has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def has_index(conn, table: str, index: str) -> bool:
+    return any(i["name"] == index for i in inspect(conn).get_indexes(table))
+
+
+def add_missing_columns(conn, table) -> List[str]:
+    """ALTER TABLE ADD COLUMN for every model column the database table lacks"""
+    added = []
+    for column in table.columns:
+        if column.primary_key or has_column(conn, table.name, column.name):
+            continue  # primary keys can't be added after the fact
+        col_type = column.type.compile(dialect=conn.dialect)
+        default = None
+        if column.server_default is not None:
+            default = str(column.server_default.arg.compile(dialect=conn.dialect))
+        if default and conn.dialect.name == "sqlite" and not isinstance(column.server_default.arg, str):
+            # SQLite rejects non-constant defaults (CURRENT_TIMESTAMP) in ADD COLUMN; backfill instead
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}")
+            conn.exec_driver_sql(f"UPDATE {table.name} SET {column.name} = {default}")
+        else:
+            default_sql = f" DEFAULT {default}" if default else ""
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}{default_sql}")
+        added.append(column.name)
+    return added
+
+
+def create_missing_indexes(conn, table, names=None) -> List[str]:
+    """Create the model's indexes on table (optionally only those named) if they don't exist"""
+    created = []
+    for index in table.indexes:
+        if names is not None and index.name not in names:
+            continue
+        if not has_index(conn, table.name, index.name):
+            index.create(bind=conn)
+            created.append(index.name)
+    return created
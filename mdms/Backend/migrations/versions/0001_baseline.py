@@ -0,0 +1,21 @@
+"""
+Baseline: bring any existing database up to the current models.
+
+Covers what the old migrate_*.py scripts did one by one (timestamps,
+area/district, dedup fields, confidence, comments, resolved_by, detections):
+creates missing tables and adds any model column a table lacks.
+"""
+from migrations import add_missing_columns
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401  (registers the tables on Base.metadata)
+
+    # New tables (with all their indexes)
+    Base.metadata.create_all(bind=conn)
+
+    for table in Base.metadata.sorted_tables:
+        added = add_missing_columns(conn, table)
+        if added:
+            print(f"[OK] {table.name}: added {', '.join(added)}")
@@ -0,0 +1,36 @@
+"""
+Indexes for the hot read paths.
+
+- tickets.status: ticket list filtered by status
+- sub_tickets.ticket_id: sub-tickets of a ticket (ticket list / detail)
+- complaint_images(sub_id, created_at): first / earliest image of a sub-ticket
+- sub_tickets(authority, status, created_at): inspector dashboard, newest first
+- sub_tickets(status, resolved_at): resolved sub-tickets by resolution time
+
+Verify with `python explain_queries.py`.
+"""
+from migrations import create_missing_indexes
+
+INDEXES = {
+    "tickets": [
+        "ix_tickets_status",
+    ],
+    "sub_tickets": [
+        "ix_sub_tickets_ticket_id",
+        "ix_sub_tickets_authority_status_created_at",
+        "ix_sub_tickets_status_resolved_at",
+    ],
+    "complaint_images": [
+        "ix_complaint_images_sub_id_created_at",
+    ],
+}
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+
+    for table_name, names in INDEXES.items():
+        created = create_missing_indexes(conn, Base.metadata.tables[table_name], names)
+        for name in created:
+            print(f"[OK] Created index {name}")
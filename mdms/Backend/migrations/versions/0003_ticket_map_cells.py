@@ -0,0 +1,48 @@
+"""
+map_cell on tickets and sub_tickets for GET /api/complaints/map.
+
+Adds the columns and their covering indexes and fills them for existing rows.
+"""
+from sqlalchemy import select, update, bindparam
+
+from migrations import add_missing_columns, create_missing_indexes
+
+BATCH_SIZE = 1000
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+    from app_utils.map_tiles import map_cell
+
+    tickets = Base.metadata.tables["tickets"]
+    sub_tickets = Base.metadata.tables["sub_tickets"]
+    add_missing_columns(conn, tickets)
+    add_missing_columns(conn, sub_tickets)
+
+    rows = conn.execute(
+        select(tickets.c.ticket_id, tickets.c.latitude, tickets.c.longitude).where(
+            tickets.c.map_cell.is_(None),
+            tickets.c.latitude.isnot(None),
+            tickets.c.longitude.isnot(None),
+        )
+    ).all()
+    stmt = update(tickets).where(tickets.c.ticket_id == bindparam("key")).values(map_cell=bindparam("cell"))
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        conn.execute(stmt, [{"key": r.ticket_id, "cell": map_cell(r.latitude, r.longitude)} for r in batch])
+    print(f"[OK] Filled map_cell for {len(rows)} tickets")
+
+    conn.execute(
+        update(sub_tickets)
+        .where(sub_tickets.c.map_cell.is_(None))
+        .values(map_cell=select(tickets.c.map_cell)
+                .where(tickets.c.ticket_id == sub_tickets.c.ticket_id)
+                .scalar_subquery())
+    )
+    print("[OK] Copied map_cell to sub_tickets")
+
+    created = create_missing_indexes(conn, tickets, ["ix_tickets_map_cell_location"])
+    created += create_missing_indexes(conn, sub_tickets, ["ix_sub_tickets_map_cell_issue_status"])
+    for name in created:
+        print(f"[OK] Created index {name}")
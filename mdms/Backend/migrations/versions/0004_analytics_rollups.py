@@ -0,0 +1,16 @@
+"""
+Analytics rollup tables (see app_utils/analytics.py), filled from the
+existing tickets and sub-tickets.
+"""
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+    from app_utils import analytics
+
+    for name in ("analytics_hourly", "analytics_daily", "analytics_resolve_histogram", "analytics_cells_daily"):
+        Base.metadata.tables[name].create(bind=conn, checkfirst=True)
+
+    counted = analytics.rebuild(conn)
+    print(f"[OK] Built analytics rollups from {counted} sub-tickets")
@@ -0,0 +1,39 @@
+"""
+Recompute complaint image hashes with the reduced-decode pHash engine
+(app_utils/image_hash.py), so stored hashes match the ones new uploads get.
+"""
+from sqlalchemy import select, update, bindparam
+
+BATCH_SIZE = 200  # images (blobs) loaded at a time
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+    from app_utils.image_hash import calculate_image_hashes
+
+    images = Base.metadata.tables["complaint_images"]
+    stmt = update(images).where(images.c.id == bindparam("key")).values(image_hash=bindparam("hash"))
+
+    last_id, changed, total = 0, 0, 0
+    while True:
+        rows = conn.execute(
+            select(images.c.id, images.c.image_data, images.c.image_hash)
+            .where(images.c.id > last_id, images.c.media_type == "image")
+            .order_by(images.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        total += len(rows)
+        hashes = calculate_image_hashes([row.image_data for row in rows])
+        updates = [
+            {"key": row.id, "hash": new_hash}
+            for row, new_hash in zip(rows, hashes)
+            if new_hash != row.image_hash
+        ]
+        if updates:
+            conn.execute(stmt, updates)
+            changed += len(updates)
+    print(f"[OK] Rehashed {total} images ({changed} hashes changed)")
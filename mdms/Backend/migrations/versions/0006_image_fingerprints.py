@@ -0,0 +1,43 @@
+"""
+Composite fingerprints (app_utils/fingerprint.py) for stored complaint images.
+
+Adds complaint_images.fingerprint and fills it for existing images. The pHash
+part equals image_hash (rehashed by 0005), so image_hash is left as is.
+"""
+from sqlalchemy import select, update, bindparam
+
+from migrations import add_missing_columns
+
+BATCH_SIZE = 200  # images (blobs) loaded at a time
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+    from app_utils.fingerprint import calculate_signatures
+
+    images = Base.metadata.tables["complaint_images"]
+    add_missing_columns(conn, images)
+
+    stmt = update(images).where(images.c.id == bindparam("key")).values(fingerprint=bindparam("value"))
+    last_id, filled = 0, 0
+    while True:
+        rows = conn.execute(
+            select(images.c.id, images.c.image_data)
+            .where(images.c.id > last_id, images.c.media_type == "image", images.c.fingerprint.is_(None))
+            .order_by(images.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        signatures = calculate_signatures([row.image_data for row in rows])
+        updates = [
+            {"key": row.id, "value": fingerprint}
+            for row, (_, fingerprint) in zip(rows, signatures)
+            if fingerprint
+        ]
+        if updates:
+            conn.execute(stmt, updates)
+            filled += len(updates)
+    print(f"[OK] Fingerprinted {filled} images")
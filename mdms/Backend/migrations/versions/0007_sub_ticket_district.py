@@ -0,0 +1,32 @@
+"""
+District of each sub-ticket at creation (sub_tickets.district), which the
+analytics rollups are keyed on instead of the ticket's current district.
+
+Existing sub-tickets get their ticket's district, then the rollups are
+rebuilt on the new column.
+"""
+from sqlalchemy import select, update
+
+from migrations import add_missing_columns
+
+
+def upgrade(conn):
+    from database import Base
+    import app_models  # noqa: F401
+    from app_utils import analytics
+
+    tickets = Base.metadata.tables["tickets"]
+    sub_tickets = Base.metadata.tables["sub_tickets"]
+    add_missing_columns(conn, sub_tickets)
+
+    conn.execute(
+        update(sub_tickets)
+        .where(sub_tickets.c.district.is_(None))
+        .values(district=select(tickets.c.district)
+                .where(tickets.c.ticket_id == sub_tickets.c.ticket_id)
+                .scalar_subquery())
+    )
+    print("[OK] Copied district to sub_tickets")
+
+    counted = analytics.rebuild(conn)
+    print(f"[OK] Rebuilt analytics rollups from {counted} sub-tickets")
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import get_db
 from app_models import SubTicket, User, ApprovedInspector
 from schemas import UserCreate, UserResponse
@@ -69,3 +70,59 @@ def create_inspector(user: UserCreate, db: Session = Depends(get_db)):
     db.commit()
     
     return new_user
+
+
+@router.get("/model")
+def get_model_status():
+    """
+    Get the active detection model version and reload history
+    """
+    from yolo_service import model_registry
+    return {
+        "status": "success",
+        "model": model_registry.status()
+    }
+
+
+@router.post("/model/reload")
+def reload_model(
+    weights: Optional[str] = Query(None, description="Weights file name inside yolov5/weights (default: best.pt)")
+):
+    """
+    Load new weights in the background and swap them in once warmed up.
+    Requests keep using the current model until the swap. With the inference
+    worker pool (YOLO_WORKERS), the workers are then restarted on the new
+    weights one at a time; the new version is reported once all of them
+    serve it.
+    """
+    from yolo_service import model_registry, YOLO_ROOT
+
+    weights_path = None
+    if weights:
+        weights_dir = YOLO_ROOT / "weights"
+        weights_path = (weights_dir / weights).resolve()
+        if weights_path.parent != weights_dir.resolve() or not weights_path.exists():
+            raise HTTPException(status_code=404, detail=f"Weights not found: {weights}")
+
+    if not model_registry.reload(weights_path):
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+
+    return {
+        "status": "success",
+        "message": "Model reload started",
+        "model": model_registry.status()
+    }
+
+
+@router.get("/workers")
+def get_worker_stats():
+    """
+    Get health and utilization of the inference worker pool (YOLO_WORKERS)
+    """
+    from inference_pool import get_inference_pool
+    pool = get_inference_pool()
+    return {
+        "status": "success",
+        "enabled": pool is not None,
+        "pool": pool.stats() if pool else None
+    }
@@ -0,0 +1,197 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime, timedelta
+
+from database import get_async_db
+from app_models import AnalyticsHourly, AnalyticsDaily, AnalyticsResolveHistogram, AnalyticsCellDaily
+from app_utils import analytics
+from app_utils.map_tiles import tile_center
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+# Rollups follow every sub-ticket create / resolve / delete
+analytics.track_sub_tickets()
+
+GROUP_COLUMNS = ("district", "authority", "issue_type")
+DEFAULT_RANGE = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+
+def _time_range(start, end, granularity="day"):
+    end = analytics._utc(end) if end else datetime.utcnow()
+    start = analytics._utc(start) if start else end - DEFAULT_RANGE[granularity]
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+def _group_columns(model, group_by):
+    unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by {', '.join(unknown)} (use {', '.join(GROUP_COLUMNS)})")
+    return [getattr(model, g) for g in group_by]
+
+
+def _filters(model, district, authority, issue_type):
+    filters = []
+    if district:
+        filters.append(model.district == district)
+    if authority:
+        filters.append(model.authority == authority)
+    if issue_type:
+        filters.append(model.issue_type == issue_type)
+    return filters
+
+
+# --------------------------------------------------
+# COUNTS OVER TIME
+# --------------------------------------------------
+@router.get("/counts")
+async def get_counts(
+    granularity: str = Query("day", regex="^(hour|day)$", description="Bucket size"),
+    start: Optional[datetime] = Query(None, description="From (UTC, default 30 days / 48 hours ago)"),
+    end: Optional[datetime] = Query(None, description="Until (UTC, default now)"),
+    group_by: List[str] = Query([], description="Any of district, authority, issue_type"),
+    district: Optional[str] = Query(None),
+    authority: Optional[str] = Query(None),
+    issue_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Complaints created and resolved per hour or day, optionally split by
+    district / authority / issue type. Reads the rollup tables only.
+    """
+    model = AnalyticsHourly if granularity == "hour" else AnalyticsDaily
+    start, end = _time_range(start, end, granularity)
+    columns = _group_columns(model, group_by)
+
+    rows = (await db.execute(
+        select(model.bucket, *columns, func.sum(model.created), func.sum(model.resolved))
+        .where(model.bucket >= start, model.bucket <= end, *_filters(model, district, authority, issue_type))
+        .group_by(model.bucket, *columns)
+        .order_by(model.bucket, *columns)
+    )).all()
+
+    series = []
+    for row in rows:
+        if not row[-2] and not row[-1]:
+            continue  # emptied by deletes / re-opened complaints
+        point = {"bucket": row[0].isoformat()}
+        point.update(zip(group_by, row[1:1 + len(group_by)]))
+        point["created"] = int(row[-2] or 0)
+        point["resolved"] = int(row[-1] or 0)
+        series.append(point)
+
+    return {
+        "status": "success",
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "series": series
+    }
+
+
+# --------------------------------------------------
+# TIME TO RESOLVE
+# --------------------------------------------------
+@router.get("/resolution")
+async def get_resolution_times(
+    start: Optional[datetime] = Query(None, description="Resolved from (UTC, default 30 days ago)"),
+    end: Optional[datetime] = Query(None, description="Resolved until (UTC, default now)"),
+    group_by: List[str] = Query(["authority"], description="Any of district, authority, issue_type"),
+    district: Optional[str] = Query(None),
+    authority: Optional[str] = Query(None),
+    issue_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Mean and p90 time-to-resolve (hours) of complaints resolved in the range,
+    by authority by default. p90 is interpolated from the daily histogram
+    (accurate to a bin width, capped using the mean; see histogram_percentile).
+    """
+    start, end = _time_range(start, end)
+    # Daily buckets start at midnight; include the day containing `start`
+    day_start = analytics.day_bucket(start)
+
+    totals_columns = _group_columns(AnalyticsDaily, group_by)
+    totals = (await db.execute(
+        select(*totals_columns, func.sum(AnalyticsDaily.resolved), func.sum(AnalyticsDaily.resolve_seconds))
+        .where(AnalyticsDaily.bucket >= day_start, AnalyticsDaily.bucket <= end,
+               *_filters(AnalyticsDaily, district, authority, issue_type))
+        .group_by(*totals_columns)
+    )).all()
+
+    hist_columns = _group_columns(AnalyticsResolveHistogram, group_by)
+    bins = (await db.execute(
+        select(*hist_columns, AnalyticsResolveHistogram.bin, func.sum(AnalyticsResolveHistogram.count))
+        .where(AnalyticsResolveHistogram.bucket >= day_start, AnalyticsResolveHistogram.bucket <= end,
+               *_filters(AnalyticsResolveHistogram, district, authority, issue_type))
+        .group_by(*hist_columns, AnalyticsResolveHistogram.bin)
+    )).all()
+    histograms = {}
+    for row in bins:
+        histograms.setdefault(tuple(row[:len(group_by)]), {})[row[-2]] = int(row[-1] or 0)
+
+    results = []
+    for row in totals:
+        key = tuple(row[:len(group_by)])
+        resolved, seconds = int(row[-2] or 0), float(row[-1] or 0.0)
+        if resolved <= 0:
+            continue
+        mean_hours = seconds / resolved / 3600
+        p90 = analytics.histogram_percentile(histograms.get(key, {}), 90, mean_hours)
+        results.append({
+            **dict(zip(group_by, key)),
+            "resolved": resolved,
+            "mean_hours": round(mean_hours, 2),
+            "p90_hours": round(p90, 2) if p90 is not None else None,
+        })
+    results.sort(key=lambda r: -r["resolved"])
+
+    return {
+        "status": "success",
+        "start": day_start.isoformat(),
+        "end": end.isoformat(),
+        "results": results
+    }
+
+
+# --------------------------------------------------
+# SPATIAL HEATMAP
+# --------------------------------------------------
+@router.get("/heatmap")
+async def get_heatmap(
+    zoom: int = Query(14, ge=1, le=analytics.HEATMAP_ZOOM, description="Grid cell size as a map zoom level"),
+    start: Optional[datetime] = Query(None, description="Created from (UTC, default 30 days ago)"),
+    end: Optional[datetime] = Query(None, description="Created until (UTC, default now)"),
+    issue_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Complaint counts per grid cell (web-mercator tiles at `zoom`) for a
+    heatmap layer, with each cell's centre.
+    """
+    start, end = _time_range(start, end)
+    cell = func.substr(AnalyticsCellDaily.cell, 1, zoom)
+    filters = [AnalyticsCellDaily.bucket >= analytics.day_bucket(start), AnalyticsCellDaily.bucket <= end]
+    if issue_type:
+        filters.append(AnalyticsCellDaily.issue_type == issue_type)
+
+    rows = (await db.execute(
+        select(cell, func.sum(AnalyticsCellDaily.created)).where(*filters).group_by(cell)
+    )).all()
+
+    cells = []
+    for quadkey, count in rows:
+        if not count:
+            continue
+        lat, lon = tile_center(quadkey)
+        cells.append({"cell": quadkey, "latitude": lat, "longitude": lon, "count": int(count)})
+
+    return {
+        "status": "success",
+        "zoom": zoom,
+        "max_count": max((c["count"] for c in cells), default=0),
+        "cells": cells
+    }
@@ -1,18 +1,27 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
 import os
-import cv2
+import json
+import time
 import uuid
 from pathlib import Path
-from database import get_db
+from database import get_db, get_async_db
 from app_utils.exif import extract_gps_from_image_bytes
 from app_utils.geo import group_by_location
-from app_utils.deduplication import check_duplicate_image
+from app_utils.deduplication import check_duplicate_image, check_duplicate_batch
+from app_utils.fingerprint import calculate_signatures
 from yolo_service import get_yolo_service
-from app_models import Ticket, SubTicket, ComplaintImage
+from inference_pool import PoolUnavailable
+from app_models import Ticket, SubTicket, ComplaintImage, Detection
+from app_utils.metrics import timed, MODEL_QUEUE_DEPTH
+from app_utils import map_tiles, analytics, embeddings
+from app_utils.map_tiles import map_cell
 
 from crud import (
     get_or_create_ticket,
@@ -22,6 +31,9 @@ from crud import (
 
 router = APIRouter(prefix="/api/complaints", tags=["Complaints"])
 
+# Map clusters are cached per tile; any ticket / sub-ticket write clears them
+map_tiles.invalidate_on_change(Ticket, SubTicket)
+
 # Directories for storing media
 UPLOAD_DIR = Path("uploads")
 # AI folders
@@ -102,7 +114,8 @@ async def upload_complaint_image(
     authority = AUTHORITY_MAP[normalized_issue]
 
     # Read image bytes
-    image_bytes = await file.read()
+    with timed("read"):
+        image_bytes = await file.read()
 
     # 🔍 EXIF GPS detection disabled as per user request for "empty of all" initial state
     gps_data = None
@@ -126,7 +139,11 @@ async def upload_complaint_image(
         gps_extracted = False
         gps_source = "unknown"
 
-    # Duplicate check (even without reliable GPS we check similarity)
+    # Perceptual hash and fingerprint of the uploaded (original) bytes, used for the duplicate check and stored
+    with timed("phash"):
+        image_hash, fingerprint = calculate_signatures([image_bytes])[0]
+
+    # Duplicate check before detection (even without reliable GPS we check similarity)
     check_lat = lat if gps_extracted and lat != DEFAULT_LAT else None
     check_lon = lon if gps_extracted and lon != DEFAULT_LON else None
 
@@ -136,6 +153,8 @@ async def upload_complaint_image(
         latitude=check_lat,
         longitude=check_lon,
         distance_threshold=50,  # 50 meters for location-aware matching
+        image_hash=image_hash,
+        fingerprint=fingerprint,
     )
 
     if is_duplicate:
@@ -146,18 +165,17 @@ async def upload_complaint_image(
             "existing_complaint": existing_info,
         }
 
-    # 🔍 Run YOLO detection for results
+    # 🔍 Run YOLO detection for results (boxes only, overlays are rendered at view time)
     yolo_service = get_yolo_service()
-    annotated_bytes = image_bytes  # Fallback
+    detections = None
     max_confidence = None
     try:
-        detections, annotated_cv2_img = yolo_service.detect_from_bytes(image_bytes)
-        if annotated_cv2_img is not None:
-            _, encoded_img = cv2.imencode('.jpg', annotated_cv2_img)
-            annotated_bytes = encoded_img.tobytes()
-            
-            if detections:
-                max_confidence = max(d['confidence'] for d in detections)
+        with MODEL_QUEUE_DEPTH.track_inprogress():
+            detections, _ = await run_in_threadpool(yolo_service.detect_from_bytes, image_bytes, save_annotated=False)
+        if detections:
+            max_confidence = max(d['confidence'] for d in detections)
+    except PoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Detection is unavailable: {e}")
     except Exception as e:
         print(f"YOLO detection failed for single upload: {e}")
 
@@ -177,26 +195,26 @@ async def upload_complaint_image(
     safe_name = f"{unique_id}_{file.filename}"
     
     # Save original
-    with open(ORIGINAL_IMG_DIR / safe_name, "wb") as f:
+    with timed("disk_write"), open(ORIGINAL_IMG_DIR / safe_name, "wb") as f:
         f.write(image_bytes)
-        
-    # Save result (annotated)
-    with open(RESULTS_IMG_DIR / safe_name, "wb") as f:
-        f.write(annotated_bytes)
 
     # 3️⃣ SAVE IMAGE TO DB
     image = save_image(
         db=db,
         sub_id=sub_ticket.sub_id,
-        image_bytes=annotated_bytes,
+        image_bytes=image_bytes,
         content_type=file.content_type,
         gps_extracted=gps_extracted,
         media_type="image",
         file_name=safe_name,
         latitude=lat if gps_extracted else None,
         longitude=lon if gps_extracted else None,
-        confidence=max_confidence
+        confidence=max_confidence,
+        detections=detections,
+        image_hash=image_hash,
+        fingerprint=fingerprint
     )
+    embeddings.index_in_background([(image.id, image_bytes)])
 
     return {
         "status": "success",
@@ -230,12 +248,13 @@ async def upload_batch_complaints(
         raise HTTPException(400, "No files uploaded")
 
     yolo_service = get_yolo_service()
-    processed_items = []
+    uploads = []
 
-    # ---------------- PROCESS EACH FILE ----------------
+    # ---------------- READ + LOCATE EACH FILE ----------------
     for file in files:
         content_type = file.content_type
-        file_bytes = await file.read()
+        with timed("read"):
+            file_bytes = await file.read()
 
         lat, lon = None, None
         gps_extracted = False
@@ -243,7 +262,8 @@ async def upload_batch_complaints(
 
         # ---------- IMAGE GPS (AUTO) ----------
         if content_type and content_type.startswith("image/"):
-            gps_data = extract_gps_from_image_bytes(file_bytes)
+            with timed("exif"):
+                gps_data = extract_gps_from_image_bytes(file_bytes)
             if gps_data and gps_data.get("latitude") and gps_data.get("longitude"):
                 lat = gps_data["latitude"]
                 lon = gps_data["longitude"]
@@ -257,18 +277,105 @@ async def upload_batch_complaints(
             gps_extracted = True
             gps_source = "manual"
 
+        uploads.append({
+            "file_name": file.filename,
+            "file_bytes": file_bytes,
+            "content_type": content_type,
+            "latitude": lat,
+            "longitude": lon,
+            "gps_extracted": gps_extracted,
+            "image_hash": None,
+            "fingerprint": None,
+        })
+
+    # ---------------- PERCEPTUAL HASHES + FINGERPRINTS (ORIGINAL BYTES, WHOLE BATCH) ----------------
+    image_uploads = [
+        upload for upload in uploads
+        if upload["content_type"] and upload["content_type"].startswith("image/")
+    ]
+    with timed("phash"):
+        signatures = calculate_signatures([upload["file_bytes"] for upload in image_uploads])
+    for upload, (image_hash, fingerprint) in zip(image_uploads, signatures):
+        upload["image_hash"] = image_hash
+        upload["fingerprint"] = fingerprint
+
+    # ---------------- DUPLICATES (BEFORE DETECTION) ----------------
+    # Near-identical photos within the batch and photos of complaints already
+    # registered are rejected here, so YOLO never runs on them
+    hashed = [upload for upload in uploads if upload["image_hash"]]
+    checks = check_duplicate_batch(
+        db,
+        [
+            {
+                "image_hash": upload["image_hash"],
+                "fingerprint": upload["fingerprint"],
+                "latitude": upload["latitude"] if upload["gps_extracted"] and upload["latitude"] != DEFAULT_LAT else None,
+                "longitude": upload["longitude"] if upload["gps_extracted"] and upload["longitude"] != DEFAULT_LON else None,
+            }
+            for upload in hashed
+        ],
+        distance_threshold=50  # 50 meters as per requirements
+    )
+    for upload, (is_duplicate, reason, existing_info) in zip(hashed, checks):
+        if not is_duplicate:
+            continue
+        has_gps = upload["gps_extracted"] and upload["latitude"] != DEFAULT_LAT and upload["longitude"] != DEFAULT_LON
+        upload["rejection"] = {
+            "file_name": upload["file_name"],
+            "media_type": "image",
+            "message": reason or "This complaint is already registered. Thanks for your concern.",
+            "latitude": upload["latitude"] if has_gps else None,
+            "longitude": upload["longitude"] if has_gps else None,
+            "gps_extracted": upload["gps_extracted"],
+            "existing_complaint": existing_info.get("ticket_info") if existing_info else None,
+            "details": {
+                "distance_meters": existing_info.get("distance_meters") if existing_info else None,
+                "existing_image_id": existing_info.get("id") if existing_info else None,
+                "ticket_id": (existing_info.get("ticket_info") or {}).get("ticket_id") if existing_info else None,
+                "duplicate_of_file": hashed[existing_info["batch_index"]]["file_name"] if existing_info and "batch_index" in existing_info else None
+            }
+        }
+
+    processed_items = []
+
+    # ---------------- PROCESS EACH FILE ----------------
+    for upload in uploads:
+        file_name = upload["file_name"]
+        file_bytes = upload["file_bytes"]
+        content_type = upload["content_type"]
+        lat, lon = upload["latitude"], upload["longitude"]
+        gps_extracted = upload["gps_extracted"]
+
+        # Duplicates skip detection and are reported with the rejected items
+        if upload.get("rejection"):
+            processed_items.append({
+                "file_bytes": file_bytes,
+                "annotated_bytes": file_bytes,
+                "content_type": content_type,
+                "file_name": file_name,
+                "media_type": "image",
+                "latitude": lat,
+                "longitude": lon,
+                "issue_type": None,
+                "gps_extracted": gps_extracted,
+                "detection_confidence": None,
+                "no_detection": False,
+                "rejection": upload["rejection"],
+            })
+            continue
+
         # ---------- YOLO DETECTION ----------
         detections = []
-        annotated_bytes = file_bytes  # Fallback to original
+        annotated_bytes = file_bytes  # Images keep the original; overlays are rendered at view time
         
         if content_type.startswith("image/"):
             try:
-                detections, annotated_cv2_img = yolo_service.detect_from_bytes(file_bytes)
-                if annotated_cv2_img is not None:
-                     _, encoded_img = cv2.imencode('.jpg', annotated_cv2_img)
-                     annotated_bytes = encoded_img.tobytes()
+                with MODEL_QUEUE_DEPTH.track_inprogress():
+                    detections, _ = await run_in_threadpool(yolo_service.detect_from_bytes, file_bytes, save_annotated=False)
+            except PoolUnavailable as e:
+                raise HTTPException(status_code=503, detail=f"Detection is unavailable: {e}")
             except Exception as e:
-                print(f"YOLO detection failed for image {file.filename}: {e}")
+                print(f"YOLO detection failed for image {file_name}: {e}")
                 detections = []
         
         elif content_type.startswith("video/"):
@@ -295,7 +402,7 @@ async def upload_batch_complaints(
                 except: pass
                     
             except Exception as e:
-                print(f"YOLO detection failed for video {file.filename}: {e}")
+                print(f"YOLO detection failed for video {file_name}: {e}")
                 detections = []
 
         # Find the primary issue type for this file (image or video)
@@ -318,7 +425,7 @@ async def upload_batch_complaints(
                 "file_bytes": file_bytes,
                 "annotated_bytes": annotated_bytes,
                 "content_type": content_type,
-                "file_name": file.filename,
+                "file_name": file_name,
                 "media_type": "video" if content_type.startswith("video/") else "image",
                 "latitude": lat,
                 "longitude": lon,
@@ -335,13 +442,16 @@ async def upload_batch_complaints(
             "file_bytes": file_bytes,
             "annotated_bytes": annotated_bytes,
             "content_type": content_type,
-            "file_name": file.filename,
+            "file_name": file_name,
             "media_type": "video" if content_type.startswith("video/") else "image",
             "latitude": lat,
             "longitude": lon,
             "issue_type": issue_type,
             "gps_extracted": gps_extracted,
             "detection_confidence": max_confidence if max_confidence > 0 else None,
+            "detections": detections if content_type.startswith("image/") else None,
+            "image_hash": upload["image_hash"],
+            "fingerprint": upload["fingerprint"],
             "no_detection": False,
         })
 
@@ -355,6 +465,7 @@ async def upload_batch_complaints(
     )
 
     results = []
+    embed_queue = []  # (image id, bytes) of saved images, indexed for similarity search afterwards
 
     # ---------------- PROCESS EACH LOCATION GROUP ----------------
     # ---------------- PROCESS EACH LOCATION GROUP ----------------
@@ -405,6 +516,9 @@ async def upload_batch_complaints(
                     ticket_result["rejected_items"] = []
                 
                 for item in items:
+                    if item.get("rejection"):
+                        ticket_result["rejected_items"].append(item["rejection"])
+                        continue
                     ticket_result["rejected_items"].append({
                         "file_name": item["file_name"],
                         "media_type": item["media_type"],
@@ -449,42 +563,9 @@ async def upload_batch_complaints(
                     })
                     continue
 
-                # Check duplicates for all images; use GPS when available
-                is_image = item["media_type"] == "image" and item["content_type"].startswith("image/")
+                # Duplicates were rejected before detection
                 has_gps = item["gps_extracted"] and item["latitude"] != DEFAULT_LAT and item["longitude"] != DEFAULT_LON
                 
-                if is_image:
-                    check_lat = item["latitude"] if has_gps and item["latitude"] is not None else None
-                    check_lon = item["longitude"] if has_gps and item["longitude"] is not None else None
-
-                    # Check for duplicate image (similarity + optional location)
-                    is_duplicate, reason, existing_info = check_duplicate_image(
-                        db=db,
-                        image_bytes=item["file_bytes"],
-                        latitude=check_lat,
-                        longitude=check_lon,
-                        distance_threshold=50  # 50 meters as per requirements
-                    )
-                    
-                    if is_duplicate:
-                        # Reject duplicate image with user-friendly message
-                        rejected_count += 1
-                        rejected_items.append({
-                            "file_name": item["file_name"],
-                            "media_type": item["media_type"],
-                            "message": reason or "This complaint is already registered. Thanks for your concern.",
-                            "latitude": item["latitude"] if has_gps else None,
-                            "longitude": item["longitude"] if has_gps else None,
-                            "gps_extracted": item["gps_extracted"],
-                            "existing_complaint": existing_info.get("ticket_info") if existing_info else None,
-                            "details": {
-                                "distance_meters": existing_info.get("distance_meters") if existing_info else None,
-                                "existing_image_id": existing_info.get("id") if existing_info else None,
-                                "ticket_id": existing_info.get("ticket_info", {}).get("ticket_id") if existing_info else None
-                            }
-                        })
-                        continue  # Skip saving this image
-                
                 # Save to filesystem
                 unique_id = uuid.uuid4().hex[:8]
                 safe_name = f"{unique_id}_{item['file_name']}"
@@ -499,12 +580,13 @@ async def upload_batch_complaints(
                     result_path = RESULTS_VID_DIR / safe_name
                 
                 # Save original
-                with open(original_path, "wb") as f:
+                with timed("disk_write"), open(original_path, "wb") as f:
                     f.write(item["file_bytes"])
                 
-                # Save annotated (result)
-                with open(result_path, "wb") as f:
-                    f.write(item["annotated_bytes"])
+                # Save annotated (result) - only videos are rendered at ingest
+                if media_type != "image":
+                    with timed("disk_write"), open(result_path, "wb") as f:
+                        f.write(item["annotated_bytes"])
 
                 # Save the image (not a duplicate or no GPS to check)
                 image_obj = save_image(
@@ -517,9 +599,14 @@ async def upload_batch_complaints(
                     file_name=safe_name,  # use the unique name
                     latitude=item["latitude"] if has_gps else None,
                     longitude=item["longitude"] if has_gps else None,
-                    confidence=item.get("detection_confidence")
+                    confidence=item.get("detection_confidence"),
+                    detections=item.get("detections"),
+                    image_hash=item.get("image_hash"),
+                    fingerprint=item.get("fingerprint")
                 )
                 saved_count += 1
+                if media_type == "image":
+                    embed_queue.append((image_obj.id, item["file_bytes"]))
                 saved_images.append({
                     "id": image_obj.id,
                     "file_name": safe_name,
@@ -550,12 +637,14 @@ async def upload_batch_complaints(
 
         results.append(ticket_result)
 
+    embeddings.index_in_background(embed_queue)
+
     # Calculate total rejected count for summary
     total_rejected = sum(
         sub_ticket.get("rejected_count", 0)
         for result in results
         for sub_ticket in result.get("sub_tickets", [])
-    )
+    ) + sum(1 for item in processed_items if item.get("rejection"))
     
     response = {
         "status": "success",
@@ -574,37 +663,86 @@ async def upload_batch_complaints(
 # ==================================================
 # GET ALL TICKETS
 # ==================================================
+# Image metadata only; image_data blobs are never needed for listings
+IMAGE_SUMMARY_COLUMNS = (
+    ComplaintImage.id,
+    ComplaintImage.sub_id,
+    ComplaintImage.file_name,
+    ComplaintImage.content_type,
+    ComplaintImage.media_type,
+    ComplaintImage.gps_extracted,
+    ComplaintImage.latitude,
+    ComplaintImage.longitude,
+    ComplaintImage.confidence,
+    ComplaintImage.created_at,
+)
+
+
+async def _images_by_sub(db: AsyncSession, sub_ids) -> dict:
+    """
+    Load image metadata for many sub-tickets in one query
+    
+    Args:
+        db: Async session
+        sub_ids: Select of SubTicket.sub_id (or a list of sub_ids)
+        
+    Returns:
+        Dict of sub_id -> image rows in id (upload) order
+    """
+    rows = (await db.execute(
+        select(*IMAGE_SUMMARY_COLUMNS)
+        .where(ComplaintImage.sub_id.in_(sub_ids))
+        .order_by(ComplaintImage.id)
+    )).all()
+    images = {}
+    for row in rows:
+        images.setdefault(row.sub_id, []).append(row)
+    return images
+
+
+def _gps_image(images):
+    """First image of a sub-ticket that has GPS coordinates"""
+    return next((img for img in images if img.latitude is not None and img.longitude is not None), None)
+
+
+def _earliest_image(images):
+    """Earliest uploaded image of a sub-ticket"""
+    dated = [img for img in images if img.created_at is not None]
+    return min(dated, key=lambda img: img.created_at) if dated else None
+
+
 @router.get("/tickets")
 async def get_tickets(
     status: Optional[str] = Query(None, description="Filter by status"),
     issue_type: Optional[str] = Query(None, description="Filter by issue type"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all tickets with optional filtering
     """
-    query = db.query(Ticket)
-    
+    ticket_query = select(Ticket).order_by(Ticket.id)
     if status:
-        query = query.filter(Ticket.status == status)
+        ticket_query = ticket_query.where(Ticket.status == status)
+    tickets = (await db.execute(ticket_query)).scalars().all()
+    
+    # Sub-tickets and image metadata for all listed tickets in two queries
+    sub_query = select(SubTicket).where(
+        SubTicket.ticket_id.in_(select(ticket_query.subquery().c.ticket_id))
+    ).order_by(SubTicket.id)
+    if issue_type:
+        sub_query = sub_query.where(SubTicket.issue_type == issue_type)
+    sub_tickets_by_ticket = {}
+    for sub_ticket in (await db.execute(sub_query)).scalars().all():
+        sub_tickets_by_ticket.setdefault(sub_ticket.ticket_id, []).append(sub_ticket)
     
-    tickets = query.all()
+    images_by_sub = await _images_by_sub(db, select(sub_query.subquery().c.sub_id))
     
     results = []
     for ticket in tickets:
-        # Get sub-tickets for this ticket
-        sub_tickets = db.query(SubTicket).filter(
-            SubTicket.ticket_id == ticket.ticket_id
-        ).all()
-        
-        # Filter by issue_type if provided
-        if issue_type:
-            sub_tickets = [st for st in sub_tickets if st.issue_type == issue_type]
-        
-        if issue_type and not sub_tickets:
-            continue  # Skip ticket if no matching sub-tickets
+        sub_tickets = sub_tickets_by_ticket.get(ticket.ticket_id, [])
+        if not sub_tickets:
+            continue  # Only list tickets that have (matching) sub-tickets
         
-        # Get images for each sub-ticket
         ticket_data = {
             "ticket_id": ticket.ticket_id,
             "latitude": ticket.latitude,
@@ -620,33 +758,20 @@ async def get_tickets(
         }
         
         for sub_ticket in sub_tickets:
-            # Get first media for preview (image or video)
-            first_media = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id
-            ).first()
+            images = images_by_sub.get(sub_ticket.sub_id, [])
+            # First media for preview (image or video)
+            first_media = images[0] if images else None
+            earliest_image = _earliest_image(images)
+            gps_image = _gps_image(images)
             
-            # Get earliest image timestamp for this sub_ticket
-            earliest_image = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id
-            ).order_by(ComplaintImage.created_at.asc()).first()
-            
-            # Get GPS coordinates from first image with GPS in this sub_ticket
-            gps_image = db.query(ComplaintImage).filter(
-                ComplaintImage.sub_id == sub_ticket.sub_id,
-                ComplaintImage.latitude.isnot(None),
-                ComplaintImage.longitude.isnot(None)
-            ).first()
-            
-            sub_ticket_data = {
+            ticket_data["sub_tickets"].append({
                 "sub_id": sub_ticket.sub_id,
                 "issue_type": sub_ticket.issue_type,
                 "authority": sub_ticket.authority,
                 "status": sub_ticket.status,
                 "latitude": gps_image.latitude if gps_image else None,
                 "longitude": gps_image.longitude if gps_image else None,
-                "image_count": db.query(ComplaintImage).filter(
-                    ComplaintImage.sub_id == sub_ticket.sub_id
-                ).count(),
+                "image_count": len(images),
                 "has_image": first_media is not None,
                 "image_id": first_media.id if first_media else None,
                 "media_type": first_media.media_type if first_media else None,
@@ -654,12 +779,9 @@ async def get_tickets(
                 "created_at": sub_ticket.created_at.isoformat() if sub_ticket.created_at else (earliest_image.created_at.isoformat() if earliest_image else None),
                 "updated_at": sub_ticket.updated_at.isoformat() if sub_ticket.updated_at else None,
                 "resolved_at": sub_ticket.resolved_at.isoformat() if sub_ticket.resolved_at else None
-            }
-            
-            ticket_data["sub_tickets"].append(sub_ticket_data)
+            })
         
-        if ticket_data["sub_tickets"]:  # Only add if has sub_tickets
-            results.append(ticket_data)
+        results.append(ticket_data)
     
     return {
         "status": "success",
@@ -668,6 +790,78 @@ async def get_tickets(
     }
 
 
+# ==================================================
+# MAP CLUSTERS (per tile, cached)
+# ==================================================
+@router.get("/map")
+async def get_map_clusters(
+    bbox: str = Query(..., description="Visible area as west,south,east,north (degrees)"),
+    zoom: int = Query(..., ge=0, le=map_tiles.MAX_CELL_ZOOM, description="Map zoom level"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Sub-tickets in the visible area aggregated into grid-cell clusters:
+    count, centroid, dominant issue type and status breakdown per cell.
+    Cells are 1/8 of a map tile at the given zoom, so the number of markers
+    stays constant no matter how many complaints there are.
+    """
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if west > east or south > north:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north with west <= east and south <= north")
+
+    tiles = map_tiles.tiles_in_bbox(west, south, east, north, zoom)
+    if len(tiles) > map_tiles.MAX_TILES:
+        raise HTTPException(status_code=400, detail=f"bbox covers {len(tiles)} tiles at zoom {zoom}; zoom in (max {map_tiles.MAX_TILES})")
+
+    cell_zoom = map_tiles.cell_zoom(zoom)
+    ticket_cell = func.substr(Ticket.map_cell, 1, cell_zoom)
+    sub_cell = func.substr(SubTicket.map_cell, 1, cell_zoom)
+    clusters = []
+    for quadkey in tiles:
+        tile_clusters = map_tiles.tile_cache.get(quadkey)
+        if tile_clusters is None:
+            generation = map_tiles.tile_cache.generation
+            low, high = map_tiles.quadkey_range(quadkey)
+            # Both queries read only their covering index (no join, no table rows)
+            cell_rows = (await db.execute(
+                select(
+                    ticket_cell,
+                    func.count(),
+                    func.sum(Ticket.latitude),
+                    func.sum(Ticket.longitude),
+                    func.min(Ticket.ticket_id),
+                )
+                .where(Ticket.map_cell >= low, Ticket.map_cell < high)
+                .group_by(ticket_cell)
+            )).all()
+            breakdown_rows = (await db.execute(
+                select(
+                    sub_cell,
+                    SubTicket.issue_type,
+                    SubTicket.status,
+                    func.count(),
+                    func.min(SubTicket.sub_id),
+                )
+                .where(SubTicket.map_cell >= low, SubTicket.map_cell < high)
+                .group_by(sub_cell, SubTicket.issue_type, SubTicket.status)
+            )).all()
+            tile_clusters = map_tiles.build_clusters(cell_rows, breakdown_rows, zoom)
+            map_tiles.tile_cache.put(quadkey, tile_clusters, generation)
+        clusters.extend(tile_clusters)
+
+    return {
+        "status": "success",
+        "zoom": zoom,
+        "cell_zoom": cell_zoom,
+        "tiles": len(tiles),
+        "count": sum(c["count"] for c in clusters),
+        "clusters": clusters
+    }
+
+
 @router.get("/geocode")
 async def geocode_location(
     lat: float = Query(...),
@@ -692,37 +886,28 @@ async def geocode_location(
 @router.get("/tickets/{ticket_id}")
 async def get_ticket_by_id(
     ticket_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get a specific ticket by ID
     """
-    ticket = db.query(Ticket).filter(Ticket.ticket_id == ticket_id).first()
+    ticket = (await db.execute(
+        select(Ticket).where(Ticket.ticket_id == ticket_id)
+    )).scalars().first()
     
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
     
-    sub_tickets = db.query(SubTicket).filter(
-        SubTicket.ticket_id == ticket_id
-    ).all()
+    sub_tickets = (await db.execute(
+        select(SubTicket).where(SubTicket.ticket_id == ticket_id).order_by(SubTicket.id)
+    )).scalars().all()
+    images_by_sub = await _images_by_sub(db, [st.sub_id for st in sub_tickets])
     
     sub_tickets_data = []
     for sub_ticket in sub_tickets:
-        images = db.query(ComplaintImage).filter(
-            ComplaintImage.sub_id == sub_ticket.sub_id
-        ).all()
-        
-        # Get GPS coordinates from first image with GPS in this sub_ticket
-        gps_image = db.query(ComplaintImage).filter(
-            ComplaintImage.sub_id == sub_ticket.sub_id,
-            ComplaintImage.latitude.isnot(None),
-            ComplaintImage.longitude.isnot(None)
-        ).first()
-        
-        # Get earliest image timestamp for this sub_ticket
-        earliest_image = db.query(ComplaintImage).filter(
-            ComplaintImage.sub_id == sub_ticket.sub_id
-        ).order_by(ComplaintImage.created_at.asc()).first()
+        images = images_by_sub.get(sub_ticket.sub_id, [])
+        gps_image = _gps_image(images)
+        earliest_image = _earliest_image(images)
         
         sub_tickets_data.append({
             "sub_id": sub_ticket.sub_id,
@@ -767,6 +952,186 @@ async def get_ticket_by_id(
     }
 
 
+# ==================================================
+# SEARCH DETECTIONS
+# ==================================================
+@router.get("/detections")
+async def search_detections(
+    class_name: Optional[str] = Query(None, description="Filter by detected class, e.g. pathholes"),
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0, description="Minimum detection confidence"),
+    model_version: Optional[str] = Query(None, description="Only detections produced by this model version"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Search stored per-box detections, e.g. all potholes above 0.6 confidence
+    """
+    query = (
+        db.query(Detection, ComplaintImage.sub_id)
+        .join(ComplaintImage, ComplaintImage.id == Detection.image_id)
+        .filter(Detection.confidence >= min_confidence)
+    )
+    
+    if class_name:
+        query = query.filter(Detection.class_name == class_name)
+    if model_version:
+        query = query.filter(Detection.model_version == model_version)
+    
+    rows = query.order_by(Detection.confidence.desc()).limit(limit).all()
+    
+    results = [
+        {
+            "id": det.id,
+            "image_id": det.image_id,
+            "sub_id": sub_id,
+            "class_name": det.class_name,
+            "confidence": det.confidence,
+            "bbox": {"x1": det.x1, "y1": det.y1, "x2": det.x2, "y2": det.y2},
+            "model_version": det.model_version,
+            "created_at": det.created_at.isoformat() if det.created_at else None
+        }
+        for det, sub_id in rows
+    ]
+    
+    return {
+        "status": "success",
+        "count": len(results),
+        "detections": results
+    }
+
+
+# ==================================================
+# SEMANTICALLY SIMILAR COMPLAINTS
+# ==================================================
+# Image hits requested per result: results are per complaint, and one
+# complaint can have several similar images
+SIMILAR_OVERFETCH = 4
+
+
+def _embedding_index() -> embeddings.EmbeddingIndex:
+    if not embeddings.EMBEDDINGS_ENABLED:
+        raise HTTPException(status_code=503, detail="Similarity search is disabled (set EMBEDDINGS_ENABLED=true)")
+    return embeddings.get_index()
+
+
+async def _embed(image_bytes: bytes):
+    vector = (await run_in_threadpool(embeddings.embed_images, [image_bytes]))[0]
+    if vector is None:
+        raise HTTPException(
+            status_code=422,
+            detail="Could not compute an embedding (undecodable image, or the model has no PyTorch weights)"
+        )
+    return vector
+
+
+async def _similar_response(db: AsyncSession, index, vector, k: int, exclude, query: dict) -> dict:
+    """
+    Top-k complaints (sub-tickets) by their most similar image: image hits
+    are over-fetched, joined to their complaints in one query and collapsed
+    to the best image per sub-ticket, searching wider until k complaints
+    are found or the index runs out.
+    """
+    search_ms = 0.0
+    by_id = {}  # image id -> joined row (None: deleted since it was indexed)
+    fetch = k * SIMILAR_OVERFETCH
+    while True:
+        start = time.perf_counter()
+        hits = index.search(vector, fetch, exclude=exclude)
+        search_ms += (time.perf_counter() - start) * 1000
+        
+        new_ids = [image_id for image_id, _ in hits if image_id not in by_id]
+        if new_ids:
+            by_id.update(dict.fromkeys(new_ids))
+            rows = (await db.execute(
+                select(
+                    ComplaintImage.id, ComplaintImage.file_name, ComplaintImage.latitude,
+                    ComplaintImage.longitude, ComplaintImage.created_at,
+                    SubTicket.sub_id, SubTicket.ticket_id, SubTicket.issue_type,
+                    SubTicket.authority, SubTicket.status,
+                )
+                .join(SubTicket, SubTicket.sub_id == ComplaintImage.sub_id)
+                .where(ComplaintImage.id.in_(new_ids))
+            )).all()
+            by_id.update({row.id: row for row in rows})
+        
+        # Hits are most similar first, so the first image of a sub-ticket is its best
+        best = {}
+        for image_id, score in hits:
+            row = by_id.get(image_id)
+            if row is not None and row.sub_id not in best:
+                best[row.sub_id] = (row, score)
+        if len(best) >= k or len(hits) < fetch:
+            break
+        fetch *= SIMILAR_OVERFETCH
+    
+    results = []
+    for row, score in list(best.values())[:k]:
+        results.append({
+            "image_id": row.id,
+            "similarity": round(score, 4),
+            "ticket_id": row.ticket_id,
+            "sub_id": row.sub_id,
+            "issue_type": row.issue_type,
+            "authority": row.authority,
+            "status": row.status,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+            "file_name": row.file_name,
+            "created_at": row.created_at.isoformat() if row.created_at else None
+        })
+    
+    return {
+        "status": "success",
+        "query": query,
+        "count": len(results),
+        "search_ms": round(search_ms, 2),
+        "results": results
+    }
+
+
+@router.get("/similar")
+async def get_similar_complaints(
+    image_id: int = Query(..., description="Stored complaint image to find similar complaints for"),
+    k: int = Query(10, ge=1, le=100, description="Number of results"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Complaints whose images look semantically like a stored image
+    (same kind of problem, not necessarily the same spot or photo).
+    Images not indexed yet are embedded on first request.
+    """
+    index = _embedding_index()
+    vector = index.vector(image_id)
+    if vector is None:
+        image_data = (await db.execute(
+            select(ComplaintImage.image_data)
+            .where(ComplaintImage.id == image_id, ComplaintImage.media_type == "image")
+        )).scalar()
+        if image_data is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        vector = await _embed(image_data)
+        index.add([image_id], [vector])
+    
+    return await _similar_response(db, index, vector, k, exclude=[image_id], query={"image_id": image_id})
+
+
+@router.post("/similar")
+async def search_similar_complaints(
+    file: UploadFile = File(...),
+    k: int = Query(10, ge=1, le=100, description="Number of results"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Complaints whose images look semantically like an uploaded image.
+    The upload is only used as the query; nothing is stored.
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Only image files are allowed")
+    index = _embedding_index()
+    vector = await _embed(await file.read())
+    return await _similar_response(db, index, vector, k, exclude=(), query={"file_name": file.filename})
+
+
 # ==================================================
 # UPDATE TICKET LOCATION
 # ==================================================
@@ -789,6 +1154,7 @@ async def update_ticket_location(
     
     ticket.latitude = latitude
     ticket.longitude = longitude
+    ticket.map_cell = map_cell(latitude, longitude)
     ticket.area = address_info.get("area")
     ticket.district = address_info.get("district")
     ticket.address = address_info.get("full_address")
@@ -799,11 +1165,18 @@ async def update_ticket_location(
     sub_ids = [st.sub_id for st in sub_tickets]
     
     if sub_ids:
+        # The bulk update skips mapper events: move the heatmap counts first
+        analytics.record_moved(db.connection(), sub_tickets, ticket.map_cell)
         db.execute(
             update(ComplaintImage)
             .where(ComplaintImage.sub_id.in_(sub_ids))
             .values(latitude=latitude, longitude=longitude)
         )
+        db.execute(
+            update(SubTicket)
+            .where(SubTicket.ticket_id == ticket_id)
+            .values(map_cell=ticket.map_cell)
+        )
     
     db.commit()
     return {"status": "success", "message": "Location updated successfully"}
@@ -815,27 +1188,73 @@ async def update_ticket_location(
 @router.get("/images/{image_id}")
 async def get_image(
     image_id: int,
-    db: Session = Depends(get_db)
+    annotated: bool = Query(True, description="Draw stored detection boxes over the image"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get image data by ID
+    Get image data by ID.
+    Images stored with detection boxes are annotated on demand; pass
+    annotated=false to get the original upload.
     """
     from fastapi.responses import Response
     
-    image = db.query(ComplaintImage).filter(ComplaintImage.id == image_id).first()
+    image = await db.get(ComplaintImage, image_id)
     
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
     
+    content = image.image_data
+    media_type = image.content_type
+    
+    if annotated and image.media_type == "image" and image.detections:
+        from yolo_service import render_annotated_bytes
+        try:
+            rendered = await run_in_threadpool(
+                render_annotated_bytes, image.image_data, json.loads(image.detections)
+            )
+            if rendered is not None:
+                content = rendered
+                media_type = "image/jpeg"
+        except Exception as e:
+            print(f"Failed to render annotations for image {image_id}: {e}")
+    
     return Response(
-        content=image.image_data,
-        media_type=image.content_type,
+        content=content,
+        media_type=media_type,
         headers={
             "Content-Disposition": f'inline; filename="{image.file_name or "image"}"'
         }
     )
 
 
+# ==================================================
+# GET IMAGE DETECTIONS BY ID
+# ==================================================
+@router.get("/images/{image_id}/detections")
+async def get_image_detections(
+    image_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get the stored detection boxes for an image so clients can draw overlays
+    """
+    row = (await db.execute(
+        select(ComplaintImage.id, ComplaintImage.detections).where(ComplaintImage.id == image_id)
+    )).first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    detections = json.loads(row.detections) if row.detections else []
+    
+    return {
+        "status": "success",
+        "image_id": row.id,
+        "count": len(detections),
+        "detections": detections
+    }
+
+
 # ==================================================
 # DELETE TICKET
 # ==================================================
@@ -861,12 +1280,19 @@ async def delete_ticket(
         images = db.query(ComplaintImage).filter(ComplaintImage.sub_id.in_(sub_ids)).all()
         # Optionally delete physical files here
         
+        image_ids = [img.id for img in images]
+        if image_ids:
+            db.query(Detection).filter(Detection.image_id.in_(image_ids)).delete(synchronize_session=False)
         db.query(ComplaintImage).filter(ComplaintImage.sub_id.in_(sub_ids)).delete(synchronize_session=False)
+        analytics.record_deleted(db.connection(), sub_tickets)
         db.query(SubTicket).filter(SubTicket.ticket_id == ticket_id).delete(synchronize_session=False)
     
     db.delete(ticket)
     db.commit()
     
+    if sub_ids and image_ids and embeddings.EMBEDDINGS_ENABLED:
+        embeddings.get_index().remove(image_ids)
+    
     return {"status": "success", "message": f"Ticket {ticket_id} and all related data deleted successfully"}
 
 
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import os
 import uuid
 from pathlib import Path
-from database import get_db
+from database import get_db, get_async_db
 from app_models import Ticket, SubTicket, ComplaintImage
 from crud import save_image
 
@@ -23,7 +25,7 @@ RESOLUTION_IMG_DIR.mkdir(parents=True, exist_ok=True)
 async def get_inspector_tickets(
     authority: Optional[str] = Query(None, description="Filter by authority (e.g., Sanitation Department)"),
     status: Optional[str] = Query(None, description="Filter by status (open, resolved, etc.)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get tickets relevant to an inspector.
@@ -31,26 +33,35 @@ async def get_inspector_tickets(
     - Can filter by 'status'.
     - Returns a flattened view of SubTickets since inspectors work on specific issues.
     """
-    query = db.query(SubTicket)
+    filters = []
 
     if authority:
-        query = query.filter(SubTicket.authority == authority)
+        filters.append(SubTicket.authority == authority)
     
     if status:
-        query = query.filter(SubTicket.status == status)
+        filters.append(SubTicket.status == status)
+
+    # Sub-tickets with their parent ticket (for location info) in one query, newest first
+    rows = (await db.execute(
+        select(SubTicket, Ticket)
+        .outerjoin(Ticket, Ticket.ticket_id == SubTicket.ticket_id)
+        .where(*filters)
+        .order_by(SubTicket.created_at.desc())
+    )).all()
 
-    # Order by newest first
-    sub_tickets = query.order_by(SubTicket.created_at.desc()).all()
+    # First image (complaint proof) per sub-ticket, without loading image data
+    first_images = {}
+    image_rows = (await db.execute(
+        select(ComplaintImage.id, ComplaintImage.sub_id)
+        .where(ComplaintImage.sub_id.in_(select(SubTicket.sub_id).where(*filters)))
+        .order_by(ComplaintImage.created_at.asc(), ComplaintImage.id.asc())
+    )).all()
+    for image_id, sub_id in image_rows:
+        first_images.setdefault(sub_id, image_id)
 
     results = []
-    for sub in sub_tickets:
-        # Get parent ticket for location info
-        parent_ticket = db.query(Ticket).filter(Ticket.ticket_id == sub.ticket_id).first()
-        
-        # Get first image (complaint proof)
-        complaint_image = db.query(ComplaintImage).filter(
-            ComplaintImage.sub_id == sub.sub_id
-        ).order_by(ComplaintImage.created_at.asc()).first()
+    for sub, parent_ticket in rows:
+        complaint_image_id = first_images.get(sub.sub_id)
 
         results.append({
             "sub_id": sub.sub_id,
@@ -68,8 +79,8 @@ async def get_inspector_tickets(
                 "address": parent_ticket.address if parent_ticket else None,
             },
             "complaint_image": {
-                "url": f"/api/complaints/images/{complaint_image.id}" if complaint_image else None,
-                "id": complaint_image.id if complaint_image else None
+                "url": f"/api/complaints/images/{complaint_image_id}" if complaint_image_id else None,
+                "id": complaint_image_id
             }
         })
 
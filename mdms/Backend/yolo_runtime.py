@@ -0,0 +1,110 @@
+"""
+YOLOv5 Inference Runtime
+Single entry point for the parts of the vendored YOLOv5 needed at inference time.
+
+Importing the vendored tree used to purge any cached `models`/`utils` modules
+and pull in training-only code (plotting, dataloaders, git checks). This module
+only puts the YOLOv5 root on sys.path (required so pickled weights can resolve
+`models.yolo`), refuses to run if another `models`/`utils` is already imported
+instead of deleting it, and imports nothing beyond what inference uses.
+Run check_import_time.py to measure the cold-start cost.
+"""
+import sys
+import threading
+import importlib.util
+from pathlib import Path
+from typing import Optional
+
+YOLO_ROOT = (Path(__file__).parent.parent.parent / "yolov_5" / "yolov5").resolve()
+
+_runtime: Optional[dict] = None
+_runtime_lock = threading.Lock()
+
+
+def _check_namespace():
+    """Make sure top-level `models`/`utils` will resolve to the YOLOv5 packages"""
+    for name in ("models", "utils"):
+        mod = sys.modules.get(name)
+        mod_file = getattr(mod, "__file__", None) if mod else None
+        if mod and (not mod_file or YOLO_ROOT not in Path(mod_file).resolve().parents):
+            raise ImportError(
+                f"Module '{name}' is already imported from {mod_file or 'a namespace package'}, "
+                f"which shadows YOLOv5's '{name}' package at {YOLO_ROOT / name}"
+            )
+
+
+def _import_runtime() -> dict:
+    try:
+        import torch
+        import cv2
+        import numpy as np
+
+        # YOLOv5's utils.general pip-installs ultralytics if it is missing; fail instead
+        if importlib.util.find_spec("ultralytics") is None:
+            raise ImportError("No module named 'ultralytics'")
+
+        yolo_path = str(YOLO_ROOT)
+        if yolo_path not in sys.path:
+            sys.path.insert(0, yolo_path)
+        _check_namespace()
+
+        from models.common import DetectMultiBackend
+        from utils.general import (
+            check_img_size,
+            non_max_suppression,
+            scale_boxes,
+            LOGGER,
+        )
+        from utils.augmentations import letterbox
+        # Same class utils.plots re-exports, without matplotlib/seaborn/scipy
+        from ultralytics.utils.plotting import Annotator
+    except ImportError as e:
+        raise ImportError(
+            f"Failed to import YOLOv5 dependencies. "
+            f"Please install: pip install torch torchvision opencv-python numpy ultralytics. "
+            f"Error: {e}"
+        )
+
+    return {
+        'torch': torch,
+        'cv2': cv2,
+        'np': np,
+        'DetectMultiBackend': DetectMultiBackend,
+        'check_img_size': check_img_size,
+        'non_max_suppression': non_max_suppression,
+        'scale_boxes': scale_boxes,
+        'LOGGER': LOGGER,
+        'letterbox': letterbox,
+        'select_device': select_device,
+        'Annotator': Annotator,
+    }
+
+
+def load_runtime() -> dict:
+    """Import the inference runtime once (thread-safe) and return its symbols"""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = _import_runtime()
+    return _runtime
+
+
+def select_device(device: str = ""):
+    """
+    Pick the inference device.
+
+    Lightweight stand-in for utils.torch_utils.select_device, which shells out
+    to `git describe` and rewrites CUDA_VISIBLE_DEVICES.
+
+    Args:
+        device: '' (auto), 'cpu', 'mps', or a CUDA index like '0' / 'cuda:0'
+    """
+    import torch
+
+    device = str(device).strip().lower().replace("cuda:", "")
+    if device == "mps":
+        return torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    if device != "cpu" and torch.cuda.is_available():
+        return torch.device(f"cuda:{device.split(',')[0] or 0}")
+    return torch.device("cpu")
@@ -2,113 +2,165 @@
 YOLOv5 Detection Service
 Handles model loading and inference for object detection
 """
-import sys
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
 from pathlib import Path
 from typing import List, Tuple, Optional
 
-# Add YOLOv5 to path
-YOLO_ROOT = Path(__file__).parent.parent.parent / "yolov_5" / "yolov5"
-YOLO_ROOT = YOLO_ROOT.resolve()
-
-# Lazy imports - only import when actually needed
-def _import_dependencies():
-    """Import all required dependencies"""
-    try:
-        import torch
-        import cv2
-        import numpy as np
-        
-        # Use importlib to import from YOLOv5 directory, avoiding conflicts with local models.py
-        import importlib
-        import importlib.util
-        
-        # Add YOLOv5 root to path if not already there (must be first to take precedence)
-        yolo_path = str(YOLO_ROOT)
-        if yolo_path not in sys.path:
-            sys.path.insert(0, yolo_path)
-        
-        # Temporarily remove Backend directory from path to avoid local models.py conflict
-        backend_path = str(Path(__file__).parent)
-        backend_in_path = backend_path in sys.path
-        if backend_in_path:
-            sys.path.remove(backend_path)
-        
-        # Aggressively clear cached modules that conflict with YOLOv5
-        # This prevents importing from Backend/utils or Backend/models
-        modules_to_remove = []
-        for mod_name in list(sys.modules.keys()):
-            # Remove any modules from Backend that conflict
-            if mod_name in ['models', 'utils'] or mod_name.startswith(('models.', 'utils.')):
-                mod = sys.modules.get(mod_name)
-                if mod:
-                    # Check if it's from Backend directory
-                    if hasattr(mod, '__file__') and mod.__file__:
-                        if backend_path in str(mod.__file__):
-                            modules_to_remove.append(mod_name)
-                    # Also check if it's a namespace package pointing to wrong location
-                    elif backend_in_path and mod_name in ['models', 'utils']:
-                        # Check if any submodule is from backend
-                        has_backend_submod = any(
-                            backend_path in str(getattr(sys.modules.get(k), '__file__', ''))
-                            for k in sys.modules.keys()
-                            if k.startswith(f'{mod_name}.')
-                        )
-                        if has_backend_submod:
-                            modules_to_remove.append(mod_name)
-        
-        # Remove in reverse order (submodules first)
-        for mod_name in sorted(modules_to_remove, reverse=True):
-            if mod_name in sys.modules:
-                del sys.modules[mod_name]
-        
-        try:
-            # Clear utils module if it exists and is from wrong location
-            # This ensures we import from YOLOv5/utils, not Backend/utils
-            if 'utils' in sys.modules:
-                utils_mod = sys.modules['utils']
-                if hasattr(utils_mod, '__file__') and utils_mod.__file__:
-                    if backend_path in str(utils_mod.__file__):
-                        # Remove utils and all its submodules
-                        utils_keys = [k for k in list(sys.modules.keys()) if k == 'utils' or k.startswith('utils.')]
-                        for k in utils_keys:
-                            if k in sys.modules:
-                                del sys.modules[k]
-            
-            # Now do regular imports - they should find YOLOv5's modules
-            # YOLOv5 path is first, Backend is removed, so imports will work correctly
-            from models.common import DetectMultiBackend
-            from utils.general import (
-                check_img_size,
-                non_max_suppression,
-                scale_boxes,
-                LOGGER,
-            )
-            from utils.augmentations import letterbox
-            from utils.torch_utils import select_device
-            from utils.dataloaders import LoadImages
-        finally:
-            # Restore Backend path if it was there
-            if backend_in_path:
-                sys.path.insert(0, backend_path)
-        return {
-            'torch': torch,
-            'cv2': cv2,
-            'np': np,
-            'DetectMultiBackend': DetectMultiBackend,
-            'check_img_size': check_img_size,
-            'non_max_suppression': non_max_suppression,
-            'scale_boxes': scale_boxes,
-            'LOGGER': LOGGER,
-            'letterbox': letterbox,
-            'select_device': select_device,
-            'LoadImages': LoadImages,
-        }
-    except ImportError as e:
-        raise ImportError(
-            f"Failed to import YOLOv5 dependencies. "
-            f"Please install: pip install torch torchvision opencv-python numpy ultralytics. "
-            f"Error: {e}"
+from yolo_runtime import YOLO_ROOT, load_runtime
+from app_utils.metrics import timed, record_cache
+
+logger = logging.getLogger(__name__)
+
+
+# COCO classes the fallback model reports that map onto municipal categories
+FALLBACK_GARBAGE_CLASSES = {'handbag', 'backpack', 'suitcase', 'bottle', 'cup'}
+FALLBACK_VEHICLE_CLASSES = {'car', 'truck', 'bus'}
+
+# Colour used for boxes and labels on annotated images (BGR)
+BOX_COLOR = (0, 255, 0)
+
+# Decode large JPEG uploads at 1/2 or 1/4 scale when no annotated image is needed
+REDUCED_DECODE = os.getenv("YOLO_REDUCED_DECODE", "false").lower() == "true"
+
+# Prefer the post-training quantized ONNX model for CPU inference
+USE_INT8 = os.getenv("YOLO_INT8", "false").lower() == "true"
+
+# Activated model versions kept for /api/admin (older entries are dropped)
+MODEL_HISTORY_SIZE = 50
+# Letterboxed input tensors kept per thread (~4.9 MB each at 640x640 float32), most recent shapes
+INPUT_BUFFER_SHAPES = 2
+
+
+def _weights_version(weights_path: Path) -> str:
+    """Version tag for a weights file: file stem plus modification time"""
+    mtime = datetime.fromtimestamp(weights_path.stat().st_mtime)
+    return f"{weights_path.stem}-{mtime:%Y%m%dT%H%M%S}"
+
+
+def _map_fallback_class(class_name: str, confidence: float) -> str:
+    """
+    🧠 SMART MAPPING: Map COCO objects to municipal categories
+    Garbage often looks like 'handbag', 'backpack', or 'bottle' to a standard model
+    """
+    if class_name in FALLBACK_GARBAGE_CLASSES:
+        return "garbage"
+    if class_name in FALLBACK_VEHICLE_CLASSES and confidence < 0.4:
+        # Low confidence vehicles on road could be debris
+        return "street_debris"
+    return class_name
+
+
+def annotate_image(im0: any, detections: List[dict], inplace: bool = False) -> any:
+    """
+    Draw detection boxes and labels on an image in a single Annotator pass
+    
+    Does not need a loaded model, so stored detections can be rendered at
+    view time without paying for inference.
+    
+    Args:
+        im0: Image as numpy array (BGR)
+        detections: Detection dicts as returned by YOLOv5Service.detect_image
+        inplace: Draw directly on im0 instead of a copy
+        
+    Returns:
+        Annotated image array
+    """
+    im = im0 if inplace else im0.copy()
+    if not detections:
+        return im
+    
+    annotator = load_runtime()['Annotator'](im, line_width=2)
+    for d in detections:
+        bbox = d["bbox"]
+        annotator.box_label(
+            (bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"]),
+            f"{d['class_name']} {d['confidence']:.2f}",
+            color=BOX_COLOR,
         )
+    return annotator.result()
+
+
+def render_annotated_bytes(image_bytes: bytes, detections: List[dict]) -> Optional[bytes]:
+    """
+    Render stored detections over encoded image bytes
+    
+    Args:
+        image_bytes: Original encoded image
+        detections: Detection dicts with class_name, confidence and bbox
+        
+    Returns:
+        JPEG bytes of the annotated image, or None if the image cannot be decoded
+    """
+    deps = load_runtime()
+    cv2, np = deps['cv2'], deps['np']
+    im0 = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if im0 is None:
+        return None
+    annotated = annotate_image(im0, detections, inplace=True)
+    with timed("encode"):
+        ok, encoded = cv2.imencode('.jpg', annotated)
+    return encoded.tobytes() if ok else None
+
+
+def decode_image(image_bytes: bytes, img_size: Optional[int] = None) -> Tuple[any, Tuple[float, float]]:
+    """
+    Decode image bytes to a BGR array, optionally at reduced resolution
+    
+    When img_size is given and the source is a JPEG at least 2x/4x larger than
+    img_size, libjpeg decodes straight to 1/2 or 1/4 scale
+    (IMREAD_REDUCED_COLOR_2/4), skipping most of the decode and the later
+    downscale. The caller maps boxes back with the returned scale.
+    
+    Args:
+        image_bytes: Encoded image
+        img_size: Model input size, or None to always decode at full size
+        
+    Returns:
+        Tuple of (image array or None, (x_scale, y_scale) from decoded to original pixels)
+    """
+    deps = load_runtime()
+    cv2, np = deps['cv2'], deps['np']
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    
+    if img_size and image_bytes[:2] == b"\xff\xd8":
+        try:
+            from PIL import Image
+            from io import BytesIO
+            w0, h0 = Image.open(BytesIO(image_bytes)).size  # header only
+        except Exception:
+            w0 = h0 = 0
+        long_side = max(w0, h0)
+        flag = None
+        if long_side >= 4 * img_size:
+            flag = cv2.IMREAD_REDUCED_COLOR_4
+        elif long_side >= 2 * img_size:
+            flag = cv2.IMREAD_REDUCED_COLOR_2
+        if flag is not None:
+            im = cv2.imdecode(nparr, flag)
+            if im is not None:
+                h, w = im.shape[:2]
+                if (h > w) != (h0 > w0):  # EXIF rotation applied by imdecode
+                    w0, h0 = h0, w0
+                return im, (w0 / w, h0 / h)
+    
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR), (1.0, 1.0)
+
+
+def _rescale_detections(detections: List[dict], scale: Tuple[float, float]) -> List[dict]:
+    """Map boxes found on a reduced decode back to original image pixels"""
+    sx, sy = scale
+    if sx == 1.0 and sy == 1.0:
+        return detections
+    for d in detections:
+        b = d["bbox"]
+        b["x1"], b["x2"] = round(b["x1"] * sx), round(b["x2"] * sx)
+        b["y1"], b["y2"] = round(b["y1"] * sy), round(b["y2"] * sy)
+    return detections
 
 
 class YOLOv5Service:
@@ -121,6 +173,7 @@ class YOLOv5Service:
         img_size: int = 640,
         conf_threshold: float = 0.25,
         iou_threshold: float = 0.45,
+        reduced_decode: bool = REDUCED_DECODE,
     ):
         """
         Initialize YOLOv5 service
@@ -131,9 +184,15 @@ class YOLOv5Service:
             img_size: Input image size for inference
             conf_threshold: Confidence threshold for detections
             iou_threshold: IoU threshold for NMS
+            reduced_decode: Decode large JPEGs at 1/2 or 1/4 scale in detect_from_bytes
         """
+        # Per-stage construction timings in seconds (reported by /health/ready)
+        self.timings = {}
+        start = time.time()
+        
         # Import dependencies
-        deps = _import_dependencies()
+        deps = load_runtime()
+        self.timings["import_seconds"] = round(time.time() - start, 3)
         self.torch = deps['torch']
         self.cv2 = deps['cv2']
         self.np = deps['np']
@@ -144,16 +203,22 @@ class YOLOv5Service:
         self.LOGGER = deps['LOGGER']
         self.letterbox = deps['letterbox']
         self.select_device = deps['select_device']
-        self.LoadImages = deps['LoadImages']
         
         self.device = self.select_device(device)
         self.img_size = img_size
         self.conf_threshold = conf_threshold
         self.iou_threshold = iou_threshold
+        self.reduced_decode = reduced_decode
         
-        # Default weights paths
+        # Preallocated letterboxed input tensors per thread: LRU of the last INPUT_BUFFER_SHAPES input shapes
+        self._buffers = threading.local()
+        
+        # Default weights paths (best-int8.onnx from `export.py --include onnx --onnx-int8` when USE_INT8)
         custom_weights = YOLO_ROOT / "weights" / "best.pt"
-        if not custom_weights.exists():
+        int8_weights = YOLO_ROOT / "weights" / "best-int8.onnx"
+        if USE_INT8 and int8_weights.exists():
+            custom_weights = int8_weights
+        elif not custom_weights.exists():
             custom_weights = YOLO_ROOT / "weights" / "best.onnx"
         
         default_weights = YOLO_ROOT / "yolov5s.pt"
@@ -169,7 +234,11 @@ class YOLOv5Service:
         if not self.weights_path.exists():
             raise FileNotFoundError(f"Model weights not found at {self.weights_path}")
         
+        # Stored with every detection so results can be traced to their weights
+        self.model_version = _weights_version(self.weights_path)
+        
         # Load main model
+        start = time.time()
         self.model = self.DetectMultiBackend(
             str(self.weights_path),
             device=self.device,
@@ -191,11 +260,14 @@ class YOLOv5Service:
                 )
                 self.LOGGER.info("✅ Fallback COCO model (yolov5s.pt) loaded successfully.")
                 self.fallback_names = self.fallback_model.names
+                self.fallback_version = _weights_version(default_weights)
             except Exception as e:
                 self.LOGGER.warning(f"⚠️ Could not load fallback model: {e}")
                 self.fallback_names = None
+                self.fallback_version = None
         else:
             self.fallback_names = None
+            self.fallback_version = None
         
         # Get model info
         self.stride = self.model.stride
@@ -205,14 +277,126 @@ class YOLOv5Service:
         # Check image size
         self.img_size = self.check_img_size(self.img_size, s=self.stride)
         
-        # Warmup model
+        self.timings["load_seconds"] = round(time.time() - start, 3)
+        
+        # Warmup models
+        start = time.time()
         imgsz = (1, 3, self.img_size, self.img_size) if isinstance(self.img_size, int) else (1, 3, *self.img_size)
         self.model.warmup(imgsz=imgsz)
+        if self.fallback_model:
+            self.fallback_model.warmup(imgsz=imgsz)
+        self.timings["warmup_seconds"] = round(time.time() - start, 3)
         
         self.LOGGER.info(f"YOLOv5 model loaded from {weights_path}")
         self.LOGGER.info(f"Using device: {self.device}")
         self.LOGGER.info(f"Model classes: {self.names}")
     
+    def _extract_detections(self, det, using_fallback: bool = False) -> List[dict]:
+        """
+        Convert one rescaled NMS output tensor into detection dicts.
+        
+        The tensor is copied to host memory once and the dicts are built from
+        array slices, instead of calling .item() (a device sync) per value.
+        
+        Args:
+            det: (n, 6) tensor of [x1, y1, x2, y2, conf, cls] rows
+            using_fallback: Whether det came from the fallback COCO model
+            
+        Returns:
+            List of detection dicts, in the same order as reversed(det)
+        """
+        if det is None or not len(det):
+            return []
+        
+        det_np = det[:, :6].detach().cpu().numpy()[::-1]
+        boxes = det_np[:, :4].tolist()
+        confidences = det_np[:, 4].tolist()
+        class_ids = det_np[:, 5].astype(int).tolist()
+        
+        # Use correct names list
+        current_names = self.fallback_names if using_fallback else self.names
+        model_version = self.fallback_version if using_fallback else self.model_version
+        
+        detections = []
+        for (x1, y1, x2, y2), confidence, class_id in zip(boxes, confidences, class_ids):
+            class_name = current_names[class_id]
+            if using_fallback:
+                class_name = _map_fallback_class(class_name, confidence)
+            detections.append({
+                "class_name": class_name,
+                "confidence": confidence,
+                "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+                "model_version": model_version
+            })
+        return detections
+    
+    def annotate(
+        self,
+        im0: any,
+        detections: List[dict],
+        inplace: bool = False,
+    ) -> any:
+        """Draw detections on an image (see annotate_image)"""
+        return annotate_image(im0, detections, inplace=inplace)
+    
+    def _letterbox_geometry(self, h0: int, w0: int) -> Tuple[Tuple[int, int], Tuple[int, int, int, int]]:
+        """
+        Same geometry as utils.augmentations.letterbox
+        
+        Returns:
+            ((input_h, input_w), (top, left, resized_h, resized_w))
+        """
+        r = min(self.img_size / h0, self.img_size / w0)
+        nw, nh = round(w0 * r), round(h0 * r)
+        dw, dh = self.img_size - nw, self.img_size - nh
+        if self.pt:  # auto: minimum rectangle
+            dw, dh = dw % self.stride, dh % self.stride
+        dw /= 2
+        dh /= 2
+        top, bottom = round(dh - 0.1), round(dh + 0.1)
+        left, right = round(dw - 0.1), round(dw + 0.1)
+        return (nh + top + bottom, nw + left + right), (top, left, nh, nw)
+    
+    def _preprocess(self, im0: any) -> any:
+        """
+        Letterbox a BGR image into a reusable (1, 3, H, W) input tensor
+        
+        Replaces letterbox -> transpose -> ascontiguousarray -> float -> /255
+        (four full-size copies) with one resize and a single fused pass that
+        does BGR->RGB, HWC->CHW and scaling into a buffer preallocated for
+        this input shape. Images of different sizes can share a buffer shape
+        with a different placement, so the pad strips around the image are
+        refilled with letterbox grey on every call.
+        """
+        (H, W), (top, left, nh, nw) = self._letterbox_geometry(*im0.shape[:2])
+        
+        buffers = getattr(self._buffers, "by_shape", None)
+        if buffers is None:
+            buffers = self._buffers.by_shape = OrderedDict()
+        buf = buffers.get((H, W))
+        record_cache("input_buffer", buf is not None)
+        if buf is None:
+            dtype = self.torch.half if self.model.fp16 else self.torch.float32
+            buf = buffers[(H, W)] = self.torch.full((1, 3, H, W), 114 / 255.0, dtype=dtype)
+            while len(buffers) > INPUT_BUFFER_SHAPES:
+                buffers.popitem(last=False)  # least recently used shape
+        else:
+            buffers.move_to_end((H, W))
+        
+        if im0.shape[:2] != (nh, nw):
+            im0 = self.cv2.resize(im0, (nw, nh), interpolation=self.cv2.INTER_LINEAR)
+        src = self.torch.from_numpy(self.np.ascontiguousarray(im0))  # no copy for decoded images
+        pad = 114 / 255.0
+        buf[0, :, :top].fill_(pad)
+        buf[0, :, top + nh:].fill_(pad)
+        buf[0, :, top:top + nh, :left].fill_(pad)
+        buf[0, :, top:top + nh, left + nw:].fill_(pad)
+        region = buf[0, :, top:top + nh, left:left + nw]
+        for c in range(3):
+            self.torch.mul(src[:, :, 2 - c], 1 / 255.0, out=region[c])
+        
+        return buf if self.device.type == "cpu" else buf.to(self.device, non_blocking=True)
+    
     def detect(
         self,
         image_path: str | Path,
@@ -234,82 +418,12 @@ class YOLOv5Service:
         if not image_path.exists():
             raise FileNotFoundError(f"Image not found: {image_path}")
         
-        # Load image
-        dataset = self.LoadImages(
-            str(image_path),
-            img_size=self.img_size,
-            stride=self.stride,
-            auto=self.pt
-        )
-        
-        detections = []
-        annotated_img = None
-        
-        for path, im, im0s, vid_cap, s in dataset:
-            # Preprocess
-            im = self.torch.from_numpy(im).to(self.device)
-            im = im.half() if self.model.fp16 else im.float()
-            im /= 255.0
-            if len(im.shape) == 3:
-                im = im[None]  # Add batch dimension
-            
-            # Inference
-            pred = self.model(im, augment=False, visualize=False)
-            
-            # NMS
-            pred = self.non_max_suppression(
-                pred,
-                self.conf_threshold,
-                self.iou_threshold,
-                classes=None,
-                agnostic=False,
-                max_det=1000
-            )
-            
-            # Process predictions
-            im0 = im0s.copy()
-            gn = self.torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
-            
-            for i, det in enumerate(pred):
-                if len(det):
-                    # Rescale boxes from img_size to im0 size
-                    det[:, :4] = self.scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-                    
-                    # Extract detections
-                    for *xyxy, conf, cls in reversed(det):
-                        x1, y1, x2, y2 = [float(x.item()) for x in xyxy]
-                        confidence = float(conf.item())
-                        class_id = int(cls.item())
-                        class_name = self.names[class_id]
-                        
-                        detections.append({
-                            "class_name": class_name,
-                            "confidence": confidence,
-                            "bbox": {
-                                "x1": x1,
-                                "y1": y1,
-                                "x2": x2,
-                                "y2": y2,
-                            }
-                        })
-                        
-                        # Draw bounding box on image
-                        if save_annotated:
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(im0, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            self.cv2.putText(
-                                im0,
-                                label,
-                                (int(x1), int(y1) - 10),
-                                self.cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 255, 0),
-                                2
-                            )
-            
-            annotated_img = im0
+        # Load image (BGR) and run the same pipeline as in-memory images
+        im0 = self.cv2.imread(str(image_path))
+        if im0 is None:
+            raise ValueError(f"Failed to read image: {image_path}")
         
-        return detections, annotated_img
+        return self.detect_image(im0, save_annotated)
     
     def detect_image(
         self,
@@ -324,35 +438,29 @@ class YOLOv5Service:
             save_annotated: Whether to return annotated image
             
         Returns:
-            Tuple of (detections list, annotated image array)
+            Tuple of (detections list, annotated image array or None when
+            save_annotated is False)
         """
         if im0 is None:
             raise ValueError("Input image is None")
         
-        # Use YOLOv5 preprocessing
-        im = self.letterbox(im0, self.img_size, stride=self.stride, auto=self.pt)[0]
-        im = im.transpose((2, 0, 1))[::-1]
-        im = self.np.ascontiguousarray(im)
-        
-        # Convert to tensor
-        im_tensor = self.torch.from_numpy(im).to(self.device).float()
-        im_tensor /= 255.0
-        if im_tensor.ndim == 3:
-            im_tensor = im_tensor[None]
+        # Letterbox + normalize into a reused input buffer
+        im_tensor = self._preprocess(im0)
         
         # Inference
         self.LOGGER.info(f"Running inference on image with shape {im_tensor.shape}")
-        pred = self.model(im_tensor, augment=False, visualize=False)
+        with timed("inference", self.device):
+            pred = self.model(im_tensor, augment=False, visualize=False)
         self.LOGGER.info(f"Raw predictions count: {len(pred[0]) if len(pred) else 0}")
         
         # NMS
-        pred = self.non_max_suppression(
-            pred, self.conf_threshold, self.iou_threshold,
-            classes=None, agnostic=False, max_det=1000
-        )
+        with timed("nms"):
+            pred = self.non_max_suppression(
+                pred, self.conf_threshold, self.iou_threshold,
+                classes=None, agnostic=False, max_det=1000
+            )
         
         detections = []
-        annotated_img = im0.copy()
         
         # Track which model was used
         using_fallback = False
@@ -361,58 +469,81 @@ class YOLOv5Service:
         if (not pred or not any(len(d) for d in pred)) and self.fallback_model:
             self.LOGGER.info("No custom detections found. Trying fallback model...")
             using_fallback = True
-            pred = self.fallback_model(im_tensor, augment=False, visualize=False)
-            pred = self.non_max_suppression(
-                pred, self.conf_threshold, self.iou_threshold,
-                classes=None, agnostic=False, max_det=1000
-            )
+            with timed("inference", self.device):
+                pred = self.fallback_model(im_tensor, augment=False, visualize=False)
+            with timed("nms"):
+                pred = self.non_max_suppression(
+                    pred, self.conf_threshold, self.iou_threshold,
+                    classes=None, agnostic=False, max_det=1000
+                )
 
-        if len(pred):
-            for i, det in enumerate(pred):
-                if det is not None and len(det) > 0:
-                    det[:, :4] = self.scale_boxes(im_tensor.shape[2:], det[:, :4], im0.shape).round()
-                    for *xyxy, conf, cls in reversed(det):
-                        x1, y1, x2, y2 = [float(x.item()) for x in xyxy]
-                        confidence = float(conf.item())
-                        
-                        # Use correct names list
-                        current_names = self.fallback_names if using_fallback else self.names
-                        class_name = current_names[int(cls)]
-                        
-                        self.LOGGER.info(f"NMS Result: {class_name} ({confidence:.2f})")
-
-                        # 🧠 SMART MAPPING: Map COCO objects to municipal categories
-                        # Garbage often looks like 'handbag', 'backpack', or 'bottle' to a standard model
-                        if using_fallback:
-                            if class_name in ['handbag', 'backpack', 'suitcase', 'bottle', 'cup']:
-                                class_name = "garbage"
-                            elif class_name in ['car', 'truck', 'bus'] and confidence < 0.4:
-                                # Low confidence vehicles on road could be debris
-                                class_name = "street_debris"
-
-                        detections.append({
-                            "class_name": class_name,
-                            "confidence": confidence,
-                            "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                        })
-                        
-                        if save_annotated:
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                            self.cv2.putText(annotated_img, label, (int(x1), int(y1) - 10),
-                                            self.cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        for i, det in enumerate(pred):
+            if det is not None and len(det) > 0:
+                det[:, :4] = self.scale_boxes(im_tensor.shape[2:], det[:, :4], im0.shape).round()
+                detections.extend(self._extract_detections(det, using_fallback))
+        
+        if detections:
+            self.LOGGER.info(
+                "NMS Result: " + ", ".join(f"{d['class_name']} ({d['confidence']:.2f})" for d in detections)
+            )
+        
+        annotated_img = self.annotate(im0, detections) if save_annotated else None
         
         return detections, annotated_img
 
+    def embed_image(self, im0: any) -> Optional[any]:
+        """
+        Backbone features of an image for similarity search
+
+        Runs the network up to (not including) the Detect head and global
+        average pools each feature map Detect would receive (P3/P4/P5), so no
+        boxes are decoded and no NMS runs. Only PyTorch weights expose the
+        layers; other backends (ONNX, TensorRT) return None.
+
+        Args:
+            im0: Input image as numpy array (BGR)
+
+        Returns:
+            List of 1-D float32 numpy arrays, one per feature scale, or None
+        """
+        if im0 is None:
+            raise ValueError("Input image is None")
+        net = getattr(self.model, "model", None)
+        layers = getattr(net, "model", None)
+        if not self.pt or layers is None:
+            return None
+
+        im_tensor = self._preprocess(im0)
+        head = layers[-1]
+        keep = set(net.save) | set(head.f)
+        y = []
+        x = im_tensor
+        with timed("embed", self.device), self.torch.inference_mode():
+            for m in layers[:-1]:
+                if m.f != -1:
+                    x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+                x = m(x)
+                y.append(x if m.i in keep else None)
+            pooled = [y[j].float().mean(dim=(2, 3))[0].cpu().numpy() for j in head.f]
+        return pooled
+
     def detect_from_bytes(
         self,
         image_bytes: bytes,
         save_annotated: bool = True,
     ) -> Tuple[List[dict], any]:
-        """Run detection on image bytes"""
-        nparr = self.np.frombuffer(image_bytes, self.np.uint8)
-        im0 = self.cv2.imdecode(nparr, self.cv2.IMREAD_COLOR)
-        return self.detect_image(im0, save_annotated)
+        """
+        Run detection on image bytes
+        
+        Pass save_annotated=False for the detection-only fast path: boxes are
+        returned without drawing, and overlays can be rendered later from the
+        stored boxes with render_annotated_bytes.
+        """
+        # Reduced decoding only when no full-size annotated image is wanted
+        reduce = self.reduced_decode and not save_annotated
+        im0, scale = decode_image(image_bytes, self.img_size if reduce else None)
+        detections, annotated_img = self.detect_image(im0, save_annotated)
+        return _rescale_detections(detections, scale), annotated_img
     
     def detect_video(
         self,
@@ -480,17 +611,8 @@ class YOLOv5Service:
                 if not ret:
                     break
                 
-                # Preprocess frame
-                im = self.letterbox(frame, self.img_size, stride=self.stride, auto=self.pt)[0]
-                im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-                im = self.np.ascontiguousarray(im)
-                
-                # Convert to tensor
-                im_tensor = self.torch.from_numpy(im).to(self.device)
-                im_tensor = im_tensor.half() if self.model.fp16 else im_tensor.float()
-                im_tensor /= 255.0
-                if len(im_tensor.shape) == 3:
-                    im_tensor = im_tensor[None]
+                # Preprocess frame (same buffer reused for every frame)
+                im_tensor = self._preprocess(frame)
                 
                 # Inference - Primary
                 pred = self.model(im_tensor, augment=False, visualize=False)
@@ -510,40 +632,20 @@ class YOLOv5Service:
                     )
 
                 # Process detections
-                frame_detections_count = 0
+                frame_detections = []
                 for det in pred:
                     if det is not None and len(det) > 0:
                         # Rescale boxes
                         det[:, :4] = self.scale_boxes(im_tensor.shape[2:], det[:, :4], frame.shape).round()
-                        
-                        # Use correct names list
-                        current_names = self.fallback_names if using_fallback else self.names
-
-                        # Draw bounding boxes
-                        for *xyxy, conf, cls in reversed(det):
-                            x1, y1, x2, y2 = [int(x.item()) for x in xyxy]
-                            confidence = float(conf.item())
-                            class_name = current_names[int(cls)]
-                            
-                            # 🧠 SMART MAPPING: Map COCO objects to municipal categories
-                            if using_fallback:
-                                if class_name in ['handbag', 'backpack', 'suitcase', 'bottle', 'cup']:
-                                    class_name = "garbage"
-                                elif class_name in ['car', 'truck', 'bus'] and confidence < 0.4:
-                                    class_name = "street_debris"
-
-                            cumulative_detections.append({
-                                "class_name": class_name,
-                                "confidence": confidence,
-                                "frame": frames_processed
-                            })
-
-                            # Draw box
-                            label = f"{class_name} {confidence:.2f}"
-                            self.cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                            self.cv2.putText(frame, label, (x1, y1 - 10),
-                                            self.cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                            frame_detections_count += 1
+                        frame_detections.extend(self._extract_detections(det, using_fallback))
+                
+                cumulative_detections.extend(
+                    {"class_name": d["class_name"], "confidence": d["confidence"], "frame": frames_processed}
+                    for d in frame_detections
+                )
+                
+                # Draw bounding boxes
+                frame = self.annotate(frame, frame_detections, inplace=True)
                 
                 frames_processed += 1
                 out.write(frame)
@@ -561,13 +663,198 @@ class YOLOv5Service:
         return str(output_path), cumulative_detections, frames_processed
 
 
-# Global service instance (lazy loading)
-_yolo_service: Optional[YOLOv5Service] = None
+class ModelRegistry:
+    """
+    Holds the active YOLOv5Service and swaps in new weights without a restart.
+    
+    New weights are loaded and warmed up in a background thread while the
+    current model keeps serving; the swap itself is a single reference
+    assignment under a lock. Requests that already obtained the old service
+    finish on it (drain), and it is freed once the last of them lets go.
+    
+    With the YOLO_WORKERS pool running, detection happens in the worker
+    processes: a reload then also rolls the workers onto the new weights
+    (after they loaded and warmed up here), and only counts as active once
+    every worker serves them.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._service: Optional[YOLOv5Service] = None
+        self._loader: Optional[threading.Thread] = None
+        self._preloader: Optional[threading.Thread] = None
+        self._watcher: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.history = deque(maxlen=MODEL_HISTORY_SIZE)  # one entry per activated model version, newest last
+    
+    def get(self) -> YOLOv5Service:
+        """Return the active service, loading the default weights on first use"""
+        service = self._service
+        if service is None:
+            with self._lock:
+                if self._service is None:
+                    self._activate(*self._load())
+                service = self._service
+        return service
+    
+    def _load(self, weights_path: Optional[str | Path] = None) -> Tuple[YOLOv5Service, float]:
+        """Build (and warm up) a service; returns it with the load time in seconds"""
+        start = time.time()
+        service = YOLOv5Service(weights_path=str(weights_path) if weights_path else None)
+        return service, time.time() - start
+    
+    def _activate(self, service: YOLOv5Service, load_seconds: float):
+        """Make service the active one. Caller must hold the lock."""
+        self._service = service
+        self.last_error = None
+        self.history.append({
+            "model_version": service.model_version,
+            "weights_path": str(service.weights_path),
+            "load_seconds": round(load_seconds, 3),
+            "activated_at": datetime.now().isoformat(),
+            **service.timings,
+        })
+    
+    def preload(self):
+        """
+        Load and warm the default model in a background thread
+        
+        Requests arriving meanwhile wait on the same load via get() instead
+        of starting a second one. No-op while a preload is running or once
+        the model is loaded.
+        """
+        if self._service is not None or (self._preloader is not None and self._preloader.is_alive()):
+            return
+        
+        def _preload():
+            try:
+                self.get()
+                logger.info(f"Model preloaded: {self._service.model_version} {self._service.timings}")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Model preload failed: {e}")
+        
+        self._preloader = threading.Thread(target=_preload, name="yolo-model-preload", daemon=True)
+        self._preloader.start()
+    
+    @property
+    def reloading(self) -> bool:
+        return self._loader is not None and self._loader.is_alive()
+    
+    def reload(self, weights_path: Optional[str | Path] = None, wait: bool = False) -> bool:
+        """
+        Load weights in the background and swap them in once warm
+        
+        Args:
+            weights_path: Weights to load (default resolution of YOLOv5Service if None)
+            wait: Block until the new model is active (or failed to load)
+            
+        Returns:
+            False if another reload is already in progress, True otherwise
+        """
+        with self._lock:
+            if self.reloading:
+                return False
+            self._loader = threading.Thread(
+                target=self._reload, args=(weights_path,), name="yolo-model-reload", daemon=True
+            )
+            self._loader.start()
+        if wait:
+            self._loader.join()
+        return True
+    
+    def _reload(self, weights_path: Optional[str | Path]):
+        try:
+            service, load_seconds = self._load(weights_path)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Model reload failed, keeping current model: {e}")
+            return
+        
+        from inference_pool import active_pool
+        pool = active_pool()
+        if pool is not None and not pool.roll(service.weights_path):
+            self.last_error = f"Inference workers could not load {service.weights_path}"
+            logger.error(f"Model reload failed, keeping current model: {self.last_error}")
+            return
+        
+        with self._lock:
+            previous = self._service
+            self._activate(service, load_seconds)
+        
+        logger.info(
+            f"Swapped model {previous.model_version if previous else None} -> "
+            f"{service.model_version} (loaded in {load_seconds:.2f}s)"
+        )
+    
+    def watch(self, interval: float = 30.0):
+        """
+        Poll the active weights file and hot reload when it changes
+        
+        A change is only picked up once the file has stopped changing for
+        one interval, so a half-copied weights file is never loaded.
+        """
+        if self._watcher is not None:
+            return
+        
+        def _poll():
+            from inference_pool import active_pool
+            pending = None
+            while True:
+                time.sleep(interval)
+                if self.reloading:
+                    continue
+                # The model that serves detection: the pool workers' when YOLO_WORKERS is set
+                pool = active_pool()
+                service = self._service
+                if pool is not None:
+                    current = pool.current_model()
+                else:
+                    current = (service.weights_path, service.model_version) if service else None
+                if current is None:
+                    continue
+                weights_path, model_version = current
+                try:
+                    version = _weights_version(Path(weights_path))
+                except FileNotFoundError:
+                    continue
+                if version == model_version:
+                    pending = None
+                elif version == pending:
+                    logger.info(f"Weights changed on disk ({version}), reloading...")
+                    self.reload(weights_path)
+                    pending = None
+                else:
+                    pending = version
+        
+        self._watcher = threading.Thread(target=_poll, name="yolo-model-watcher", daemon=True)
+        self._watcher.start()
+    
+    def status(self) -> dict:
+        service = self._service
+        return {
+            "loaded": service is not None,
+            "model_version": service.model_version if service else None,
+            "weights_path": str(service.weights_path) if service else None,
+            "timings": service.timings if service else None,
+            "reloading": self.reloading,
+            "watching": self._watcher is not None,
+            "last_error": self.last_error,
+            "history": list(self.history),
+        }
+
+
+# Global model registry (lazy loading)
+model_registry = ModelRegistry()
 
 
 def get_yolo_service() -> YOLOv5Service:
-    """Get or create YOLOv5 service instance"""
-    global _yolo_service
-    if _yolo_service is None:
-        _yolo_service = YOLOv5Service()
-    return _yolo_service
\ No newline at end of file
+    """
+    Get the active YOLOv5 service instance, loading it on first use.
+    With YOLO_WORKERS set, returns the front-end of the multi-process pool.
+    """
+    from inference_pool import get_inference_pool, PooledYOLOv5Service
+    pool = get_inference_pool()
+    if pool is not None:
+        return PooledYOLOv5Service(pool)
+    return model_registry.get()
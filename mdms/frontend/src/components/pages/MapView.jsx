@@ -1,9 +1,9 @@
-import { MapContainer, TileLayer, Marker, Popup, useMap } from "react-leaflet";
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
-import { useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { useLocation } from "react-router-dom";
 import "../styles/MapView.css";
-import { getTickets } from "../../services/api";
+import { getMapClusters } from "../../services/api";
 import L from "leaflet";
 
 /* Fix for default marker icon in react-leaflet */
@@ -59,54 +59,121 @@ function ComplaintMarker({ position, label }) {
   );
 }
 
+/* -------------------- CLUSTER ICON -------------------- */
+function clusterIcon(count) {
+  const size = count < 10 ? 30 : count < 100 ? 36 : count < 1000 ? 42 : 50;
+  return L.divIcon({
+    html: `<span>${count >= 1000 ? `${Math.round(count / 100) / 10}k` : count}</span>`,
+    className: "cluster-marker",
+    iconSize: [size, size],
+  });
+}
+
+/* -------------------- CLUSTER LAYER -------------------- */
+/* Loads server-side clusters for the visible area whenever the map moves */
+function ClusterLayer() {
+  const [clusters, setClusters] = useState([]);
+  const requestId = useRef(0);
+
+  const load = useCallback(async (map) => {
+    const id = ++requestId.current;
+    try {
+      const response = await getMapClusters(map.getBounds(), map.getZoom());
+      // Ignore responses that arrive after a newer pan/zoom
+      if (id === requestId.current) setClusters(response.clusters || []);
+    } catch (error) {
+      console.error("Failed to fetch map clusters:", error);
+    }
+  }, []);
+
+  const map = useMapEvents({
+    moveend: () => load(map),
+  });
+
+  useEffect(() => {
+    load(map);
+  }, [map, load]);
+
+  return clusters.map((cluster) => {
+    const position = [cluster.latitude, cluster.longitude];
+
+    if (cluster.count > 1) {
+      return (
+        <Marker
+          key={cluster.cell}
+          position={position}
+          icon={clusterIcon(cluster.count)}
+          eventHandlers={{
+            click: () => map.setView(position, Math.min(map.getZoom() + 2, map.getMaxZoom())),
+          }}
+        >
+          <Popup>
+            <div className="popup-card">
+              <div className="popup-title">{cluster.count} complaints</div>
+              {Object.entries(cluster.issue_types).map(([issue, count]) => (
+                <div className="popup-row" key={issue}>
+                  <strong>{issue}:</strong> {count}
+                </div>
+              ))}
+              <div className="popup-row">
+                <strong>Status:</strong>{" "}
+                {Object.entries(cluster.statuses).map(([status, count]) => `${status} ${count}`).join(", ")}
+              </div>
+            </div>
+          </Popup>
+        </Marker>
+      );
+    }
+
+    return (
+      <Marker
+        key={cluster.cell}
+        position={position}
+        eventHandlers={{
+          click: (e) => {
+            const map = e.target._map;
+            map.setView(e.latlng, Math.max(map.getZoom(), 16));
+          },
+        }}
+      >
+        <Popup>
+          <div className="popup-card">
+            <div className="popup-title">
+              Ticket ID: <span className="ticket-id">{cluster.ticket_id}</span>
+            </div>
+
+            <div className="popup-row">
+              <strong>Sub ID:</strong> {cluster.sub_id || "-"}
+            </div>
+
+            <div className="popup-row">
+              <strong>Issue:</strong> {cluster.issue_type || "-"}
+            </div>
+
+            <div className="popup-row">
+              <strong>Status:</strong> {Object.keys(cluster.statuses)[0] || "-"}
+            </div>
+
+            <div className="popup-row">
+              <strong>Location:</strong>{" "}
+              {cluster.latitude.toFixed(6)}, {cluster.longitude.toFixed(6)}
+            </div>
+          </div>
+        </Popup>
+      </Marker>
+    );
+  });
+}
+
 /* -------------------- MAP VIEW -------------------- */
 export default function MapView() {
   const location = useLocation();
 
   const [complaintPos, setComplaintPos] = useState(null);
   const [complaintLabel, setComplaintLabel] = useState("");
-  const [allTickets, setAllTickets] = useState([]);
-  const [loading, setLoading] = useState(true);
 
   const isRedirected = Boolean(location.state?.lat && location.state?.lng);
 
-  /* Fetch all tickets for map markers */
-  useEffect(() => {
-    const fetchTickets = async () => {
-      try {
-        const response = await getTickets();
-        const ticketsData = response.tickets || [];
-
-        const ticketsWithLocations = [];
-        ticketsData.forEach(ticket => {
-          (ticket.sub_tickets || []).forEach(subTicket => {
-            const lat = subTicket.latitude;
-            const lng = subTicket.longitude;
-
-            if (lat && lng) {
-              ticketsWithLocations.push({
-                ...subTicket,
-                ticket_id: ticket.ticket_id,
-                latitude: lat,
-                longitude: lng,
-                area: ticket.area,
-                district: ticket.district
-              });
-            }
-          });
-        });
-
-        setAllTickets(ticketsWithLocations);
-      } catch (error) {
-        console.error("Failed to fetch tickets for map:", error);
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchTickets();
-  }, []);
-
   /* Handle navigation state */
   useEffect(() => {
     if (isRedirected) {
@@ -141,59 +208,7 @@ export default function MapView() {
             />
           )}
 
-          {!loading && allTickets.map((ticket) => {
-            if (!ticket.latitude || !ticket.longitude) return null;
-
-            return (
-              <Marker
-                key={ticket.sub_id || ticket.ticket_id}
-                position={[ticket.latitude, ticket.longitude]}
-                eventHandlers={{
-                  click: (e) => {
-                    const map = e.target._map;
-                    map.setView(e.latlng, 16);
-                  },
-                }}
-              >
-                <Popup>
-                  <div className="popup-card">
-                    <div className="popup-title">
-                      Ticket ID: <span className="ticket-id">{ticket.ticket_id}</span>
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Sub ID:</strong> {ticket.sub_id || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Issue:</strong> {ticket.issue_type || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Authority:</strong> {ticket.authority || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Status:</strong> {ticket.status || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Area:</strong> {ticket.area || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>District:</strong> {ticket.district || "-"}
-                    </div>
-
-                    <div className="popup-row">
-                      <strong>Location:</strong>{" "}
-                      {ticket.latitude.toFixed(6)}, {ticket.longitude.toFixed(6)}
-                    </div>
-                  </div>
-                </Popup>
-              </Marker>
-            );
-          })}
+          <ClusterLayer />
         </MapContainer>
       </div>
     </div>
@@ -96,6 +96,22 @@ export async function getTickets(filters = {}) {
   return apiRequest(endpoint);
 }
 
+/**
+ * Get complaint clusters for the visible map area
+ * bounds: Leaflet LatLngBounds, zoom: map zoom level
+ */
+export async function getMapClusters(bounds, zoom) {
+  const clamp = (v, limit) => Math.max(-limit, Math.min(limit, v));
+  const bbox = [
+    clamp(bounds.getWest(), 180),
+    clamp(bounds.getSouth(), 85),
+    clamp(bounds.getEast(), 180),
+    clamp(bounds.getNorth(), 85),
+  ].map((v) => v.toFixed(6)).join(',');
+
+  return apiRequest(`/api/complaints/map?bbox=${bbox}&zoom=${zoom}`);
+}
+
 /**
  * Get ticket by ID
  */
@@ -105,9 +121,17 @@ export async function getTicketById(ticketId) {
 
 /**
  * Get image by ID
+ * Pass annotated=false to get the original upload without detection overlays
+ */
+export function getImageUrl(imageId, annotated = true) {
+  return `${API_BASE_URL}/api/complaints/images/${imageId}${annotated ? '' : '?annotated=false'}`;
+}
+
+/**
+ * Get stored detection boxes for an image (for client-side overlays)
  */
-export function getImageUrl(imageId) {
-  return `${API_BASE_URL}/api/complaints/images/${imageId}`;
+export async function getImageDetections(imageId) {
+  return apiRequest(`/api/complaints/images/${imageId}/detections`);
 }
 
 /**
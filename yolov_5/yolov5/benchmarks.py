@@ -23,6 +23,7 @@ Requirements:
 
 Usage:
     $ python benchmarks.py --weights yolov5s.pt --img 640
+    $ python benchmarks.py --weights best.pt --img 640 --int8 --calib path/to/images  # PyTorch vs ONNX FP32 vs INT8
 """
 
 import argparse
@@ -216,6 +217,66 @@ def test(
     return py
 
 
+def quantize(
+    weights=ROOT / "yolov5s.pt",  # weights path
+    imgsz=640,  # inference size (pixels)
+    batch_size=1,  # batch size
+    data=ROOT / "data/coco128.yaml",  # dataset.yaml path
+    calib="",  # calibration image folder (static quantization), dynamic if empty
+    calib_images=300,  # max calibration images
+    hard_fail=False,  # throw error on benchmark failure
+):
+    """Compare PyTorch, ONNX FP32 and post-training quantized ONNX INT8 on CPU, reporting mAP deltas and speedups.
+
+    Args:
+        weights (Path | str): Path to the model weights file (default: ROOT / "yolov5s.pt").
+        imgsz (int): Inference size in pixels (default: 640).
+        batch_size (int): Batch size for PyTorch validation; ONNX models always run with batch size 1 (default: 1).
+        data (Path | str): Path to the dataset.yaml file used for mAP (default: ROOT / "data/coco128.yaml").
+        calib (str | Path): Folder of representative images for static INT8 calibration. Uses dynamic quantization
+            if empty (default: "").
+        calib_images (int): Maximum number of calibration images (default: 300).
+        hard_fail (bool | str): Throw an error on failure, or a maximum allowed mAP50-95 drop for INT8, e.g. '0.02'
+            (default: False).
+
+    Returns:
+        pd.DataFrame: One row per format with size, mAP50-95, mAP delta vs PyTorch, inference time and speedup.
+
+    Examples:
+        ```python
+        $ python benchmarks.py --weights best.pt --img 640 --int8 --calib ../datasets/garbage/images/train
+        ```
+    """
+    t = time.time()
+    device = select_device("cpu")  # INT8 ONNX targets ONNX Runtime CPU
+    w_int8 = export.run(
+        weights=weights, imgsz=[imgsz], include=["onnx"], device=device, onnx_int8=True, calib=calib, calib_images=calib_images
+    )[-1]
+    assert str(w_int8).endswith("-int8.onnx"), "INT8 export failed"
+
+    y = []
+    for name, w in (("PyTorch", weights), ("ONNX", Path(weights).with_suffix(".onnx")), ("ONNX INT8", w_int8)):
+        try:
+            result = val_det(data, w, batch_size, imgsz, plots=False, device=device, task="speed")
+            y.append([name, round(file_size(w), 1), round(result[0][3], 4), round(result[2][1], 2)])  # MB, mAP, ms
+        except Exception as e:
+            if hard_fail:
+                assert type(e) is AssertionError, f"Benchmark --hard-fail for {name}: {e}"
+            LOGGER.warning(f"WARNING ⚠️ Benchmark failure for {name}: {e}")
+            y.append([name, None, None, None])
+
+    # Deltas relative to PyTorch
+    py = pd.DataFrame(y, columns=["Format", "Size (MB)", "mAP50-95", "Inference time (ms)"])
+    py["mAP delta"] = (py["mAP50-95"] - py["mAP50-95"][0]).round(4)
+    py["Speedup"] = (py["Inference time (ms)"][0] / py["Inference time (ms)"]).round(2)
+    LOGGER.info(f"\nQuantization benchmarks complete ({time.time() - t:.2f}s)")
+    LOGGER.info(str(py))
+    if hard_fail and isinstance(hard_fail, str):
+        drop = -py["mAP delta"].iloc[-1]
+        assert drop <= float(hard_fail), f"HARD FAIL: INT8 mAP50-95 drop {drop:.4f} > {hard_fail}"
+    return py
+
+
 def parse_opt():
     """Parses command-line arguments for YOLOv5 model inference configuration.
 
@@ -248,6 +309,9 @@ def parse_opt():
     parser.add_argument("--test", action="store_true", help="test exports only")
     parser.add_argument("--pt-only", action="store_true", help="test PyTorch only")
     parser.add_argument("--hard-fail", nargs="?", const=True, default=False, help="Exception on error or < min metric")
+    parser.add_argument("--int8", action="store_true", help="benchmark ONNX INT8 quantization against PyTorch and ONNX")
+    parser.add_argument("--calib", type=str, default="", help="--int8 calibration image folder (else dynamic)")
+    parser.add_argument("--calib-images", type=int, default=300, help="--int8 max calibration images")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     print_args(vars(opt))
@@ -282,7 +346,14 @@ def main(opt):
         $ python benchmarks.py --weights yolov5s.pt --img 640
         ```
     """
-    test(**vars(opt)) if opt.test else run(**vars(opt))
+    opt = vars(opt)
+    int8, calib, calib_images = opt.pop("int8"), opt.pop("calib"), opt.pop("calib_images")
+    if int8:
+        quantize(
+            opt["weights"], opt["imgsz"], opt["batch_size"], opt["data"], calib, calib_images, opt["hard_fail"]
+        )
+    else:
+        test(**opt) if opt["test"] else run(**opt)
 
 
 if __name__ == "__main__":
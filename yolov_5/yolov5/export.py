@@ -7,6 +7,7 @@ Format                      | `export.py --include`         | Model
 PyTorch                     | -                             | yolov5s.pt
 TorchScript                 | `torchscript`                 | yolov5s.torchscript
 ONNX                        | `onnx`                        | yolov5s.onnx
+ONNX INT8                   | `onnx --onnx-int8 [--calib dir]` | yolov5s-int8.onnx
 OpenVINO                    | `openvino`                    | yolov5s_openvino_model/
 TensorRT                    | `engine`                      | yolov5s.engine
 CoreML                      | `coreml`                      | yolov5s.mlmodel
@@ -375,6 +376,94 @@ def export_onnx(model, im, file, opset, dynamic, simplify, prefix=colorstr("ONNX
     return f, model_onnx
 
 
+@try_export
+def export_onnx_int8(model, file, f_onnx, imgsz, calib, calib_images, prefix=colorstr("ONNX INT8:")):
+    """Post-training quantize an exported ONNX model to INT8 for ONNX Runtime CPU inference.
+
+    Args:
+        model (torch.nn.Module): The YOLOv5 model that was exported, used for metadata and to locate the Detect head.
+        file (pathlib.Path): The source weights path; the result is saved next to it as '<stem>-int8.onnx'.
+        f_onnx (str): Path of the FP32 ONNX model produced by `export_onnx`.
+        imgsz (list[int]): Static input size (height, width) the ONNX model was exported with.
+        calib (str | Path): Folder of representative images for static calibration. If empty, dynamic quantization
+            is used instead (weights only, no calibration data needed).
+        calib_images (int): Maximum number of calibration images to read from `calib`.
+        prefix (str): A prefix string for logging messages, defaults to 'ONNX INT8:'.
+
+    Returns:
+        tuple[str, onnx.ModelProto]: The path to the quantized ONNX model and the loaded model.
+
+    Examples:
+        ```python
+        f_onnx, _ = export_onnx(model, im, Path('best.pt'), opset=17, dynamic=False, simplify=False)
+        export_onnx_int8(model, Path('best.pt'), f_onnx, [640, 640], calib='datasets/calib', calib_images=300)
+        ```
+
+    Notes:
+        Static quantization writes QDQ nodes with per-channel INT8 weights and UINT8 activations (U8S8), the format
+        ONNX Runtime runs fastest on x86 CPUs. The Detect head's decode ops (sigmoid, grid/anchor math, concat) stay
+        in FP32 because box coordinates lose most of their accuracy when quantized; its 1x1 output convs are still
+        quantized. Validate the result with `val.py --weights <stem>-int8.onnx` or `benchmarks.py --int8`.
+    """
+    check_requirements(("onnx>=1.12.0", "onnxruntime"))
+    import numpy as np
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    LOGGER.info(f"\n{prefix} starting {'static' if calib else 'dynamic'} quantization of {f_onnx}...")
+    f = str(file.with_name(f"{file.stem}-int8.onnx"))
+
+    # Keep Detect() decode ops in FP32, e.g. '/model.24/Sigmoid', but quantize '/model.24/m.0/Conv'
+    head = f"/model.{len(model.model) - 1}/"
+    model_fp32 = onnx.load(f_onnx)
+    exclude = [n.name for n in model_fp32.graph.node if n.name.startswith(head) and n.op_type != "Conv"]
+
+    if calib:
+
+        class ImageFolderReader(CalibrationDataReader):
+            """Feeds letterboxed, normalized calibration images to the ONNX Runtime calibrator."""
+
+            def __init__(self):
+                self.dataset = iter(LoadImages(calib, img_size=tuple(imgsz), stride=int(max(model.stride)), auto=False))
+                self.n = 0
+
+            def get_next(self):
+                if self.n >= calib_images:
+                    return None
+                for path, im, _, vid_cap, _ in self.dataset:
+                    if vid_cap is None:  # images only
+                        self.n += 1
+                        return {"images": (im[None].astype(np.float32) / 255.0)}
+                return None
+
+        quantize_static(
+            f_onnx,
+            f,
+            ImageFolderReader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            nodes_to_exclude=exclude,
+        )
+    else:
+        quantize_dynamic(f_onnx, f, weight_type=QuantType.QUInt8, nodes_to_exclude=exclude)
+
+    # Quantization drops metadata_props; DetectMultiBackend reads stride/names from them
+    model_onnx = onnx.load(f)
+    for k, v in {"stride": int(max(model.stride)), "names": model.names}.items():
+        meta = model_onnx.metadata_props.add()
+        meta.key, meta.value = k, str(v)
+    onnx.save(model_onnx, f)
+    return f, model_onnx
+
+
 @try_export
 def export_openvino(file, metadata, half, int8, data, prefix=colorstr("OpenVINO:")):
     """Export a YOLOv5 model to OpenVINO format with optional FP16 and INT8 quantization.
@@ -1266,8 +1355,11 @@ def run(
     inplace=False,  # set YOLOv5 Detect() inplace=True
     keras=False,  # use Keras
     optimize=False,  # TorchScript: optimize for mobile
-    int8=False,  # CoreML/TF INT8 quantization
+    int8=False,  # CoreML/TF/OpenVINO INT8 quantization
     per_tensor=False,  # TF per tensor quantization
+    onnx_int8=False,  # ONNX: also write an INT8 quantized <stem>-int8.onnx next to the FP32 model
+    calib="",  # ONNX INT8: calibration image folder (static quantization), dynamic if empty
+    calib_images=300,  # ONNX INT8: max calibration images
     dynamic=False,  # ONNX/TF/TensorRT: dynamic axes
     cache="",  # TensorRT: timing cache path
     simplify=False,  # ONNX: simplify model
@@ -1297,6 +1389,11 @@ def run(
         optimize (bool): Optimize TorchScript model for mobile deployment. Default is False.
         int8 (bool): Apply INT8 quantization for CoreML or TensorFlow models. Default is False.
         per_tensor (bool): Apply per tensor quantization for TensorFlow models. Default is False.
+        onnx_int8 (bool): Also export an ONNX Runtime INT8 model ('<stem>-int8.onnx') next to the FP32 ONNX model,
+            which is still written. Default is False.
+        calib (str | Path): Calibration image folder for ONNX INT8 static quantization; dynamic quantization is used
+            if empty. Default is an empty string.
+        calib_images (int): Maximum number of images used for ONNX INT8 calibration. Default is 300.
         dynamic (bool): Enable dynamic axes for ONNX, TensorFlow, or TensorRT exports. Default is False.
         cache (str): TensorRT timing cache path. Default is an empty string.
         simplify (bool): Simplify the ONNX model during export. Default is False.
@@ -1398,8 +1495,11 @@ def run(
         f[0], _ = export_torchscript(model, im, file, optimize)
     if engine:  # TensorRT required before ONNX
         f[1], _ = export_engine(model, im, file, half, dynamic, simplify, workspace, verbose, cache)
-    if onnx or xml:  # OpenVINO requires ONNX
+    if onnx or xml or onnx_int8:  # OpenVINO and ONNX INT8 require ONNX
         f[2], _ = export_onnx(model, im, file, opset, dynamic, simplify)
+        if onnx_int8 and f[2]:  # ONNX Runtime INT8, written in addition to the FP32 model
+            assert not dynamic, "--onnx-int8 requires a static input shape, i.e. do not pass --dynamic"
+            f.append(export_onnx_int8(model, file, f[2], imgsz, calib, calib_images)[0])
     if xml:  # OpenVINO
         f[3], _ = export_openvino(file, metadata, half, int8, data)
     if coreml:  # CoreML
@@ -1490,6 +1590,9 @@ def parse_opt(known=False):
     parser.add_argument("--optimize", action="store_true", help="TorchScript: optimize for mobile")
     parser.add_argument("--int8", action="store_true", help="CoreML/TF/OpenVINO INT8 quantization")
     parser.add_argument("--per-tensor", action="store_true", help="TF per-tensor quantization")
+    parser.add_argument("--onnx-int8", action="store_true", help="ONNX: also export an INT8 quantized model")
+    parser.add_argument("--calib", type=str, default="", help="ONNX INT8: calibration image folder (else dynamic)")
+    parser.add_argument("--calib-images", type=int, default=300, help="ONNX INT8: max calibration images")
     parser.add_argument("--dynamic", action="store_true", help="ONNX/TF/TensorRT: dynamic axes")
     parser.add_argument("--cache", type=str, default="", help="TensorRT: timing cache file path")
     parser.add_argument("--simplify", action="store_true", help="ONNX: simplify model")
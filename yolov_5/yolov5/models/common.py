@@ -15,7 +15,6 @@ from urllib.parse import urlparse
 
 import cv2
 import numpy as np
-import pandas as pd
 import requests
 import torch
 import torch.nn as nn
@@ -36,7 +35,7 @@ except (ImportError, AssertionError):
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from utils import TryExcept
-from utils.dataloaders import exif_transpose, letterbox
+from utils.augmentations import letterbox
 from utils.general import (
     LOGGER,
     ROOT,
@@ -861,6 +860,8 @@ class AutoShape(nn.Module):
         #   torch:           = torch.zeros(16,3,320,640)  # BCHW (scaled to size=640, 0-1 values)
         #   multiple:        = [Image.open('image1.jpg'), Image.open('image2.jpg'), ...]  # list of images
 
+        from utils.dataloaders import exif_transpose  # scoped to keep dataloaders out of inference imports
+
         dt = (Profile(), Profile(), Profile())
         with dt[0]:
             if isinstance(size, int):  # expand
@@ -1026,6 +1027,8 @@ class Detections:
 
         Example: print(results.pandas().xyxy[0]).
         """
+        import pandas as pd  # scoped to keep pandas out of inference imports
+
         new = copy(self)  # return copy
         ca = "xmin", "ymin", "xmax", "ymax", "confidence", "class", "name"  # xyxy columns
         cb = "xcenter", "ycenter", "width", "height", "confidence", "class", "name"  # xywh columns
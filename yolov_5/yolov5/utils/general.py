@@ -30,7 +30,6 @@ from zipfile import ZipFile, is_zipfile
 import cv2
 import numpy as np
 import packaging
-import pandas as pd
 import torch
 import torchvision
 import yaml
@@ -65,7 +64,6 @@ FONT = "Arial.ttf"  # https://github.com/ultralytics/assets/releases/download/v0
 
 torch.set_printoptions(linewidth=320, precision=5, profile="long")
 np.set_printoptions(linewidth=320, formatter={"float_kind": "{:11.5g}".format})  # format short g, %precision=5
-pd.options.display.max_columns = 10
 cv2.setNumThreads(0)  # prevent OpenCV from multithreading (incompatible with PyTorch DataLoader)
 os.environ["NUMEXPR_MAX_THREADS"] = str(NUM_THREADS)  # NumExpr max threads
 os.environ["OMP_NUM_THREADS"] = "1" if platform.system() == "darwin" else str(NUM_THREADS)  # OpenMP (PyTorch and SciPy)
@@ -1156,6 +1154,8 @@ def print_mutation(keys, results, hyp, save_dir, bucket, prefix=colorstr("evolve
         f.write(s + ("%20.5g," * n % vals).rstrip(",") + "\n")
 
     # Save yaml
+    import pandas as pd  # scoped to keep pandas out of inference imports
+
     with open(evolve_yaml, "w") as f:
         data = pd.read_csv(evolve_csv, skipinitialspace=True)
         data = data.rename(columns=lambda x: x.strip())  # strip keys
@@ -5,7 +5,6 @@ import math
 import warnings
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
 import torch
 
@@ -199,6 +198,7 @@ class ConfusionMatrix:
     @TryExcept("WARNING ⚠️ ConfusionMatrix plot failure")
     def plot(self, normalize=True, save_dir="", names=()):
         """Plots confusion matrix using seaborn, optional normalization; can save plot to specified directory."""
+        import matplotlib.pyplot as plt
         import seaborn as sn
 
         array = self.matrix / ((self.matrix.sum(0).reshape(1, -1) + 1e-9) if normalize else 1)  # normalize columns
@@ -347,6 +347,8 @@ def plot_pr_curve(px, py, ap, save_dir=Path("pr_curve.png"), names=()):
     """Plots precision-recall curve, optionally per class, saving to `save_dir`; `px`, `py` are lists, `ap` is Nx2
     array, `names` optional.
     """
+    import matplotlib.pyplot as plt  # scoped to keep matplotlib out of inference imports
+
     fig, ax = plt.subplots(1, 1, figsize=(9, 6), tight_layout=True)
     py = np.stack(py, axis=1)
 
@@ -370,6 +372,8 @@ def plot_pr_curve(px, py, ap, save_dir=Path("pr_curve.png"), names=()):
 @threaded
 def plot_mc_curve(px, py, save_dir=Path("mc_curve.png"), names=(), xlabel="Confidence", ylabel="Metric"):
     """Plots a metric-confidence curve for model predictions, supporting per-class visualization and smoothing."""
+    import matplotlib.pyplot as plt  # scoped to keep matplotlib out of inference imports
+
     fig, ax = plt.subplots(1, 1, figsize=(9, 6), tight_layout=True)
 
     if 0 < len(names) < 21:  # display per-class legend if < 21 classes